@@ -0,0 +1,108 @@
+"""
+Synthetic armatures for the benchmarks. They are built through the regular `bpy`
+API, so they work with the stand-in and with real Blender.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+SHAPES = ["chain", "fan", "tree"]
+
+# Bones per limb of the tree shape
+LIMB_LENGTH = 12
+
+
+def bone_name(i: int) -> str:
+    # Every pair of bones is a symmetric pair
+    return f"bone.{i // 2:05d}.{'LR'[i % 2]}"
+
+
+def synthetic_hierarchy(
+    shape: str, size: int, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[List[int]]]:
+    """
+    Parents, heads and tails of a synthetic armature, and its limbs: runs of
+    connected bones, each one the parent of the next.
+
+    - chain: a single chain of `size` bones
+    - fan: a root bone with `size - 1` children
+    - tree: limbs of LIMB_LENGTH bones, each attached to a random earlier bone
+    """
+    random = np.random.default_rng(seed)
+    parents = np.full(size, -1, dtype=np.int64)
+    directions = random.normal(size=(size, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    directions[:, 2] = np.abs(directions[:, 2])
+
+    if shape == "chain":
+        parents[1:] = np.arange(size - 1)
+        limbs = [list(range(size))]
+    elif shape == "fan":
+        parents[1:] = 0
+        limbs = [[0, i] for i in range(1, size)]
+    elif shape == "tree":
+        limbs = []
+        for start in range(0, size, LIMB_LENGTH):
+            limb = list(range(start, min(start + LIMB_LENGTH, size)))
+            if start:
+                parents[start] = random.integers(0, start)
+            parents[limb[1:]] = limb[:-1]
+            limbs.append(limb)
+    else:
+        raise ValueError(f"Unknown shape {shape}")
+
+    heads = np.zeros((size, 3), dtype=np.float32)
+    tails = np.zeros((size, 3), dtype=np.float32)
+    tails[0] = directions[0] * 0.1
+    # Parents always come before their children
+    for i in range(1, size):
+        heads[i] = tails[parents[i]]
+        tails[i] = heads[i] + directions[i] * 0.1
+
+    return parents, heads, tails, limbs
+
+
+def build_armature(bpy, shape: str, size: int, name: str = "Benchmark"):
+    """
+    Adds an armature object with a synthetic hierarchy, makes it active and leaves
+    it in edit mode. Returns the object and the limbs as lists of bone names.
+    """
+    parents, heads, tails, limbs = synthetic_hierarchy(shape, size)
+
+    data = bpy.data.armatures.new(name)
+    obj = bpy.data.objects.new(name, data)
+    bpy.context.scene.collection.objects.link(obj)
+    bpy.context.view_layer.objects.active = obj
+    bpy.ops.object.mode_set(mode="EDIT")
+
+    edit_bones = []
+    for i in range(size):
+        edit_bone = data.edit_bones.new(bone_name(i))
+        edit_bone.head = heads[i]
+        edit_bone.tail = tails[i]
+        if parents[i] >= 0:
+            edit_bone.parent = edit_bones[parents[i]]
+            edit_bone.use_connect = True
+        edit_bones.append(edit_bone)
+
+    # Bones are only written to the armature data when leaving edit mode
+    bpy.ops.object.mode_set(mode="OBJECT")
+    bpy.ops.object.mode_set(mode="EDIT")
+
+    return obj, [[bone_name(i) for i in limb] for limb in limbs]
+
+
+def chain_segments(limbs: List[List[str]], length: int, count: int) -> List[List[str]]:
+    """
+    Up to `count` chains of exactly `length` bones cut out of the limbs. The first
+    bone of each limb and every other segment are skipped, so selecting all of them
+    does not merge neighbours or other limbs attached to them into a single chain.
+    """
+    segments = []
+    for limb in limbs:
+        for start in range(1, len(limb) - length + 1, 2 * length):
+            segments.append(limb[start : start + length])
+            if len(segments) == count:
+                return segments
+    return segments
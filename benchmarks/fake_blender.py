@@ -0,0 +1,879 @@
+"""
+In-memory stand-in for the parts of `bpy` and `mathutils` the addon uses, so the
+benchmarks run without Blender.
+
+    from benchmarks import fake_blender
+    fake_blender.install()
+    import bpy  # the stand-in
+
+It models the data the addon touches (objects, armatures, edit/pose bones, constraints,
+bone layers) and the cost that matters most: edit and pose bones are rebuilt from
+scratch on every mode switch, the same way Blender frees them. Connected edit bones
+are not moved along when a head or tail is written, and name lookups are hashed.
+"""
+
+import math
+import sys
+import types
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+LAYER_COUNT = 32
+
+
+class Vector:
+    __slots__ = ("_values",)
+
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self._values = [float(v) for v in values]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self._values, dtype=dtype)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getitem__(self, i):
+        return self._values[i]
+
+    def __setitem__(self, i, value):
+        self._values[i] = float(value)
+
+    def __eq__(self, other):
+        try:
+            return len(other) == len(self) and all(
+                a == b for a, b in zip(self._values, other)
+            )
+        except TypeError:
+            return False
+
+    def __repr__(self):
+        return f"Vector(({', '.join(f'{v:.4f}' for v in self._values)}))"
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self._values, other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self._values, other))
+
+    def __rsub__(self, other):
+        return Vector(b - a for a, b in zip(self._values, other))
+
+    def __mul__(self, scalar):
+        return Vector(a * scalar for a in self._values)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar):
+        return Vector(a / scalar for a in self._values)
+
+    def __neg__(self):
+        return Vector(-a for a in self._values)
+
+    x = property(lambda self: self._values[0])
+    y = property(lambda self: self._values[1])
+    z = property(lambda self: self._values[2])
+
+    @property
+    def length(self) -> float:
+        return math.sqrt(sum(a * a for a in self._values))
+
+    def dot(self, other) -> float:
+        return sum(a * b for a, b in zip(self._values, other))
+
+    def cross(self, other) -> "Vector":
+        ax, ay, az = self._values
+        bx, by, bz = other
+        return Vector((ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx))
+
+    def normalized(self) -> "Vector":
+        length = self.length
+        return Vector(self._values) / length if length else Vector(self._values)
+
+    def normalize(self):
+        self._values = self.normalized()._values
+
+    def copy(self) -> "Vector":
+        return Vector(self._values)
+
+
+def _unique_name(name: str, taken) -> str:
+    if name not in taken:
+        return name
+    i = 1
+    while f"{name}.{i:03d}" in taken:
+        i += 1
+    return f"{name}.{i:03d}"
+
+
+class Collection:
+    """
+    bpy_prop_collection: ordered, indexed by position or name, bulk access with
+    foreach_get and foreach_set.
+    """
+
+    def __init__(self, items=()):
+        self._items = list(items)
+        self._rows = {item.name: i for i, item in enumerate(self._items)}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, name):
+        return name in self._rows
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._items[self._rows[key]]
+        return self._items[key]
+
+    def get(self, name, default=None):
+        row = self._rows.get(name)
+        return default if row is None else self._items[row]
+
+    def find(self, name) -> int:
+        return self._rows.get(name, -1)
+
+    def keys(self):
+        return [item.name for item in self._items]
+
+    def values(self):
+        return list(self._items)
+
+    def _append(self, item):
+        item.name = _unique_name(item.name, self._rows)
+        self._rows[item.name] = len(self._items)
+        self._items.append(item)
+        return item
+
+    def _remove(self, item):
+        self._items.remove(item)
+        self._rows = {item.name: i for i, item in enumerate(self._items)}
+
+    def foreach_get(self, attribute: str, sequence):
+        values = np.array(
+            [getattr(item, attribute) for item in self._items], dtype=sequence.dtype
+        )
+        sequence[:] = values.ravel()
+
+    def foreach_set(self, attribute: str, sequence):
+        if not self._items:
+            return
+        values = np.asarray(sequence).reshape(len(self._items), -1).tolist()
+        for item, value in zip(self._items, values):
+            setattr(item, attribute, value[0] if len(value) == 1 else value)
+
+
+_BONE_SETTINGS = [
+    "envelope_distance",
+    "envelope_weight",
+    "head_radius",
+    "tail_radius",
+    "bbone_segments",
+    "bbone_x",
+    "bbone_z",
+    "use_inherit_rotation",
+    "use_local_location",
+    "inherit_scale",
+]
+
+
+class _BoneBase:
+    def __init__(self, name: str):
+        self.name = name
+        self._head = Vector((0.0, 0.0, 0.0))
+        self._tail = Vector((0.0, 1.0, 0.0))
+        self.roll = 0.0
+        self.parent = None
+        self._use_connect = False
+        self.use_deform = True
+        self.select = False
+        self.select_head = False
+        self.select_tail = False
+        self.hide = False
+        self.layers = [True] + [False] * (LAYER_COUNT - 1)
+        self.envelope_distance = 0.25
+        self.envelope_weight = 1.0
+        self.head_radius = 0.1
+        self.tail_radius = 0.05
+        self.bbone_segments = 1
+        self.bbone_x = 0.1
+        self.bbone_z = 0.1
+        self.use_inherit_rotation = True
+        self.use_local_location = True
+        self.inherit_scale = "FULL"
+
+    @property
+    def head(self) -> Vector:
+        return self._head
+
+    @head.setter
+    def head(self, value):
+        self._head = Vector(value)
+
+    @property
+    def tail(self) -> Vector:
+        return self._tail
+
+    @tail.setter
+    def tail(self, value):
+        self._tail = Vector(value)
+
+    @property
+    def use_connect(self) -> bool:
+        return self._use_connect
+
+    @use_connect.setter
+    def use_connect(self, value):
+        self._use_connect = bool(value)
+        # Connecting snaps the head onto the parent's tail
+        if self._use_connect and self.parent is not None:
+            self._head = self.parent.tail.copy()
+
+    @property
+    def length(self) -> float:
+        return (self._tail - self._head).length
+
+    def _copy_to(self, other):
+        other._head = self._head.copy()
+        other._tail = self._tail.copy()
+        other.roll = self.roll
+        other._use_connect = self._use_connect
+        other.use_deform = self.use_deform
+        other.select = self.select
+        other.select_head = self.select_head
+        other.select_tail = self.select_tail
+        other.hide = self.hide
+        other.layers = list(self.layers)
+        for attribute in _BONE_SETTINGS:
+            setattr(other, attribute, getattr(self, attribute))
+
+
+class EditBone(_BoneBase):
+    pass
+
+
+class Matrix:
+    """
+    4x4 matrix, only what the rig tools use.
+    """
+
+    def __init__(self, rows=None):
+        self.values = np.identity(4) if rows is None else np.array(rows, dtype=float)
+
+    def inverted(self) -> "Matrix":
+        return Matrix(np.linalg.inv(self.values))
+
+    def copy(self) -> "Matrix":
+        return Matrix(self.values)
+
+    def __matmul__(self, other: "Matrix") -> "Matrix":
+        return Matrix(self.values @ other.values)
+
+
+class Bone(_BoneBase):
+    head_local = property(lambda self: self._head)
+    tail_local = property(lambda self: self._tail)
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._children = []
+
+    @property
+    def children(self) -> List["Bone"]:
+        # Filled in by `Bones`, the hierarchy of the bones only changes in edit mode
+        return list(self._children)
+
+    @property
+    def matrix_local(self) -> Matrix:
+        # The orientation does not matter to the stand-in
+        matrix = Matrix()
+        matrix.values[:3, 3] = np.array(self._head)
+        return matrix
+
+
+class Bones(Collection):
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.active = None
+        for bone in self._items:
+            bone._children = []
+        for bone in self._items:
+            if bone.parent is not None:
+                bone.parent._children.append(bone)
+
+
+class EditBones(Collection):
+    """
+    Removed bones are dropped on the next access. Blender removes a bone in C,
+    the stand-in would take quadratic time pruning a large armature bone by bone.
+    """
+
+    def __init__(self, items=()):
+        self._removed = set()
+        super().__init__(items)
+        self.active = None
+
+    @property
+    def _items(self) -> list:
+        self._drop_removed()
+        return self._bones
+
+    @_items.setter
+    def _items(self, items: list):
+        self._bones = items
+
+    @property
+    def _rows(self) -> dict:
+        self._drop_removed()
+        return self._bone_rows
+
+    @_rows.setter
+    def _rows(self, rows: dict):
+        self._bone_rows = rows
+
+    def _drop_removed(self):
+        if not self._removed:
+            return
+        removed, self._removed = self._removed, set()
+
+        # Children of a removed bone go to its closest ancestor which is kept
+        for bone in self._bones:
+            parent = bone.parent
+            while parent is not None and id(parent) in removed:
+                parent = parent.parent
+            bone.parent = parent
+        self._bones = [bone for bone in self._bones if id(bone) not in removed]
+        self._bone_rows = {bone.name: i for i, bone in enumerate(self._bones)}
+
+    def new(self, name: str) -> EditBone:
+        return self._append(EditBone(name))
+
+    def remove(self, bone: EditBone):
+        self._removed.add(id(bone))
+
+
+class Constraint:
+    def __init__(self, constraint_type: str, name: str):
+        self.type = constraint_type
+        self.name = name
+        self.target = None
+        self.subtarget = ""
+        self.enabled = True
+        self.mute = False
+        self.influence = 1.0
+        self.owner_space = "WORLD"
+        self.target_space = "WORLD"
+
+    def __setattr__(self, name, value):
+        if name == "chain_count" and self.type == "SPLINE_IK":
+            # Blender clamps it the same way
+            value = min(max(value, 1), 255)
+        super().__setattr__(name, value)
+
+    def __getattr__(self, name):
+        # Type specific properties default to None
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return None
+
+    @property
+    def bl_rna(self):
+        # The settings are the attributes set so far, the type can not be changed
+        return types.SimpleNamespace(
+            properties=[
+                types.SimpleNamespace(
+                    identifier=name, is_readonly=name == "type", type="STRING"
+                )
+                for name in vars(self)
+            ]
+        )
+
+
+class Constraints(Collection):
+    def new(self, constraint_type: str) -> Constraint:
+        name = constraint_type.replace("_", " ").title()
+        return self._append(Constraint(constraint_type, name))
+
+    def remove(self, constraint: Constraint):
+        self._remove(constraint)
+
+    def move(self, from_index: int, to_index: int):
+        self._items.insert(to_index, self._items.pop(from_index))
+        self._rows = {item.name: i for i, item in enumerate(self._items)}
+
+    def get(self, name, default=None):
+        # Constraints are renamed after creation, look them up by their current name
+        for constraint in self._items:
+            if constraint.name == name:
+                return constraint
+        return default
+
+
+class PoseBone:
+    def __init__(self, bone: Bone, constraints: Optional[Constraints] = None):
+        self.name = bone.name
+        self.bone = bone
+        self.constraints = constraints if constraints is not None else Constraints()
+        self.rotation_mode = "QUAT"
+        self.custom_shape = None
+        self.custom_shape_scale_xyz = Vector((1.0, 1.0, 1.0))
+        self.use_custom_shape_bone_size = True
+
+
+class Pose:
+    def __init__(self):
+        self.bones = Collection()
+
+
+class _IDProperties:
+    def __init__(self):
+        self._properties: Dict[str, Any] = {}
+
+    def __getitem__(self, key):
+        return self._properties[key]
+
+    def __setitem__(self, key, value):
+        self._properties[key] = value
+
+    def __delitem__(self, key):
+        del self._properties[key]
+
+    def __contains__(self, key):
+        return key in self._properties
+
+    def get(self, key, default=None):
+        return self._properties.get(key, default)
+
+
+class Armature(_IDProperties):
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+        self.bones = Bones()
+        self.edit_bones = EditBones()
+        self.layers = [True] + [False] * (LAYER_COUNT - 1)
+        self.use_mirror_x = False
+
+    @property
+    def users(self) -> int:
+        return sum(obj.data is self for obj in _state.objects)
+
+    def copy(self) -> "Armature":
+        copy = _state.armatures.new(self.name)
+        copy.bones = Bones(_copy_bones(self.bones, Bone))
+        copy.layers = list(self.layers)
+        copy.use_mirror_x = self.use_mirror_x
+        copy._properties = dict(self._properties)
+        return copy
+
+
+class BezierPoint:
+    name = ""
+
+    def __init__(self):
+        self.co = Vector()
+        self.handle_left = Vector()
+        self.handle_right = Vector()
+        self.handle_left_type = "AUTO"
+        self.handle_right_type = "AUTO"
+
+
+class BezierPoints(Collection):
+    def add(self, count: int = 1):
+        for _ in range(count):
+            self._items.append(BezierPoint())
+
+
+class Spline:
+    name = ""
+
+    def __init__(self, spline_type: str):
+        self.type = spline_type
+        # A new spline has one point
+        self.bezier_points = BezierPoints([BezierPoint()])
+
+
+class Splines(Collection):
+    def new(self, spline_type: str) -> Spline:
+        spline = Spline(spline_type)
+        self._items.append(spline)
+        return spline
+
+    def clear(self):
+        self._items.clear()
+
+
+class Curve(_IDProperties):
+    def __init__(self, name: str, curve_type: str = "CURVE"):
+        super().__init__()
+        self.name = name
+        self.type = curve_type
+        self.dimensions = "2D"
+        self.splines = Splines()
+
+
+class Modifier:
+    def __init__(self, name: str, modifier_type: str):
+        self.name = name
+        self.type = modifier_type
+        self.object = None
+        self.subtarget = ""
+        self.matrix_inverse = Matrix()
+        self.vertex_indices = []
+
+    def vertex_indices_set(self, indices):
+        self.vertex_indices = list(indices)
+
+
+class Modifiers(Collection):
+    def new(self, name: str, modifier_type: str) -> Modifier:
+        return self._append(Modifier(name, modifier_type))
+
+    def remove(self, modifier):
+        self._remove(modifier)
+
+
+class Object(_IDProperties):
+    def __init__(self, name: str, data=None):
+        super().__init__()
+        self.name = name
+        self.data = data
+        if isinstance(data, Armature):
+            self.type = "ARMATURE"
+        elif isinstance(data, Curve):
+            self.type = "CURVE"
+        else:
+            self.type = "EMPTY"
+        self.mode = "OBJECT"
+        self.pose = Pose() if isinstance(data, Armature) else None
+        self.parent = None
+        self.hide_render = False
+        self.modifiers = Modifiers()
+        self.matrix_world = Matrix()
+        self._selected = False
+
+    @property
+    def users_collection(self):
+        collection = _state.context.scene.collection
+        return [collection] if self in collection.objects else []
+
+    def select_set(self, state: bool):
+        self._selected = bool(state)
+
+    def select_get(self) -> bool:
+        return self._selected
+
+
+def _copy_bones(source, bone_class) -> List[_BoneBase]:
+    copies = {}
+    for bone in source:
+        copy = bone_class(bone.name)
+        bone._copy_to(copy)
+        copies[bone.name] = copy
+    for bone in source:
+        if bone.parent is not None:
+            copies[bone.name].parent = copies[bone.parent.name]
+    return list(copies.values())
+
+
+def _enter_edit_mode(obj: Object):
+    armature = obj.data
+    armature.edit_bones = EditBones(_copy_bones(armature.bones, EditBone))
+    if armature.bones.active is not None:
+        armature.edit_bones.active = armature.edit_bones.get(armature.bones.active.name)
+
+
+def _exit_edit_mode(obj: Object):
+    armature = obj.data
+    armature.bones = Bones(_copy_bones(armature.edit_bones, Bone))
+    if armature.edit_bones.active is not None:
+        armature.bones.active = armature.bones.get(armature.edit_bones.active.name)
+    armature.edit_bones = EditBones()
+
+    # Pose channels survive by name, the same way Blender keeps them
+    old_pose_bones = obj.pose.bones
+    pose_bones = []
+    for bone in armature.bones:
+        pose_bone = old_pose_bones.get(bone.name)
+        if pose_bone is None:
+            pose_bone = PoseBone(bone)
+        pose_bone.bone = bone
+        pose_bones.append(pose_bone)
+    obj.pose.bones = Collection(pose_bones)
+
+
+class IDCollection(Collection):
+    def __init__(self, factory):
+        super().__init__()
+        self._factory = factory
+
+    def new(self, name: str, *args):
+        return self._append(self._factory(name, *args))
+
+    def remove(self, item):
+        self._remove(item)
+
+
+class _ObjectList(list):
+    def link(self, obj):
+        self.append(obj)
+
+    def unlink(self, obj):
+        self.remove(obj)
+
+
+class ViewLayer:
+    def __init__(self):
+        self.objects = types.SimpleNamespace(active=None)
+        self.updates = 0
+
+    def update(self):
+        self.updates += 1
+
+
+class Scene:
+    def __init__(self):
+        self.collection = types.SimpleNamespace(objects=_ObjectList())
+
+    @property
+    def objects(self):
+        return self.collection.objects
+
+
+class WindowManager:
+    """
+    Modal operators: the handlers and timers are only recorded, tests send the events.
+    """
+
+    def __init__(self):
+        self.modal_handlers = []
+        self.timers = []
+        self.progress = None
+
+    def event_timer_add(self, time_step: float, window=None):
+        timer = types.SimpleNamespace(time_step=time_step)
+        self.timers.append(timer)
+        return timer
+
+    def event_timer_remove(self, timer):
+        self.timers.remove(timer)
+
+    def modal_handler_add(self, operator):
+        self.modal_handlers.append(operator)
+        return True
+
+    def progress_begin(self, minimum: float, maximum: float):
+        self.progress = minimum
+
+    def progress_update(self, value: float):
+        self.progress = value
+
+    def progress_end(self):
+        self.progress = None
+
+
+class WorkSpace:
+    def __init__(self):
+        self.status_text = None
+
+    def status_text_set(self, text):
+        self.status_text = text
+
+
+class Context:
+    def __init__(self):
+        self.scene = Scene()
+        self.view_layer = ViewLayer()
+        self.preferences = types.SimpleNamespace(addons={})
+        self.window_manager = WindowManager()
+        self.workspace = WorkSpace()
+        self.window = None
+
+    @property
+    def active_object(self):
+        return self.view_layer.objects.active
+
+    @property
+    def object(self):
+        return self.view_layer.objects.active
+
+    @property
+    def mode(self) -> str:
+        obj = self.active_object
+        if obj is None or obj.mode == "OBJECT":
+            return "OBJECT"
+        if obj.mode == "EDIT":
+            return "EDIT_ARMATURE"
+        return obj.mode
+
+
+class _Property:
+    def __init__(self, kind: str, **options):
+        self.kind = kind
+        self.options = options
+
+    @property
+    def default(self):
+        if "default" in self.options:
+            return self.options["default"]
+        if "ENUM_FLAG" in self.options.get("options", ()):
+            return set()
+        return {"BOOL": False, "INT": 0, "FLOAT": 0.0, "STRING": "", "ENUM": None}[
+            self.kind
+        ]
+
+
+def _property(kind: str):
+    return lambda **options: _Property(kind, **options)
+
+
+class _StructBase:
+    """
+    Operators, menus and preferences: annotated properties get their defaults.
+    """
+
+    def __init__(self):
+        for cls in reversed(type(self).__mro__):
+            for name, value in getattr(cls, "__annotations__", {}).items():
+                if isinstance(value, _Property):
+                    setattr(self, name, value.default)
+        self.reports = []
+
+    def report(self, report_type, message: str):
+        self.reports.append((set(report_type), message))
+
+
+class _MenuType:
+    def __init__(self):
+        self.draw_functions = []
+
+    def append(self, function):
+        self.draw_functions.append(function)
+
+    def remove(self, function):
+        self.draw_functions.remove(function)
+
+
+class _Blender:
+    """
+    State of the stand-in, replaced as a whole by `reset()`.
+    """
+
+    def __init__(self):
+        self.armatures = IDCollection(Armature)
+        self.curves = IDCollection(Curve)
+        self.objects = IDCollection(Object)
+        self.context = Context()
+        self.mode_switches = 0
+
+
+_state = _Blender()
+
+
+def _mode_set(mode: str = "OBJECT"):
+    obj = _state.context.active_object
+    if obj is None:
+        raise RuntimeError("Operator bpy.ops.object.mode_set.poll() failed")
+    if obj.mode == mode:
+        return {"FINISHED"}
+
+    if obj.type == "ARMATURE":
+        if obj.mode == "EDIT":
+            _exit_edit_mode(obj)
+        if mode == "EDIT":
+            _enter_edit_mode(obj)
+    obj.mode = mode
+    _state.mode_switches += 1
+    return {"FINISHED"}
+
+
+def _select_all(action: str = "TOGGLE"):
+    obj = _state.context.active_object
+    bones = obj.data.edit_bones if obj.mode == "EDIT" else obj.data.bones
+    state = action == "SELECT"
+    for bone in bones:
+        bone.select = bone.select_head = bone.select_tail = state
+    return {"FINISHED"}
+
+
+def _build_bpy() -> types.ModuleType:
+    bpy = types.ModuleType("bpy")
+    bpy.__dict__["__fake__"] = True
+    bpy.app = types.SimpleNamespace(version=(3, 6, 0), background=True)
+    bpy.types = types.SimpleNamespace(
+        Operator=type("Operator", (_StructBase,), {}),
+        Menu=type("Menu", (_StructBase,), {}),
+        Panel=type("Panel", (_StructBase,), {}),
+        AddonPreferences=type("AddonPreferences", (_StructBase,), {}),
+        VIEW3D_MT_edit_armature=_MenuType(),
+        VIEW3D_MT_pose=_MenuType(),
+        Object=Object,
+        Armature=Armature,
+        EditBone=EditBone,
+        Bone=Bone,
+        PoseBone=PoseBone,
+    )
+    bpy.props = types.SimpleNamespace(
+        BoolProperty=_property("BOOL"),
+        IntProperty=_property("INT"),
+        FloatProperty=_property("FLOAT"),
+        StringProperty=_property("STRING"),
+        EnumProperty=_property("ENUM"),
+    )
+    bpy.path = types.SimpleNamespace(abspath=lambda path: path)
+    bpy.utils = types.SimpleNamespace(
+        register_class=lambda cls: None, unregister_class=lambda cls: None
+    )
+    bpy.ops = types.SimpleNamespace(
+        object=types.SimpleNamespace(mode_set=_mode_set),
+        armature=types.SimpleNamespace(select_all=_select_all),
+    )
+    return bpy
+
+
+class _BpyModule(types.ModuleType):
+    # data and context follow `reset()`
+    @property
+    def data(self):
+        return _state
+
+    @property
+    def context(self):
+        return _state.context
+
+
+def install() -> types.ModuleType:
+    """
+    Registers the stand-in `bpy` and `mathutils` modules, returns `bpy`.
+    """
+    bpy = _build_bpy()
+    bpy.__class__ = _BpyModule
+    sys.modules["bpy"] = bpy
+
+    mathutils = types.ModuleType("mathutils")
+    mathutils.Vector = Vector
+    mathutils.Matrix = Matrix
+    sys.modules["mathutils"] = mathutils
+    return bpy
+
+
+def reset():
+    """
+    Drops every object and armature, like loading an empty file.
+    """
+    global _state
+    _state = _Blender()
+
+
+def mode_switches() -> int:
+    return _state.mode_switches
@@ -0,0 +1,1036 @@
+"""
+Times the functions of `cai_rigtools.armature` and the operators of `cai_rigtools.operators`
+on synthetic armatures and writes the results to JSON.
+
+    python -m benchmarks.run --sizes 1000 10000 --output bench.json
+    python -m benchmarks.run --compare bench.json
+    blender -b --factory-startup --python benchmarks/run.py -- --output bench.json
+
+Without Blender the in-memory stand-in of `fake_blender` is used. Functions exported by
+`cai_rigtools.armature` without a benchmark case are listed as `uncovered` in the results.
+"""
+
+import argparse
+from contextlib import redirect_stdout
+from dataclasses import asdict, dataclass, field
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    # Run as a script by Blender
+    sys.path.insert(0, _ROOT)
+
+from benchmarks import fake_blender
+from benchmarks.armatures import SHAPES, build_armature, chain_segments
+
+SIZES = [1000, 10000, 50000]
+
+# Work done by a single case, independent of the size of the armature
+CHAINS = 32
+SELECTED_BONES = 1000
+LOOKUPS = 1000
+
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self):
+        self.bpy = fake_blender.install()
+
+    def reset(self):
+        fake_blender.reset()
+
+    def run_operator(self, operator_class) -> set:
+        operator = operator_class()
+        result = operator.execute(self.bpy.context)
+        if "CANCELLED" in result:
+            reports = [message for _, message in operator.reports]
+            raise RuntimeError(reports[-1] if reports else "Cancelled")
+        return result
+
+
+class BlenderBackend:
+    name = "blender"
+
+    def __init__(self):
+        import bpy
+        import cai_rigtools
+
+        self.bpy = bpy
+        cai_rigtools.register()
+
+    def reset(self):
+        self.bpy.ops.wm.read_factory_settings(use_empty=True)
+
+    def run_operator(self, operator_class) -> set:
+        category, name = operator_class.bl_idname.split(".", 1)
+        result = getattr(getattr(self.bpy.ops, category), name)()
+        if "CANCELLED" in result:
+            raise RuntimeError("Cancelled")
+        return result
+
+
+class Environment:
+    """
+    A freshly built synthetic armature, active and in edit mode.
+    """
+
+    def __init__(self, backend, shape: str, size: int):
+        backend.reset()
+        self.backend = backend
+        self.bpy = backend.bpy
+        self.shape = shape
+        self.size = size
+        self.armature, self.limbs = build_armature(self.bpy, shape, size)
+        self.names = [bone.name for bone in self.armature.data.edit_bones]
+        self.random = np.random.default_rng(size)
+
+    def ensure_edit_mode(self):
+        self.bpy.context.view_layer.objects.active = self.armature
+        if self.armature.mode != "EDIT":
+            self.bpy.ops.object.mode_set(mode="EDIT")
+
+    def sample(self, count: int) -> List[str]:
+        rows = self.random.integers(0, len(self.names), size=count)
+        return [self.names[row] for row in rows]
+
+    def segments(self, length: int, count: int = CHAINS) -> List[List[str]]:
+        return chain_segments(self.limbs, length, count)
+
+    def select(self, bone_names: List[str]):
+        selected = set(bone_names)
+        for bone in self.armature.data.edit_bones:
+            bone.select = bone.name in selected
+
+
+@dataclass
+class Case:
+    name: str
+    kind: str
+    covers: List[str]
+    setup: Callable[[Environment], Optional[Callable[[], Any]]]
+    mutates: bool
+
+
+@dataclass
+class Result:
+    case: str
+    kind: str
+    shape: str
+    size: int
+    times: List[float] = field(default_factory=list)
+    best: Optional[float] = None
+    mean: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+
+
+CASES: List[Case] = []
+
+
+def case(name: str, covers=(), mutates: bool = False, kind: str = "function"):
+    """
+    Registers a benchmark. The decorated setup returns the callable to time, or None
+    if the case does not apply to the armature. Mutating cases get a fresh armature.
+    """
+
+    def register(setup):
+        CASES.append(Case(name, kind, list(covers) or [name], setup, mutates))
+        return setup
+
+    return register
+
+
+def _rigtools():
+    from cai_rigtools import armature
+
+    return armature
+
+
+# --- Selection and lookups
+
+
+@case(
+    "get_bone_selection", ["get_bone_selection", "get_selected_bones", "BoneSelection"]
+)
+def _(env):
+    rigtools = _rigtools()
+    env.select(env.names[::10])
+    return lambda: rigtools.get_selected_bones(env.armature)
+
+
+@case("select_bones")
+def _(env):
+    rigtools = _rigtools()
+    bone_names = env.names[:SELECTED_BONES]
+    return lambda: rigtools.select_bones(env.armature, bone_names)
+
+
+@case("get_armature")
+def _(env):
+    return _rigtools().get_armature
+
+
+@case("find_bones", ["find_edit_bone", "find_pose_bone"])
+def _(env):
+    rigtools = _rigtools()
+    bone_names = env.sample(LOOKUPS)
+
+    def run():
+        for bone_name in bone_names:
+            rigtools.find_edit_bone(env.armature, bone_name)
+            rigtools.find_pose_bone(env.armature, bone_name)
+
+    return run
+
+
+@case("BoneRegistry")
+def _(env):
+    rigtools = _rigtools()
+    bone_names = env.sample(LOOKUPS) * 2
+    registry = rigtools.BoneRegistry(env.armature)
+    return lambda: [registry.edit_bone(bone_name) for bone_name in bone_names]
+
+
+@case("bone_rows")
+def _(env):
+    rigtools = _rigtools()
+    bone_names = env.sample(LOOKUPS)
+    return lambda: rigtools.bone_rows(env.armature.data.edit_bones, bone_names)
+
+
+# --- Snapshot and geometry
+
+
+@case("ArmatureSnapshot.capture", ["ArmatureSnapshot", "BoneArrays"])
+def _(env):
+    rigtools = _rigtools()
+    return lambda: rigtools.ArmatureSnapshot.capture(env.armature)
+
+
+@case("ArmatureSnapshot.write_back")
+def _(env):
+    rigtools = _rigtools()
+    snapshot = rigtools.ArmatureSnapshot.capture(env.armature)
+    rows = np.arange(len(snapshot))
+    snapshot.set_rolls(rows, snapshot.rolls + 0.1)
+    return lambda: snapshot.write_back(env.armature)
+
+
+@case("create_or_update_bone", ["create_or_update_bone", "update_bone"], mutates=True)
+def _(env):
+    rigtools = _rigtools()
+
+    def run():
+        for i in range(LOOKUPS):
+            rigtools.create_or_update_bone(
+                env.armature, f"NEW-{i}", head=(0.0, 0.0, 0.0), tail=(0.0, 0.0, 1.0)
+            )
+
+    return run
+
+
+@case("find_axis_vectors")
+def _(env):
+    rigtools = _rigtools()
+    from mathutils import Vector
+
+    points = [
+        [Vector(p) for p in triple]
+        for triple in env.random.normal(size=(LOOKUPS, 3, 3))
+    ]
+    return lambda: [rigtools.find_axis_vectors(*triple) for triple in points]
+
+
+@case("find_axis_vectors_batch")
+def _(env):
+    rigtools = _rigtools()
+    q, r, s = env.random.normal(size=(3, env.size, 3))
+    return lambda: rigtools.find_axis_vectors_batch(q, r, s)
+
+
+@case("find_plane_normals")
+def _(env):
+    rigtools = _rigtools()
+    planes = env.random.normal(size=(env.size, 3, 3))
+    return lambda: rigtools.find_plane_normals(planes)
+
+
+@case("project_points_onto_planes")
+def _(env):
+    rigtools = _rigtools()
+    points = env.random.normal(size=(env.size, 3))
+    planes = env.random.normal(size=(CHAINS, 3, 3))
+    indices = env.random.integers(0, CHAINS, size=env.size)
+    return lambda: rigtools.project_points_onto_planes(points, planes, indices)
+
+
+# --- Layers and view layer updates
+
+
+@case("LayerOccupancy.capture", ["LayerOccupancy"])
+def _(env):
+    rigtools = _rigtools()
+    return lambda: rigtools.LayerOccupancy.capture(env.armature)
+
+
+@case("assign_bone_layer_name")
+def _(env):
+    rigtools = _rigtools()
+    return lambda: rigtools.assign_bone_layer_name(env.armature, "Benchmark")
+
+
+@case("move_bones_to_layer", mutates=True)
+def _(env):
+    rigtools = _rigtools()
+    bone_names = env.names[:SELECTED_BONES]
+    return lambda: rigtools.move_bones_to_layer(env.armature, bone_names, 1)
+
+
+@case(
+    "deferred_view_layer_update",
+    ["deferred_view_layer_update", "request_view_layer_update"],
+)
+def _(env):
+    rigtools = _rigtools()
+
+    def run():
+        with rigtools.deferred_view_layer_update():
+            for _ in range(LOOKUPS):
+                rigtools.request_view_layer_update()
+
+    return run
+
+
+# --- Hierarchy
+
+
+@case("BoneHierarchyIndex.from_armature", ["BoneHierarchyIndex"])
+def _(env):
+    rigtools = _rigtools()
+    return lambda: rigtools.BoneHierarchyIndex.from_armature(env.armature)
+
+
+@case("BoneHierarchyIndex.lowest_common_ancestor")
+def _(env):
+    rigtools = _rigtools()
+    hierarchy = rigtools.BoneHierarchyIndex.from_armature(env.armature)
+    pairs = env.random.integers(0, len(hierarchy), size=(LOOKUPS, 2)).tolist()
+    return lambda: [hierarchy.lowest_common_ancestor(a, b) for a, b in pairs]
+
+
+@case("find_bone_chain")
+def _(env):
+    rigtools = _rigtools()
+    hierarchy = rigtools.BoneHierarchyIndex.from_armature(env.armature)
+    pairs = []
+    for bone_name in env.sample(LOOKUPS):
+        row = hierarchy.index_of(bone_name)
+        depth = max(0, int(hierarchy.depths[row]) - 8)
+        ancestor = hierarchy.ancestor_at_depth(row, depth)
+        pairs.append((hierarchy.names[ancestor], bone_name))
+
+    def run():
+        for first, last in pairs:
+            rigtools.find_bone_chain(env.armature, first, last, hierarchy)
+
+    return run
+
+
+@case("partition_bone_chains", ["partition_bone_chains", "partition_bone_chain_rows"])
+def _(env):
+    rigtools = _rigtools()
+    hierarchy = rigtools.BoneHierarchyIndex.from_armature(env.armature)
+    bone_names = env.names[::2]
+    return lambda: rigtools.partition_bone_chains(hierarchy, bone_names)
+
+
+@case("SymmetryIndex", ["SymmetryIndex", "split_side"])
+def _(env):
+    rigtools = _rigtools()
+    return lambda: rigtools.SymmetryIndex(env.names)
+
+
+# --- Transactions and constraints
+
+
+@case("RigBuildTransaction", ["RigBuildTransaction", "rig_build"])
+def _(env):
+    rigtools = _rigtools()
+
+    def run():
+        with rigtools.rig_build(env.armature) as transaction:
+            transaction.pose(lambda: None)
+
+    return run
+
+
+def _parent_specs(env) -> list:
+    rigtools = _rigtools()
+    edit_bones = env.armature.data.edit_bones
+    return [
+        rigtools.ConstraintSpec(
+            bone_name, "COPY_ROTATION", edit_bones[bone_name].parent.name
+        )
+        for bone_name in env.names[1 : SELECTED_BONES + 1]
+        if edit_bones[bone_name].parent is not None
+    ]
+
+
+@case(
+    "apply_constraint_specs",
+    ["apply_constraint_specs", "ConstraintSpec", "constraint_name"],
+    mutates=True,
+)
+def _(env):
+    rigtools = _rigtools()
+    specs = _parent_specs(env)
+
+    def run():
+        with rigtools.RigBuildTransaction(env.armature) as transaction:
+            transaction.constrain(specs)
+
+    return run
+
+
+@case("strip_constraints", mutates=True)
+def _(env):
+    rigtools = _rigtools()
+    with rigtools.RigBuildTransaction(env.armature) as transaction:
+        transaction.constrain(_parent_specs(env))
+    return lambda: rigtools.strip_constraints(env.armature)
+
+
+# --- Generators
+
+
+def _generator_case(name: str, length: int, run_chain):
+    @case(name, mutates=True)
+    def _(env):
+        rigtools = _rigtools()
+        chains = env.segments(length)
+        if not chains:
+            return None
+
+        def run():
+            with rigtools.RigBuildTransaction(env.armature) as transaction:
+                run_chain(rigtools, env.armature, chains, transaction)
+
+        return run
+
+
+_generator_case(
+    "create_lever_mechanism",
+    4,
+    lambda rigtools, armature, chains, transaction: [
+        rigtools.create_lever_mechanism(armature, chain, transaction)
+        for chain in chains
+    ],
+)
+_generator_case(
+    "create_tail_mechanism",
+    8,
+    lambda rigtools, armature, chains, transaction: [
+        rigtools.create_tail_mechanism(armature, chain, transaction) for chain in chains
+    ],
+)
+_generator_case(
+    "create_tentacle_mechanism",
+    8,
+    lambda rigtools, armature, chains, transaction: [
+        rigtools.create_tentacle_mechanism(armature, chain, transaction)
+        for chain in chains
+    ],
+)
+_generator_case(
+    "create_unity_leg_helpers",
+    4,
+    lambda rigtools, armature, chains, transaction: rigtools.create_unity_leg_helpers(
+        armature, chains, transaction
+    ),
+)
+_generator_case(
+    "create_unity_leg_helper",
+    4,
+    lambda rigtools, armature, chains, transaction: rigtools.create_unity_leg_helper(
+        armature, chains[0], transaction
+    ),
+)
+
+
+@case("create_target_armature", mutates=True)
+def _(env):
+    rigtools = _rigtools()
+    # Parents come first, the target bones are parented like the source bones
+    bone_names = env.names[:SELECTED_BONES]
+    return lambda: rigtools.create_target_armature(env.armature, bone_names)
+
+
+@case(
+    "create_target_armature.separate",
+    ["separate_target_name", "copy_bone_properties"],
+    mutates=True,
+)
+def _(env):
+    rigtools = _rigtools()
+    bone_names = env.names[:SELECTED_BONES]
+    return lambda: rigtools.create_target_armature(
+        env.armature, bone_names, mode="SEPARATE"
+    )
+
+
+@case(
+    "profiling",
+    [
+        "PHASES",
+        "RigProfile",
+        "active_profile",
+        "log_profile",
+        "profile_count",
+        "profile_phase",
+        "profiled",
+        "profiling",
+        "resume_profiling",
+    ],
+    mutates=True,
+)
+def _(env):
+    # The lever generator with profiling on, compare with create_lever_mechanism
+    rigtools = _rigtools()
+    chains = env.segments(4)
+    if not chains:
+        return None
+
+    def run():
+        with rigtools.profiling("benchmark"):
+            with rigtools.RigBuildTransaction(env.armature) as transaction:
+                for chain in chains:
+                    rigtools.create_lever_mechanism(env.armature, chain, transaction)
+
+    return run
+
+
+def _lever_job(env):
+    rigtools = _rigtools()
+    chains = env.segments(4)
+    if not chains:
+        return None
+    return rigtools.RigJob(
+        env.armature,
+        [
+            lambda transaction, chain=chain: rigtools.create_lever_mechanism(
+                env.armature, chain, transaction
+            )
+            for chain in chains
+        ],
+        journaled=True,
+    )
+
+
+@case("RigJob", ["RigJob", "RigJournal"], mutates=True)
+def _(env):
+    # The lever generator stepped like a modal operator, compare with create_lever_mechanism
+    job = _lever_job(env)
+    return job and job.run
+
+
+@case("RigJob.cancel", mutates=True)
+def _(env):
+    # Rolling back the lever generator halfway through the commit
+    job = _lever_job(env)
+    if job is None:
+        return None
+
+    def run():
+        job.start()
+        while job.step() and job.progress < 0.9:
+            pass
+        job.cancel()
+
+    return run
+
+
+@case("analyze_rig_cost", ["analyze_rig_cost", "RigCostReport"], mutates=True)
+def _(env):
+    # The tail generator adds three constraints per bone to analyze
+    rigtools = _rigtools()
+    with rigtools.RigBuildTransaction(env.armature) as transaction:
+        for chain in env.segments(8):
+            rigtools.create_tail_mechanism(env.armature, chain, transaction)
+    env.bpy.ops.object.mode_set(mode="POSE")
+    return lambda: rigtools.analyze_rig_cost(env.armature)
+
+
+# --- Planning
+
+
+@case("ArmatureModel.capture", ["ArmatureModel", "BoneView"])
+def _(env):
+    rigtools = _rigtools()
+    return lambda: rigtools.ArmatureModel.capture(env.armature)
+
+
+@case("ArmatureModel.write", mutates=True)
+def _(env):
+    rigtools = _rigtools()
+    snapshot = rigtools.ArmatureSnapshot.capture(env.armature)
+
+    def run():
+        model = rigtools.ArmatureModel.from_snapshot(snapshot)
+        for i in range(LOOKUPS):
+            model.add_bone(f"NEW-{i}", head=(0.0, 0.0, 0.0), tail=(0.0, 0.0, 1.0))
+        model.write(env.armature)
+
+    return run
+
+
+def _plan_case(name: str, length: int, plan_chains, covers=()):
+    # Every run plans on a fresh model, planning twice would only reuse the bones
+    @case(name, covers)
+    def _(env):
+        rigtools = _rigtools()
+        chains = env.segments(length)
+        if not chains:
+            return None
+        snapshot = rigtools.ArmatureSnapshot.capture(env.armature)
+        return lambda: plan_chains(
+            rigtools, env, rigtools.ArmatureModel.from_snapshot(snapshot), chains
+        )
+
+
+_plan_case(
+    "plan_lever_mechanism",
+    4,
+    lambda rigtools, env, model, chains: [
+        rigtools.plan_lever_mechanism(model, chain) for chain in chains
+    ],
+)
+_plan_case(
+    "plan_tail_mechanism",
+    8,
+    lambda rigtools, env, model, chains: [
+        rigtools.plan_tail_mechanism(model, chain) for chain in chains
+    ],
+)
+_plan_case(
+    "plan_tentacle_mechanism",
+    8,
+    lambda rigtools, env, model, chains: [
+        rigtools.plan_tentacle_mechanism(
+            model, chain, rigtools.tentacle_curve_name(env.armature, chain[0])
+        )
+        for chain in chains
+    ],
+    [
+        "plan_tentacle_mechanism",
+        "tentacle_curve_name",
+        "tentacle_segments",
+        "segment_curve_name",
+    ],
+)
+_plan_case(
+    "plan_unity_leg_helpers",
+    4,
+    lambda rigtools, env, model, chains: rigtools.plan_unity_leg_helpers(model, chains),
+)
+
+
+def _same_shape_model(rigtools, env, chains):
+    # Moves every chain and its parent onto a copy of the first one, like the limbs
+    # of a character share their shape
+    model = rigtools.ArmatureModel.capture(env.armature)
+    rows = np.array([[model.rows[name] for name in chain] for chain in chains])
+    rows = np.concatenate([model.parents[rows[:, :1]], rows], axis=1)
+    offsets = model.heads[rows[:, 0]] - model.heads[rows[0, 0]]
+    heads = model.heads[rows[0]] + offsets[:, None]
+    tails = model.tails[rows[0]] + offsets[:, None]
+    model.set_heads(rows.ravel(), heads.reshape(-1, 3))
+    model.set_tails(rows.ravel(), tails.reshape(-1, 3))
+    return lambda: rigtools.ArmatureModel(
+        model.names,
+        model.heads,
+        model.tails,
+        model.rolls,
+        model.parents,
+        model.use_connect,
+        model.use_deform,
+    )
+
+
+@case("plan_lever_mechanism.same_shape")
+def _(env):
+    # Compare with TemplateCache
+    rigtools = _rigtools()
+    chains = env.segments(4)
+    if not chains:
+        return None
+    new_model = _same_shape_model(rigtools, env, chains)
+
+    def run():
+        model = new_model()
+        for chain in chains:
+            rigtools.plan_lever_mechanism(model, chain)
+
+    return run
+
+
+@case("TemplateCache", ["TemplateCache", "MechanismTemplate"])
+def _(env):
+    # The lever generator planning all the chains from the first one's template
+    rigtools = _rigtools()
+    chains = env.segments(4)
+    if not chains:
+        return None
+    new_model = _same_shape_model(rigtools, env, chains)
+
+    def run():
+        model, templates = new_model(), rigtools.TemplateCache()
+        for chain in chains:
+            templates.plan(model, "lever", rigtools.plan_lever_mechanism, chain)
+
+    return run
+
+
+@case("fit_rigid_transform")
+def _(env):
+    rigtools = _rigtools()
+    snapshot = rigtools.ArmatureSnapshot.capture(env.armature)
+    points = [
+        np.concatenate([snapshot.heads[rows], snapshot.tails[rows]])
+        for rows in (
+            [snapshot.row(name) for name in chain] for chain in env.segments(4)
+        )
+    ]
+    if len(points) < 2:
+        return None
+    return lambda: [rigtools.fit_rigid_transform(points[0], other) for other in points]
+
+
+@case("sample_polyline", ["sample_polyline", "DEFAULT_CONTROL_COUNT"])
+def _(env):
+    rigtools = _rigtools()
+    points = np.cumsum(env.random.normal(size=(env.size, 3)), axis=0)
+    return lambda: rigtools.sample_polyline(points, rigtools.DEFAULT_CONTROL_COUNT)
+
+
+@case("plan_target_armature")
+def _(env):
+    rigtools = _rigtools()
+    snapshot = rigtools.ArmatureSnapshot.capture(env.armature)
+    bone_names = env.names[:SELECTED_BONES]
+    return lambda: rigtools.plan_target_armature(
+        rigtools.ArmatureModel.from_snapshot(snapshot), bone_names
+    )
+
+
+# --- Manifests
+
+
+def _tail_manifests(env) -> list:
+    rigtools = _rigtools()
+    return [rigtools.MechanismManifest("tail", chain) for chain in env.segments(8)]
+
+
+@case("store_manifests", ["store_manifests", "source_fingerprint", "MechanismManifest"])
+def _(env):
+    rigtools = _rigtools()
+    manifests = _tail_manifests(env)
+    snapshot = rigtools.ArmatureSnapshot.capture(env.armature)
+    return lambda: rigtools.store_manifests(env.armature, manifests, snapshot)
+
+
+@case("find_changed_manifests", ["find_changed_manifests", "load_manifests"])
+def _(env):
+    rigtools = _rigtools()
+    snapshot = rigtools.ArmatureSnapshot.capture(env.armature)
+    rigtools.store_manifests(env.armature, _tail_manifests(env), snapshot)
+    return lambda: rigtools.find_changed_manifests(env.armature, snapshot)
+
+
+def _prepare_rebuild(env) -> bool:
+    """
+    Rigs tails, then moves one of their source bones so exactly one needs a rebuild.
+    """
+    rigtools = _rigtools()
+    chains = env.segments(8)
+    if not chains:
+        return False
+
+    with rigtools.RigBuildTransaction(env.armature) as transaction:
+        for chain in chains:
+            rigtools.create_tail_mechanism(env.armature, chain, transaction)
+    env.armature.data.edit_bones[chains[0][0]].roll += 0.5
+    return True
+
+
+@case("rebuild_changed_mechanisms", mutates=True)
+def _(env):
+    rigtools = _rigtools()
+    if not _prepare_rebuild(env):
+        return None
+    return lambda: rigtools.rebuild_changed_mechanisms(env.armature)
+
+
+# --- Rig descriptions
+
+
+def _rigged_description(env):
+    # The tail generator output of a few chains, the same rig is then loaded
+    rigtools = _rigtools()
+    chains = env.segments(8)
+    if not chains:
+        return None
+    with rigtools.RigBuildTransaction(env.armature) as transaction:
+        for chain in chains:
+            rigtools.create_tail_mechanism(env.armature, chain, transaction)
+    return rigtools.capture_rig(env.armature)
+
+
+@case("save_rig", ["save_rig", "capture_rig", "RigDescription"])
+def _(env):
+    rigtools = _rigtools()
+    path = os.path.join(tempfile.mkdtemp(), "rig.bin")
+    return lambda: rigtools.save_rig(env.armature, path)
+
+
+@case("load_rig", ["load_rig", "apply_rig_description"], mutates=True)
+def _(env):
+    rigtools = _rigtools()
+    description = _rigged_description(env)
+    if description is None:
+        return None
+    path = os.path.join(tempfile.mkdtemp(), "rig.bin")
+    description.save(path)
+
+    # Loaded onto a fresh armature of the same shape, like a cache hit
+    fresh = Environment(env.backend, env.shape, env.size)
+    return lambda: rigtools.load_rig(fresh.armature, path)
+
+
+# --- Operators
+
+# Operators working on chains get chains of this length selected, the others bones
+_OPERATOR_CHAIN_LENGTHS = {
+    "CreateBoneChainLeverMechanism": 4,
+    "CreateTailChainMechanism": 8,
+    "CreateTentacleChainMechanism": 8,
+    "CreateUnityLegHelper": 4,
+}
+
+
+def _operator_classes() -> list:
+    from cai_rigtools import operators
+
+    return [
+        cls
+        for _, cls in inspect.getmembers(operators, inspect.isclass)
+        if issubclass(cls, operators.BaseOperator) and hasattr(cls, "bl_idname")
+    ]
+
+
+def _register_operator_cases():
+    for operator_class in _operator_classes():
+
+        def setup(env, operator_class=operator_class):
+            name = operator_class.__name__
+            if name == "RebuildChangedMechanisms":
+                if not _prepare_rebuild(env):
+                    return None
+                env.select([])
+            elif name in _OPERATOR_CHAIN_LENGTHS:
+                chains = env.segments(_OPERATOR_CHAIN_LENGTHS[name])
+                if not chains:
+                    return None
+                env.select([bone_name for chain in chains for bone_name in chain])
+            else:
+                env.select(env.names[:SELECTED_BONES])
+            return lambda: env.backend.run_operator(operator_class)
+
+        CASES.append(Case(operator_class.__name__, "operator", [], setup, mutates=True))
+
+
+def _uncovered() -> List[str]:
+    rigtools = _rigtools()
+    covered = {name for case in CASES for name in case.covers}
+    return sorted(
+        name
+        for name in rigtools.__all__
+        if callable(getattr(rigtools, name)) and name not in covered
+    )
+
+
+def _time_case(backend, case: Case, shape: str, size: int, repeat: int, shared):
+    result = Result(case.name, case.kind, shape, size)
+    try:
+        for _ in range(repeat):
+            if case.mutates or shared.get("env") is None:
+                env = Environment(backend, shape, size)
+                shared["env"] = None if case.mutates else env
+            else:
+                env = shared["env"]
+            env.ensure_edit_mode()
+
+            run = case.setup(env)
+            if run is None:
+                result.status = "skipped"
+                return result
+
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                start = time.perf_counter()
+                run()
+                result.times.append(time.perf_counter() - start)
+    except Exception as e:
+        result.status = "error"
+        result.error = f"{type(e).__name__}: {e}"
+        shared["env"] = None
+        return result
+
+    result.best = min(result.times)
+    result.mean = sum(result.times) / len(result.times)
+    return result
+
+
+def _metadata(backend) -> Dict[str, Any]:
+    import cai_rigtools
+
+    try:
+        commit = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=_ROOT,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        "version": list(cai_rigtools.bl_info["version"]),
+        "commit": commit,
+        "backend": backend.name,
+        "blender": list(backend.bpy.app.version),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run_benchmarks(
+    backend,
+    shapes: List[str],
+    sizes: List[int],
+    repeat: int = 3,
+    pattern: Optional[str] = None,
+) -> Dict[str, Any]:
+    _register_operator_cases()
+    # Read only cases share one armature, mutating ones rebuild it every time
+    cases = sorted(
+        (case for case in CASES if not pattern or pattern in case.name),
+        key=lambda case: case.mutates,
+    )
+
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            shared = {}
+            for case in cases:
+                result = _time_case(backend, case, shape, size, repeat, shared)
+                results.append(result)
+                best = (
+                    f"{result.best * 1000:10.2f} ms" if result.best is not None else ""
+                )
+                print(f"{shape:6} {size:7} {case.name:45} {best:14} {result.status}")
+                if result.error:
+                    print(f"    {result.error}")
+
+    return {
+        "meta": _metadata(backend),
+        "results": [asdict(result) for result in results],
+        "uncovered": _uncovered(),
+    }
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any], threshold: float) -> int:
+    """
+    Prints the change of the best times against a previous run, returns the number
+    of cases which became slower than the threshold.
+    """
+
+    def best_times(report):
+        return {
+            (r["case"], r["shape"], r["size"]): r["best"]
+            for r in report["results"]
+            if r["best"]
+        }
+
+    before, after = best_times(previous), best_times(current)
+    regressions = 0
+    for key in sorted(before.keys() & after.keys()):
+        ratio = after[key] / before[key]
+        if ratio > threshold:
+            regressions += 1
+            print(f"SLOWER {ratio:6.2f}x {key[1]:6} {key[2]:7} {key[0]}")
+    print(f"{regressions} regressions over {threshold:.2f}x")
+    return regressions
+
+
+def _parse_arguments(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run", description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=SHAPES)
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--filter", help="Only run cases whose name contains this")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Results of a previous run to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="Slowdown ratio counted as a regression",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["fake", "blender"],
+        # Blender imports bpy before running the script
+        default="blender" if "bpy" in sys.modules else "fake",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    if argv is None and "--" in sys.argv:
+        # Arguments of a script run by Blender
+        argv = sys.argv[sys.argv.index("--") + 1 :]
+    arguments = _parse_arguments(argv)
+
+    backend = BlenderBackend() if arguments.backend == "blender" else FakeBackend()
+    report = run_benchmarks(
+        backend, arguments.shapes, arguments.sizes, arguments.repeat, arguments.filter
+    )
+
+    with open(arguments.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if report["uncovered"]:
+        print(f"Not benchmarked: {', '.join(report['uncovered'])}")
+
+    if arguments.compare:
+        with open(arguments.compare) as f:
+            previous = json.load(f)
+        return 1 if compare(report, previous, arguments.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
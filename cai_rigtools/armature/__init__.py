@@ -1,45 +1,211 @@
 from typing import List, Optional, Tuple
 import uuid
 
-import bpy
-import mathutils
-
-from .utils import (
-    get_armature,
-    select_bones,
-    get_selected_bones,
-    find_pose_bone,
-    find_edit_bone,
-    create_or_update_bone,
-    find_axis_vectors,
-    assign_bone_layer_name,
-    move_bones_to_layer,
+from .arrays import BONE_EPSILON, BoneArrays
+from .specs import (
+    CONSTRAINT_NAME_PREFIX,
+    CONSTRAINT_TYPES,
+    ConstraintSpec,
+    constraint_name,
 )
-
-from .op_target import create_target_armature
-from .op_lever import create_lever_mechanism
-from .op_tail import create_tail_mechanism
-from .op_tentacle import create_tentacle_mechanism
-from .op_unity_leg_helper import create_unity_leg_helper
-
+from .model import ArmatureModel, BoneView
 from .tree_utils import (
+    BoneHierarchyIndex,
     find_bone_chain,
+    partition_bone_chains,
+    partition_bone_chain_rows,
+)
+from .templates import (
+    TEMPLATE_TOLERANCE,
+    MechanismTemplate,
+    TemplateCache,
+    fit_rigid_transform,
+)
+from .symmetry import SymmetryIndex, split_side
+from .analysis import (
+    BONE_COST,
+    CONSTRAINT_COSTS,
+    RigCostReport,
+    analyze_rig_cost,
 )
+from .profiling import (
+    PHASES,
+    RigProfile,
+    active_profile,
+    log_profile,
+    profile_count,
+    profile_phase,
+    profiled,
+    profiling,
+    resume_profiling,
+)
+from .manifest import (
+    MANIFEST_PROPERTY,
+    MechanismManifest,
+    find_changed_manifests,
+    load_manifests,
+    source_fingerprint,
+    store_manifests,
+)
+from .rig_format import RIG_FILE_VERSION, RigDescription
+
+try:
+    import bpy
+except ImportError:
+    # Planning, manifests and the rig file format work without Blender
+    bpy = None
 
 
 __all__ = [
-    "get_armature",
-    "select_bones",
-    "get_selected_bones",
-    "find_pose_bone",
-    "find_edit_bone",
-    "create_or_update_bone",
-    "find_axis_vectors",
-    "assign_bone_layer_name",
-    "move_bones_to_layer",
-    "create_target_armature",
-    "create_lever_mechanism",
-    "create_tail_mechanism",
-    "create_tentacle_mechanism",
-    "create_unity_leg_helper",
+    "ArmatureModel",
+    "BoneView",
+    "BoneHierarchyIndex",
+    "find_bone_chain",
+    "partition_bone_chains",
+    "partition_bone_chain_rows",
+    "TEMPLATE_TOLERANCE",
+    "MechanismTemplate",
+    "TemplateCache",
+    "fit_rigid_transform",
+    "SymmetryIndex",
+    "split_side",
+    "BONE_COST",
+    "CONSTRAINT_COSTS",
+    "RigCostReport",
+    "analyze_rig_cost",
+    "CONSTRAINT_NAME_PREFIX",
+    "CONSTRAINT_TYPES",
+    "ConstraintSpec",
+    "constraint_name",
+    "PHASES",
+    "RigProfile",
+    "active_profile",
+    "log_profile",
+    "profile_count",
+    "profile_phase",
+    "profiled",
+    "profiling",
+    "resume_profiling",
+    "MANIFEST_PROPERTY",
+    "MechanismManifest",
+    "find_changed_manifests",
+    "load_manifests",
+    "source_fingerprint",
+    "store_manifests",
+    "BONE_EPSILON",
+    "BoneArrays",
+    "RIG_FILE_VERSION",
+    "RigDescription",
 ]
+
+if bpy is not None:
+    from .utils import (
+        ArmatureSnapshot,
+        BoneRegistry,
+        BoneSelection,
+        LayerOccupancy,
+        get_armature,
+        select_bones,
+        get_selected_bones,
+        get_bone_selection,
+        find_pose_bone,
+        find_edit_bone,
+        create_or_update_bone,
+        update_bone,
+        find_axis_vectors,
+        find_axis_vectors_batch,
+        find_plane_normals,
+        project_points_onto_planes,
+        assign_bone_layer_name,
+        move_bones_to_layer,
+        bone_rows,
+        request_view_layer_update,
+        deferred_view_layer_update,
+    )
+    from .op_target import (
+        TARGET_MODES,
+        copy_bone_properties,
+        create_target_armature,
+        plan_target_armature,
+        separate_target_name,
+    )
+    from .op_lever import create_lever_mechanism, plan_lever_mechanism
+    from .op_tail import create_tail_mechanism, plan_tail_mechanism
+    from .op_tentacle import (
+        DEFAULT_CONTROL_COUNT,
+        MAX_SPLINE_IK_CHAIN,
+        create_tentacle_mechanism,
+        plan_tentacle_mechanism,
+        sample_polyline,
+        segment_curve_name,
+        tentacle_curve_name,
+        tentacle_segments,
+    )
+    from .op_unity_leg_helper import (
+        create_unity_leg_helper,
+        create_unity_leg_helpers,
+        plan_unity_leg_helpers,
+    )
+    from .op_rebuild import GENERATORS, rebuild_changed_mechanisms
+    from .transaction import RigBuildTransaction, rig_build
+    from .journal import RigJournal
+    from .job import COMMIT_CHUNK_SIZE, RigJob
+    from .rig_file import apply_rig_description, capture_rig, load_rig, save_rig
+    from .constraints import apply_constraint_specs, strip_constraints
+
+    __all__ += [
+        "ArmatureSnapshot",
+        "BoneRegistry",
+        "BoneSelection",
+        "LayerOccupancy",
+        "get_armature",
+        "select_bones",
+        "get_selected_bones",
+        "get_bone_selection",
+        "find_pose_bone",
+        "find_edit_bone",
+        "create_or_update_bone",
+        "update_bone",
+        "find_axis_vectors",
+        "find_axis_vectors_batch",
+        "find_plane_normals",
+        "project_points_onto_planes",
+        "assign_bone_layer_name",
+        "move_bones_to_layer",
+        "bone_rows",
+        "request_view_layer_update",
+        "deferred_view_layer_update",
+        "create_target_armature",
+        "plan_target_armature",
+        "TARGET_MODES",
+        "copy_bone_properties",
+        "separate_target_name",
+        "create_lever_mechanism",
+        "plan_lever_mechanism",
+        "create_tail_mechanism",
+        "plan_tail_mechanism",
+        "DEFAULT_CONTROL_COUNT",
+        "MAX_SPLINE_IK_CHAIN",
+        "create_tentacle_mechanism",
+        "plan_tentacle_mechanism",
+        "sample_polyline",
+        "tentacle_curve_name",
+        "tentacle_segments",
+        "segment_curve_name",
+        "create_unity_leg_helper",
+        "create_unity_leg_helpers",
+        "plan_unity_leg_helpers",
+        "GENERATORS",
+        "rebuild_changed_mechanisms",
+        "RigBuildTransaction",
+        "rig_build",
+        "RigJournal",
+        "COMMIT_CHUNK_SIZE",
+        "RigJob",
+        "apply_rig_description",
+        "capture_rig",
+        "load_rig",
+        "save_rig",
+        "apply_constraint_specs",
+        "strip_constraints",
+    ]
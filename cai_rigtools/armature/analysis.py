@@ -0,0 +1,269 @@
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .tree_utils import BoneHierarchyIndex
+
+# Evaluation cost of a bone without constraints
+BONE_COST = 1.0
+
+# Rough evaluation cost of a constraint relative to a bone, by type
+CONSTRAINT_COSTS: Dict[str, float] = {
+    "COPY_LOCATION": 0.5,
+    "COPY_ROTATION": 0.75,
+    "COPY_SCALE": 0.5,
+    "COPY_TRANSFORMS": 1.0,
+    "LIMIT_DISTANCE": 0.5,
+    "LIMIT_LOCATION": 0.25,
+    "LIMIT_ROTATION": 0.5,
+    "LIMIT_SCALE": 0.25,
+    "MAINTAIN_VOLUME": 0.25,
+    "TRANSFORM": 1.0,
+    "CLAMP_TO": 2.0,
+    "DAMPED_TRACK": 0.75,
+    "IK": 3.0,
+    "LOCKED_TRACK": 1.0,
+    "SPLINE_IK": 3.0,
+    "STRETCH_TO": 1.0,
+    "TRACK_TO": 1.0,
+    "ACTION": 2.0,
+    "ARMATURE": 1.0,
+    "CHILD_OF": 1.0,
+    "FLOOR": 0.5,
+    "FOLLOW_PATH": 2.0,
+    "PIVOT": 0.5,
+    "SHRINKWRAP": 4.0,
+}
+DEFAULT_CONSTRAINT_COST = 1.0
+
+# Solvers whose cost grows with the bones of their chain, the owner and its ancestors
+CHAIN_CONSTRAINT_TYPES = {"IK", "SPLINE_IK"}
+
+# Disabled constraints are not evaluated, but they are still part of the dependency
+# graph and looked at on every evaluation
+DISABLED_CONSTRAINT_FACTOR = 0.1
+
+# Bones listed as fan-in hotspots
+HOTSPOT_COUNT = 10
+
+
+@dataclass
+class RigCostReport:
+    """
+    Static estimate of the pose evaluation cost of an armature, see `analyze_rig_cost`.
+
+    `longest_chain` is the longest run of bones each waiting for the previous one,
+    through parents or constraint targets, it bounds how much of the evaluation can
+    run in parallel. `hotspots` are the bones the most constraints read from, with
+    the number of those constraints. `cycles` are groups of bones depending on each
+    other, Blender can not evaluate them in a stable order.
+    """
+
+    armature: str
+    bones: int = 0
+    constraints: Dict[str, int] = field(default_factory=dict)
+    disabled_constraints: Dict[str, int] = field(default_factory=dict)
+    # Objects other than the armature targeted by constraints, with the number of them
+    external_targets: Dict[str, int] = field(default_factory=dict)
+    longest_chain: List[str] = field(default_factory=list)
+    critical_path_cost: float = 0.0
+    hotspots: List[Tuple[str, int]] = field(default_factory=list)
+    cycles: List[List[str]] = field(default_factory=list)
+    cost: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def summary(self) -> str:
+        text = (
+            f"{self.armature} cost {self.cost:.1f}: {self.bones} bones, "
+            f"{sum(self.constraints.values())} constraints"
+        )
+        if self.disabled_constraints:
+            text += f" ({sum(self.disabled_constraints.values())} disabled)"
+        text += f", longest chain {len(self.longest_chain)} bones"
+        if self.cycles:
+            text += f", {len(self.cycles)} cycles"
+        if self.constraints:
+            text += " | " + ", ".join(
+                f"{constraint_type}: {count}"
+                for constraint_type, count in sorted(self.constraints.items())
+            )
+        return text
+
+
+def _constraint_targets(constraint) -> List[Tuple[object, str]]:
+    targets = [
+        (getattr(constraint, "target", None), getattr(constraint, "subtarget", "")),
+        (
+            getattr(constraint, "pole_target", None),
+            getattr(constraint, "pole_subtarget", ""),
+        ),
+    ]
+    # Armature constraints have a list of targets
+    for target in getattr(constraint, "targets", None) or []:
+        targets.append((target.target, target.subtarget))
+    return [(target, subtarget or "") for target, subtarget in targets if target]
+
+
+def _is_enabled(constraint) -> bool:
+    enabled = getattr(constraint, "enabled", None)
+    if enabled is None:
+        # Blender before 2.92 only has mute
+        enabled = not constraint.mute
+    return bool(enabled) and constraint.influence > 0.0
+
+
+def _strongly_connected(dependencies: List[List[int]]) -> List[List[int]]:
+    """
+    Tarjan's algorithm, iterative. Components come dependencies first.
+    """
+    count = len(dependencies)
+    index = [-1] * count
+    low = [0] * count
+    on_stack = [False] * count
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+
+    for root in range(count):
+        if index[root] >= 0:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, position = work.pop()
+            if position == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+
+            edges = dependencies[node]
+            while position < len(edges):
+                dependency = edges[position]
+                position += 1
+                if index[dependency] < 0:
+                    work.append((node, position))
+                    work.append((dependency, 0))
+                    break
+                if on_stack[dependency]:
+                    low[node] = min(low[node], index[dependency])
+            else:
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+
+    return components
+
+
+def analyze_rig_cost(
+    armature, hierarchy: Optional[BoneHierarchyIndex] = None
+) -> RigCostReport:
+    """
+    Builds the dependency graph of the pose bones, a bone depends on its parent and
+    on the bones its constraints target, and estimates what evaluating it costs:
+    every bone costs `BONE_COST` plus the `CONSTRAINT_COSTS` of its constraints.
+    Reads the pose bones, so call it outside of edit mode. Nothing is changed.
+    """
+    if hierarchy is None:
+        hierarchy = BoneHierarchyIndex.from_armature(armature)
+    count = len(hierarchy)
+    report = RigCostReport(armature.name, bones=count)
+
+    costs = [BONE_COST] * count
+    dependencies = [[parent] if parent >= 0 else [] for parent in hierarchy.parents]
+    readers = Counter()
+    constraints = Counter()
+    disabled = Counter()
+    external = Counter()
+
+    for pose_bone in armature.pose.bones:
+        row = hierarchy.rows.get(pose_bone.name)
+        if row is None:
+            continue
+
+        for constraint in pose_bone.constraints:
+            constraint_type = constraint.type
+            constraints[constraint_type] += 1
+            cost = CONSTRAINT_COSTS.get(constraint_type, DEFAULT_CONSTRAINT_COST)
+            if not _is_enabled(constraint):
+                disabled[constraint_type] += 1
+                cost *= DISABLED_CONSTRAINT_FACTOR
+
+            # The whole chain of a solver waits for its targets
+            owners = [row]
+            if constraint_type in CHAIN_CONSTRAINT_TYPES:
+                chain_count = getattr(constraint, "chain_count", 0) or 0
+                length = chain_count if chain_count > 0 else hierarchy.depths[row] + 1
+                while len(owners) < length and hierarchy.parents[owners[-1]] >= 0:
+                    owners.append(hierarchy.parents[owners[-1]])
+                cost *= len(owners)
+            costs[row] += cost
+
+            for target, subtarget in _constraint_targets(constraint):
+                if target != armature:
+                    external[target.name] += 1
+                    continue
+                target_row = hierarchy.rows.get(subtarget)
+                if target_row is None:
+                    continue
+                readers[target_row] += 1
+                for owner in owners:
+                    dependencies[owner].append(target_row)
+
+    report.constraints = dict(constraints)
+    report.disabled_constraints = dict(disabled)
+    report.external_targets = dict(external)
+    report.cost = sum(costs)
+    report.hotspots = [
+        (hierarchy.names[row], readers[row])
+        for row, _ in readers.most_common(HOTSPOT_COUNT)
+    ]
+
+    components = _strongly_connected(dependencies)
+    component_of = [0] * count
+    for i, component in enumerate(components):
+        for row in component:
+            component_of[row] = i
+        if len(component) > 1 or component[0] in dependencies[component[0]]:
+            report.cycles.append(sorted(hierarchy.names[row] for row in component))
+
+    # Longest path over the components, their dependencies come before them
+    lengths = [0] * len(components)
+    path_costs = [0.0] * len(components)
+    previous = [-1] * len(components)
+    for i, component in enumerate(components):
+        longest, path_cost = -1, 0.0
+        for row in component:
+            for dependency in dependencies[row]:
+                j = component_of[dependency]
+                if j == i:
+                    continue
+                if longest < 0 or lengths[j] > lengths[longest]:
+                    longest = j
+                path_cost = max(path_cost, path_costs[j])
+        lengths[i] = len(component) + (lengths[longest] if longest >= 0 else 0)
+        path_costs[i] = path_cost + sum(costs[row] for row in component)
+        previous[i] = longest
+
+    if components:
+        report.critical_path_cost = max(path_costs)
+        i = max(range(len(components)), key=lengths.__getitem__)
+        chain = []
+        while i >= 0:
+            chain.append(sorted(components[i], key=hierarchy.depths.__getitem__))
+            i = previous[i]
+        report.longest_chain = [
+            hierarchy.names[row] for component in reversed(chain) for row in component
+        ]
+
+    return report
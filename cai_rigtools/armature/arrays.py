@@ -0,0 +1,182 @@
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .profiling import profiled
+
+# Geometry closer than this is considered unchanged
+BONE_EPSILON = 1e-6
+
+# Above this ratio of changed rows a single bulk write is cheaper
+BULK_WRITE_RATIO = 0.25
+
+
+class BoneArrays:
+    """
+    Edit bone geometry of an armature as contiguous NumPy arrays, one row per bone.
+
+    Head, tail, roll, parent index, use_connect and use_deform of every bone are
+    pulled in with `foreach_get`, one call per property. Callers read and modify
+    the arrays, then `write_back` pushes only the rows that changed. Bones created
+    after the capture are not part of it and parent indices reflect the hierarchy
+    at capture time. Nothing here imports Blender.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        heads: np.ndarray,
+        tails: np.ndarray,
+        rolls: np.ndarray,
+        parents: np.ndarray,
+        use_connect: np.ndarray,
+        use_deform: np.ndarray,
+    ):
+        self.names: List[str] = list(names)
+        self.rows: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.heads = heads
+        self.tails = tails
+        self.rolls = rolls
+        self.parents = parents
+        self.use_connect = use_connect
+        self.use_deform = use_deform
+        self.dirty = np.zeros(len(self.names), dtype=bool)
+
+    @classmethod
+    @profiled("edit")
+    def capture(cls, armature) -> "BoneArrays":
+        """
+        Reads all edit bones of the armature, has to be called in edit mode.
+        """
+        edit_bones = armature.data.edit_bones
+        count = len(edit_bones)
+
+        heads = np.empty(count * 3, dtype=np.float32)
+        tails = np.empty(count * 3, dtype=np.float32)
+        rolls = np.empty(count, dtype=np.float32)
+        use_connect = np.empty(count, dtype=bool)
+        use_deform = np.empty(count, dtype=bool)
+
+        edit_bones.foreach_get("head", heads)
+        edit_bones.foreach_get("tail", tails)
+        edit_bones.foreach_get("roll", rolls)
+        edit_bones.foreach_get("use_connect", use_connect)
+        edit_bones.foreach_get("use_deform", use_deform)
+
+        # Names and parents are not available through foreach_get
+        names = [bone.name for bone in edit_bones]
+        rows = {name: i for i, name in enumerate(names)}
+        parents = np.fromiter(
+            (rows[bone.parent.name] if bone.parent else -1 for bone in edit_bones),
+            dtype=np.int32,
+            count=count,
+        )
+
+        return cls(
+            names,
+            heads.reshape(count, 3),
+            tails.reshape(count, 3),
+            rolls,
+            parents,
+            use_connect,
+            use_deform,
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, bone_name: str) -> bool:
+        return bone_name in self.rows
+
+    def row(self, bone_name: str) -> int:
+        return self.rows[bone_name]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.linalg.norm(self.tails - self.heads, axis=1)
+
+    def roll(self, bone_name: str) -> float:
+        return float(self.rolls[self.rows[bone_name]])
+
+    def length(self, bone_name: str) -> float:
+        row = self.rows[bone_name]
+        return float(np.linalg.norm(self.tails[row] - self.heads[row]))
+
+    def parent(self, bone_name: str) -> Optional[str]:
+        parent = self.parents[self.rows[bone_name]]
+        return self.names[parent] if parent >= 0 else None
+
+    def set_head(self, bone_name: str, head):
+        row = self.rows[bone_name]
+        self.heads[row] = head
+        self.dirty[row] = True
+
+    def set_tail(self, bone_name: str, tail):
+        row = self.rows[bone_name]
+        self.tails[row] = tail
+        self.dirty[row] = True
+
+    def set_heads(self, rows: np.ndarray, heads: np.ndarray):
+        self.heads[rows] = heads
+        self.dirty[rows] = True
+
+    def set_tails(self, rows: np.ndarray, tails: np.ndarray):
+        self.tails[rows] = tails
+        self.dirty[rows] = True
+
+    def set_roll(self, bone_name: str, roll: float):
+        row = self.rows[bone_name]
+        self.rolls[row] = roll
+        self.dirty[row] = True
+
+    def set_rolls(self, rows: np.ndarray, rolls: np.ndarray):
+        self.rolls[rows] = rolls
+        self.dirty[rows] = True
+
+    @profiled("edit")
+    def write_back(self, armature) -> int:
+        """
+        Writes the changed rows back to the edit bones. Returns the number of rows written.
+        """
+        dirty_rows = np.flatnonzero(self.dirty)
+        return sum(write_bone_rows(armature.data.edit_bones, self, dirty_rows))
+
+
+def write_bone_rows(
+    edit_bones, bones, rows: np.ndarray, chunk_size: Optional[int] = None
+) -> Iterator[int]:
+    """
+    Writes the given rows of `bones` (anything with the arrays of `BoneArrays`) to
+    the edit bones. With one foreach_set per property if enough rows changed and the
+    rows match the edit bones one to one, else bone by bone in chunks of at most
+    `chunk_size`. Written rows are marked clean chunk by chunk, yields the number of
+    rows written by each chunk.
+    """
+    if not len(rows):
+        return
+
+    # Bulk writes need the rows to match the edit bones one to one
+    in_sync = len(edit_bones) == len(bones)
+    if in_sync and len(rows) > len(bones) * BULK_WRITE_RATIO:
+        edit_bones.foreach_set("use_connect", bones.use_connect)
+        edit_bones.foreach_set("head", bones.heads.ravel())
+        edit_bones.foreach_set("tail", bones.tails.ravel())
+        edit_bones.foreach_set("roll", bones.rolls)
+        edit_bones.foreach_set("use_deform", bones.use_deform)
+        bones.dirty[:] = False
+        yield len(rows)
+        return
+
+    chunk_size = chunk_size or len(rows)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start : start + chunk_size]
+        for row in chunk:
+            edit_bone = edit_bones[bones.names[row]]
+            # Connecting moves the head, it is written afterwards
+            edit_bone.use_connect = bool(bones.use_connect[row])
+            edit_bone.head = bones.heads[row]
+            edit_bone.tail = bones.tails[row]
+            edit_bone.roll = float(bones.rolls[row])
+            edit_bone.use_deform = bool(bones.use_deform[row])
+        bones.dirty[chunk] = False
+        yield len(chunk)
@@ -0,0 +1,185 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import bpy
+
+from .profiling import profile_count, profiled
+from .specs import (
+    CONSTRAINT_NAME_PREFIX,
+    CONSTRAINT_TYPES,
+    ConstraintSpec,
+    constraint_name,
+)
+
+
+def _patch(constraint, values: Dict[str, Any]) -> bool:
+    changed = False
+    for attribute, value in values.items():
+        if getattr(constraint, attribute) != value:
+            setattr(constraint, attribute, value)
+            changed = True
+    return changed
+
+
+def _differs(constraint, values: Dict[str, Any]) -> bool:
+    return any(getattr(constraint, a) != value for a, value in values.items())
+
+
+def constraint_state(constraints, constraint) -> Dict[str, Any]:
+    """
+    Type, position in the stack and every writable setting of the constraint,
+    enough for `restore_constraint` to put it back.
+    """
+    values = {}
+    for prop in constraint.bl_rna.properties:
+        if prop.is_readonly or prop.type == "COLLECTION" or prop.identifier == "name":
+            continue
+        value = getattr(constraint, prop.identifier)
+        if hasattr(value, "copy"):
+            # Vectors and matrices would follow the constraint
+            value = value.copy()
+        elif hasattr(value, "__len__") and not isinstance(value, str):
+            value = tuple(value)
+        values[prop.identifier] = value
+
+    return {
+        "type": constraint.type,
+        "index": list(constraints).index(constraint),
+        "values": values,
+    }
+
+
+def restore_constraint(pose_bone, key: str, state: Dict[str, Any]):
+    """
+    Puts the constraint `key` of the pose bone back to a `constraint_state`,
+    creating it again if it is gone or has another type.
+    """
+    constraints = pose_bone.constraints
+    constraint = constraints.get(key)
+    if constraint is not None and constraint.type != state["type"]:
+        constraints.remove(constraint)
+        constraint = None
+    if constraint is None:
+        constraint = constraints.new(state["type"])
+        constraint.name = key
+
+    for attribute, value in state["values"].items():
+        try:
+            setattr(constraint, attribute, value)
+        except (AttributeError, TypeError, ValueError):
+            # Settings which depend on others, e.g. a subtarget without target
+            pass
+
+    index = list(constraints).index(constraint)
+    if index != state["index"]:
+        constraints.move(index, min(state["index"], len(constraints) - 1))
+
+
+@profiled("constraints")
+def apply_constraint_specs(
+    armature,
+    specs: Iterable[ConstraintSpec],
+    registry=None,
+    created: Optional[List[Tuple[str, str]]] = None,
+    previous: Optional[Dict[Tuple[str, str], Dict[str, Any]]] = None,
+) -> Dict[str, int]:
+    """
+    Creates or updates the constraints described by the specs, has to be called
+    in pose mode. Constraints are looked up by the spec's key, existing ones are
+    patched in place instead of being added again, so applying the same specs
+    twice leaves the rig unchanged.
+    Returns the number of created, updated and unchanged constraints, the bone and
+    name of the created ones are appended to `created` if given. The
+    `constraint_state` of existing constraints is put into `previous`, by bone and
+    name, before they are first patched or replaced.
+    """
+    counts = Counter(created=0, updated=0, unchanged=0)
+
+    for spec in specs:
+        if registry is not None:
+            pose_bone = registry.pose_bone(spec.bone)
+        else:
+            pose_bone = armature.pose.bones.get(spec.bone)
+        if pose_bone is None:
+            raise RuntimeError(f"Bone {spec.bone} not found for constraint {spec.key}")
+
+        values = {}
+        if spec.target is not None:
+            values["target"] = bpy.data.objects[spec.target]
+        elif spec.subtarget:
+            values["target"] = armature
+        if spec.subtarget:
+            values["subtarget"] = spec.subtarget
+        values.update(spec.properties)
+
+        constraints = pose_bone.constraints
+        constraint = constraints.get(spec.key)
+        replaced = constraint is not None and constraint.type != spec.type
+        if (
+            previous is not None
+            and constraint is not None
+            and (replaced or _differs(constraint, values))
+            and (spec.bone, spec.key) not in previous
+        ):
+            previous[(spec.bone, spec.key)] = constraint_state(constraints, constraint)
+        if replaced:
+            constraints.remove(constraint)
+            constraint = None
+
+        if constraint is None:
+            constraint = constraints.new(spec.type)
+            constraint.name = spec.key
+            _patch(constraint, values)
+            counts["created"] += 1
+            if created is not None:
+                created.append((spec.bone, spec.key))
+        elif _patch(constraint, values):
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+
+    profile_count("constraints_added", counts["created"])
+    profile_count("constraints_updated", counts["updated"])
+    return dict(counts)
+
+
+@profiled("constraints")
+def strip_constraints(
+    armature,
+    bone_names: Optional[Iterable[str]] = None,
+    types: Optional[Iterable[str]] = None,
+    subtarget: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Removes constraints from the given pose bones, or from every bone of the
+    armature if no bone names are given. Constraints can be filtered by type,
+    subtarget and name prefix. Each bone is visited once, removing in reverse
+    order so the collection is never mutated ahead of the iteration.
+    Returns the number of removed constraints per type.
+    """
+    pose_bones = armature.pose.bones
+    if bone_names is not None:
+        pose_bones = [pose_bones.get(name) for name in bone_names]
+    types = set(types) if types else None
+
+    removed = Counter()
+    for pose_bone in pose_bones:
+        if pose_bone is None:
+            continue
+
+        constraints = pose_bone.constraints
+        for i in reversed(range(len(constraints))):
+            constraint = constraints[i]
+            if types is not None and constraint.type not in types:
+                continue
+            if subtarget and getattr(constraint, "subtarget", None) != subtarget:
+                continue
+            if name_prefix and not constraint.name.startswith(name_prefix):
+                continue
+
+            removed[constraint.type] += 1
+            constraints.remove(constraint)
+
+    profile_count("constraints_removed", sum(removed.values()))
+    return dict(removed)
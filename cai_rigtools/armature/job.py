@@ -0,0 +1,103 @@
+from typing import Callable, List, Optional
+
+from .tree_utils import BoneHierarchyIndex
+from .transaction import RigBuildTransaction
+from .templates import TemplateCache
+
+# Bones or constraints written between two steps of a job
+COMMIT_CHUNK_SIZE = 256
+
+# A step runs one generator in the job's transaction and returns the created bones
+JobStep = Callable[[RigBuildTransaction], List[str]]
+
+
+class RigJob:
+    """
+    Runs generators one step at a time inside a single transaction: each generator
+    is a step, then the commit is split into chunks. `run` does all the steps at
+    once, a modal operator does a few of them per timer event, both end up with the
+    same rig. A `journaled` job rolls back every step done when it is cancelled or
+    fails. The journal costs a snapshot of the armature, only modal runs which can
+    be cancelled need it.
+
+        job = RigJob(armature, [lambda t: create_target_armature(armature, bones, "TGT", t)], journaled=True)
+        job.start()
+        while job.step():
+            print(f"{job.progress:.0%}")
+    """
+
+    def __init__(
+        self,
+        armature,
+        steps: List[JobStep],
+        hierarchy: Optional[BoneHierarchyIndex] = None,
+        chunk_size: int = COMMIT_CHUNK_SIZE,
+        templates: Optional[TemplateCache] = None,
+        journaled: bool = False,
+    ):
+        self.armature = armature
+        self.steps = list(steps)
+        self.chunk_size = chunk_size
+        self.transaction = RigBuildTransaction(
+            armature, hierarchy, journaled=journaled, templates=templates
+        )
+        self.created_bones: List[str] = []
+
+        self._next_step = 0
+        self._commit = None
+        self._commit_progress = 0.0
+        self.finished = False
+
+    @property
+    def progress(self) -> float:
+        # The commit counts as much as one generator
+        return (self._next_step + self._commit_progress) / (len(self.steps) + 1)
+
+    def start(self):
+        self.transaction.__enter__()
+
+    def step(self) -> bool:
+        """
+        Does the next step, returns False once the job is finished.
+        """
+        if self.finished:
+            return False
+
+        try:
+            if self._next_step < len(self.steps):
+                created_bones = self.steps[self._next_step](self.transaction)
+                self.created_bones += created_bones or []
+                self._next_step += 1
+                return True
+
+            if self._commit is None:
+                self._commit = self.transaction.commit_steps(self.chunk_size)
+            progress = next(self._commit, None)
+        except BaseException:
+            self.cancel()
+            raise
+
+        if progress is None:
+            self._commit_progress = 1.0
+            self.finished = True
+            return False
+
+        self._commit_progress = progress
+        return True
+
+    def run(self) -> List[str]:
+        self.start()
+        while self.step():
+            pass
+        return self.created_bones
+
+    def cancel(self):
+        """
+        Rolls back everything done so far, without a journal only the queued work
+        is dropped.
+        """
+        if self._commit is not None:
+            self._commit.close()
+            self._commit = None
+        self.transaction.rollback()
+        self.finished = True
@@ -0,0 +1,119 @@
+from typing import Any, Dict, List, Tuple
+
+import bpy
+import numpy as np
+
+from .utils import ArmatureSnapshot
+from .model import ArmatureModel
+from .manifest import MANIFEST_PROPERTY
+from .constraints import restore_constraint
+
+
+class RigJournal:
+    """
+    What a transaction needs to undo itself: the edit bones and manifests as they
+    were when it started, the objects and curves that existed then, the constraints
+    it created since and the state of the existing constraints it changed.
+    """
+
+    def __init__(self, armature):
+        self.snapshot = ArmatureSnapshot.capture(armature)
+        self.manifests = armature.data.get(MANIFEST_PROPERTY)
+        self.objects = set(bpy.data.objects.keys())
+        self.curves = set(bpy.data.curves.keys())
+        # (bone, constraint name) of every created constraint
+        self.constraints: List[Tuple[str, str]] = []
+        # (bone, constraint name) -> `constraint_state` before the first change
+        self.changed_constraints: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.existing_constraints = {
+            (pose_bone.name, constraint.name)
+            for pose_bone in armature.pose.bones
+            for constraint in pose_bone.constraints
+        }
+
+    def remove_constraints(self, armature) -> int:
+        """
+        Removes the created constraints, has to be called in pose mode.
+        """
+        removed = 0
+        pose_bones = armature.pose.bones
+        for bone_name, key in reversed(self.constraints):
+            pose_bone = pose_bones.get(bone_name)
+            constraint = pose_bone.constraints.get(key) if pose_bone else None
+            if constraint is not None:
+                pose_bone.constraints.remove(constraint)
+                removed += 1
+        self.constraints.clear()
+        return removed
+
+    def restore_constraints(self, armature) -> int:
+        """
+        Puts back the constraints which existed at the capture and were patched or
+        replaced since, has to be called in pose mode after `remove_constraints`.
+        """
+        restored = 0
+        pose_bones = armature.pose.bones
+        for (bone_name, key), state in self.changed_constraints.items():
+            pose_bone = pose_bones.get(bone_name)
+            # Constraints created since are gone already
+            if pose_bone is not None and (bone_name, key) in self.existing_constraints:
+                restore_constraint(pose_bone, key, state)
+                restored += 1
+        self.changed_constraints.clear()
+        return restored
+
+    def restore_edit_bones(self, armature) -> int:
+        """
+        Removes the bones created since the capture and writes back the captured
+        state of the others, has to be called in edit mode. Returns the number of
+        bones whose state was restored.
+        """
+        snapshot = self.snapshot
+        edit_bones = armature.data.edit_bones
+        for edit_bone in [b for b in edit_bones if b.name not in snapshot.rows]:
+            edit_bones.remove(edit_bone)
+
+        current = ArmatureSnapshot.capture(armature)
+        if current.names != snapshot.names:
+            raise RuntimeError("Bones were renamed or removed, can not roll back")
+
+        changed = np.flatnonzero(
+            (current.parents != snapshot.parents)
+            | (current.use_connect != snapshot.use_connect)
+            | (current.use_deform != snapshot.use_deform)
+            | (current.rolls != snapshot.rolls)
+            | np.any(current.heads != snapshot.heads, axis=1)
+            | np.any(current.tails != snapshot.tails, axis=1)
+        )
+
+        model = ArmatureModel.from_snapshot(current)
+        for row in changed:
+            parent = snapshot.parents[row]
+            # The head comes after connecting, which moves it
+            model.update(
+                int(row),
+                parent=snapshot.names[parent] if parent >= 0 else None,
+                use_connect=snapshot.use_connect[row],
+                head=snapshot.heads[row],
+                tail=snapshot.tails[row],
+                roll=float(snapshot.rolls[row]),
+                use_deform=snapshot.use_deform[row],
+            )
+        model.write(armature)
+        return len(changed)
+
+    def restore_data(self, armature):
+        """
+        Puts back the manifests and removes the objects and curves created since the
+        capture.
+        """
+        if self.manifests is None:
+            if MANIFEST_PROPERTY in armature.data:
+                del armature.data[MANIFEST_PROPERTY]
+        else:
+            armature.data[MANIFEST_PROPERTY] = self.manifests
+
+        for obj in [o for o in bpy.data.objects if o.name not in self.objects]:
+            bpy.data.objects.remove(obj)
+        for curve in [c for c in bpy.data.curves if c.name not in self.curves]:
+            bpy.data.curves.remove(curve)
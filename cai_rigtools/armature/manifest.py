@@ -0,0 +1,113 @@
+from dataclasses import asdict, dataclass, field
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .arrays import BoneArrays
+
+# Custom property of the armature data holding the manifests as JSON
+MANIFEST_PROPERTY = "rigtools_manifests"
+
+# Edit bones go through a matrix conversion when leaving edit mode, the geometry
+# is rounded before hashing so that does not count as a change
+_FINGERPRINT_DECIMALS = 4
+
+
+@dataclass
+class MechanismManifest:
+    """
+    Record of a generator run: its inputs, a fingerprint of the source bones and
+    the bones and constraints it produced. `sources` are the bones the generator
+    was called with, `inputs` holds the rest of its arguments.
+    """
+
+    generator: str
+    sources: List[str]
+    inputs: Dict[str, Any] = field(default_factory=dict)
+    bones: List[str] = field(default_factory=list)
+    constraints: List[List[str]] = field(default_factory=list)
+    fingerprint: str = ""
+    name: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return self.name or f"{self.generator}:{self.sources[0]}"
+
+
+def source_fingerprint(snapshot: BoneArrays, bone_names: List[str]) -> Optional[str]:
+    """
+    Hash of the head, tail, roll and parent of the given bones, None if any of
+    them is missing.
+    """
+    if any(name not in snapshot for name in bone_names):
+        return None
+
+    rows = np.fromiter(
+        (snapshot.row(name) for name in bone_names),
+        dtype=np.int64,
+        count=len(bone_names),
+    )
+    geometry = np.concatenate(
+        [
+            snapshot.heads[rows].ravel(),
+            snapshot.tails[rows].ravel(),
+            snapshot.rolls[rows],
+        ]
+    ).astype(np.float64)
+    # Adding zero turns -0.0 into 0.0, they would hash differently
+    geometry = np.round(geometry, _FINGERPRINT_DECIMALS) + 0.0
+    parents = [
+        snapshot.names[row] if row >= 0 else "" for row in snapshot.parents[rows]
+    ]
+
+    digest = hashlib.sha1(geometry.tobytes())
+    digest.update("\0".join(parents).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_manifests(armature) -> Dict[str, MechanismManifest]:
+    """
+    Manifests stored on the armature by key, in the order they were first recorded.
+    """
+    stored = json.loads(armature.data.get(MANIFEST_PROPERTY, "{}"))
+    return {key: MechanismManifest(**value) for key, value in stored.items()}
+
+
+def save_manifests(armature, manifests: Dict[str, MechanismManifest]):
+    armature.data[MANIFEST_PROPERTY] = json.dumps(
+        {key: asdict(manifest) for key, manifest in manifests.items()}
+    )
+
+
+def store_manifests(
+    armature, manifests: Iterable[MechanismManifest], snapshot: BoneArrays
+):
+    """
+    Fingerprints the manifests against the snapshot and stores them on the armature,
+    replacing the ones with the same key. The snapshot has to be taken after the
+    generators ran, as they may move or reparent their own source bones.
+    """
+    stored = load_manifests(armature)
+    for manifest in manifests:
+        manifest.fingerprint = source_fingerprint(snapshot, manifest.sources) or ""
+        stored[manifest.key] = manifest
+    save_manifests(armature, stored)
+
+
+def find_changed_manifests(
+    armature, snapshot: BoneArrays
+) -> Tuple[List[MechanismManifest], List[MechanismManifest]]:
+    """
+    Splits the stored manifests into the ones whose source bones changed since they
+    were recorded and the ones whose source bones no longer exist.
+    """
+    changed, missing = [], []
+    for manifest in load_manifests(armature).values():
+        fingerprint = source_fingerprint(snapshot, manifest.sources)
+        if fingerprint is None:
+            missing.append(manifest)
+        elif fingerprint != manifest.fingerprint:
+            changed.append(manifest)
+    return changed, missing
@@ -0,0 +1,380 @@
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .arrays import BONE_EPSILON, BoneArrays, write_bone_rows
+from .specs import ConstraintSpec
+from .manifest import MechanismManifest
+from .profiling import profile_count, profiled
+
+_FIELDS = ("head", "tail", "roll", "parent", "use_connect", "use_deform")
+
+
+class BoneView:
+    """
+    Handle of one bone of an `ArmatureModel`, reads and writes go to the model's arrays.
+    """
+
+    __slots__ = ("model", "row")
+
+    def __init__(self, model: "ArmatureModel", row: int):
+        self.model = model
+        self.row = row
+
+    def __repr__(self) -> str:
+        return f"BoneView({self.name!r})"
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, BoneView)
+            and other.model is self.model
+            and other.row == self.row
+        )
+
+    def __hash__(self) -> int:
+        return hash((id(self.model), self.row))
+
+    @property
+    def name(self) -> str:
+        return self.model.names[self.row]
+
+    @property
+    def head(self) -> np.ndarray:
+        return self.model.heads[self.row].copy()
+
+    @head.setter
+    def head(self, value):
+        self.model.update(self.row, head=value)
+
+    @property
+    def tail(self) -> np.ndarray:
+        return self.model.tails[self.row].copy()
+
+    @tail.setter
+    def tail(self, value):
+        self.model.update(self.row, tail=value)
+
+    @property
+    def roll(self) -> float:
+        return float(self.model.rolls[self.row])
+
+    @roll.setter
+    def roll(self, value: float):
+        self.model.update(self.row, roll=value)
+
+    @property
+    def parent(self) -> Optional["BoneView"]:
+        parent = self.model.parents[self.row]
+        return BoneView(self.model, int(parent)) if parent >= 0 else None
+
+    @parent.setter
+    def parent(self, value):
+        self.model.update(self.row, parent=value)
+
+    @property
+    def use_connect(self) -> bool:
+        return bool(self.model.use_connect[self.row])
+
+    @use_connect.setter
+    def use_connect(self, value: bool):
+        self.model.update(self.row, use_connect=value)
+
+    @property
+    def use_deform(self) -> bool:
+        return bool(self.model.use_deform[self.row])
+
+    @use_deform.setter
+    def use_deform(self, value: bool):
+        self.model.update(self.row, use_deform=value)
+
+    @property
+    def length(self) -> float:
+        return float(np.linalg.norm(self.tail - self.head))
+
+    def update(self, **fields) -> bool:
+        return self.model.update(self.row, **fields)
+
+
+class ArmatureModel:
+    """
+    In-memory copy of an armature's edit bones which generators plan against.
+
+    Bones are rows of contiguous arrays, the same layout as `BoneArrays`, new
+    bones are appended. Generators add and change bones through `BoneView` handles
+    and declare constraints and manifests, nothing touches Blender until `write`
+    applies the whole plan with bulk writes. Planning only needs the model, so it
+    can run in worker threads or processes.
+
+    The arrays are reallocated as bones are added, do not keep them across `add_bone`.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        heads: np.ndarray,
+        tails: np.ndarray,
+        rolls: np.ndarray,
+        parents: np.ndarray,
+        use_connect: np.ndarray,
+        use_deform: np.ndarray,
+    ):
+        self.names: List[str] = list(names)
+        self.rows: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        count = len(self.names)
+
+        self._heads = np.array(heads, dtype=np.float32).reshape(count, 3)
+        self._tails = np.array(tails, dtype=np.float32).reshape(count, 3)
+        self._rolls = np.array(rolls, dtype=np.float32)
+        self._parents = np.array(parents, dtype=np.int32)
+        self._use_connect = np.array(use_connect, dtype=bool)
+        self._use_deform = np.array(use_deform, dtype=bool)
+        self._dirty = np.zeros(count, dtype=bool)
+        self._parent_dirty = np.zeros(count, dtype=bool)
+
+        # Rows below this exist in Blender, the rest are planned bones
+        self.base = count
+
+        self.constraints: List[ConstraintSpec] = []
+        self.manifests: List[MechanismManifest] = []
+
+    @classmethod
+    def from_snapshot(cls, snapshot: BoneArrays) -> "ArmatureModel":
+        return cls(
+            snapshot.names,
+            snapshot.heads,
+            snapshot.tails,
+            snapshot.rolls,
+            snapshot.parents,
+            snapshot.use_connect,
+            snapshot.use_deform,
+        )
+
+    @classmethod
+    def capture(cls, armature) -> "ArmatureModel":
+        """
+        Reads all edit bones of the armature, has to be called in edit mode.
+        """
+        return cls.from_snapshot(BoneArrays.capture(armature))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, bone_name: str) -> bool:
+        return bone_name in self.rows
+
+    def __getitem__(self, bone_name: str) -> BoneView:
+        return BoneView(self, self.rows[bone_name])
+
+    def bone(self, bone_name: str) -> Optional[BoneView]:
+        row = self.rows.get(bone_name)
+        return BoneView(self, row) if row is not None else None
+
+    heads = property(lambda self: self._heads[: len(self)])
+    tails = property(lambda self: self._tails[: len(self)])
+    rolls = property(lambda self: self._rolls[: len(self)])
+    parents = property(lambda self: self._parents[: len(self)])
+    use_connect = property(lambda self: self._use_connect[: len(self)])
+    use_deform = property(lambda self: self._use_deform[: len(self)])
+    dirty = property(lambda self: self._dirty[: len(self)])
+
+    @property
+    def new_bones(self) -> List[str]:
+        return self.names[self.base :]
+
+    def _grow(self):
+        capacity = max(2 * len(self._rolls), 16)
+        for attribute in (
+            "_heads",
+            "_tails",
+            "_rolls",
+            "_parents",
+            "_use_connect",
+            "_use_deform",
+            "_dirty",
+            "_parent_dirty",
+        ):
+            array = getattr(self, attribute)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[: len(array)] = array
+            setattr(self, attribute, grown)
+
+    def add_bone(self, bone_name: str, **fields) -> BoneView:
+        """
+        Reuses the bone with the given name or appends a new one, then updates the
+        given fields, the same way `create_or_update_bone` does with edit bones.
+        """
+        row = self.rows.get(bone_name)
+        if row is None:
+            row = len(self)
+            if row == len(self._rolls):
+                self._grow()
+            self.names.append(bone_name)
+            self.rows[bone_name] = row
+            # Defaults of `new_bone`
+            self._heads[row] = (0.0, 0.0, 0.0)
+            self._tails[row] = (0.0, 1.0, 0.0)
+            self._rolls[row] = 0.0
+            self._parents[row] = -1
+            self._use_connect[row] = False
+            self._use_deform[row] = True
+            self._dirty[row] = True
+            self._parent_dirty[row] = False
+
+        self.update(row, **fields)
+        return BoneView(self, row)
+
+    def _parent_row(self, parent: Union[None, str, BoneView]) -> int:
+        if parent is None:
+            return -1
+        if isinstance(parent, BoneView):
+            return parent.row
+        return self.rows[parent]
+
+    def _connect(self, row: int):
+        # Connected bones start at their parent's tail
+        parent = self._parents[row]
+        if self._use_connect[row] and parent >= 0:
+            self._heads[row] = self._tails[parent]
+
+    def update(self, bone: Union[int, str], **fields) -> bool:
+        """
+        Writes the given fields in the given order, skipping the ones whose value would
+        not change. Like edit bones, connecting a bone moves its head onto the parent's
+        tail. Returns True if anything changed.
+        """
+        row = self.rows[bone] if isinstance(bone, str) else bone
+        changed = False
+        for field, value in fields.items():
+            if field in ("head", "tail"):
+                array = self._heads if field == "head" else self._tails
+                value = np.asarray(value, dtype=np.float32)
+                if np.linalg.norm(array[row] - value) <= BONE_EPSILON:
+                    continue
+                array[row] = value
+            elif field == "roll":
+                if abs(self._rolls[row] - value) <= BONE_EPSILON:
+                    continue
+                self._rolls[row] = value
+            elif field == "parent":
+                parent = self._parent_row(value)
+                if self._parents[row] == parent:
+                    continue
+                self._parents[row] = parent
+                self._parent_dirty[row] = True
+                self._connect(row)
+            elif field in ("use_connect", "use_deform"):
+                array = getattr(self, f"_{field}")
+                if array[row] == bool(value):
+                    continue
+                array[row] = bool(value)
+                self._connect(row)
+            else:
+                raise AttributeError(f"Bones have no field {field}, use {_FIELDS}")
+
+            self._dirty[row] = True
+            changed = True
+        return changed
+
+    def set_heads(self, rows: np.ndarray, heads: np.ndarray):
+        self._heads[rows] = heads
+        self._dirty[rows] = True
+
+    def set_tails(self, rows: np.ndarray, tails: np.ndarray):
+        self._tails[rows] = tails
+        self._dirty[rows] = True
+
+    def set_rolls(self, rows: np.ndarray, rolls: np.ndarray):
+        self._rolls[rows] = rolls
+        self._dirty[rows] = True
+
+    def set_rows(
+        self,
+        rows: np.ndarray,
+        heads: np.ndarray,
+        tails: np.ndarray,
+        rolls: np.ndarray,
+        parents: np.ndarray,
+        use_connect: np.ndarray,
+        use_deform: np.ndarray,
+    ):
+        """
+        `update` of whole rows at once. Connected rows are moved onto their parent's
+        tail once all rows are written. Unchanged rows stay clean.
+        """
+        changed = (
+            (np.linalg.norm(self._heads[rows] - heads, axis=1) > BONE_EPSILON)
+            | (np.linalg.norm(self._tails[rows] - tails, axis=1) > BONE_EPSILON)
+            | (np.abs(self._rolls[rows] - rolls) > BONE_EPSILON)
+            | (self._parents[rows] != parents)
+            | (self._use_connect[rows] != use_connect)
+            | (self._use_deform[rows] != use_deform)
+        )
+        self._parent_dirty[rows[self._parents[rows] != parents]] = True
+        self._heads[rows] = heads
+        self._tails[rows] = tails
+        self._rolls[rows] = rolls
+        self._parents[rows] = parents
+        self._use_connect[rows] = use_connect
+        self._use_deform[rows] = use_deform
+        connected = rows[np.asarray(use_connect, dtype=bool) & (parents >= 0)]
+        self._heads[connected] = self._tails[self._parents[connected]]
+        self._dirty[rows[changed]] = True
+
+    def constrain(self, specs: Sequence[ConstraintSpec]):
+        self.constraints.extend(specs)
+
+    def record(self, manifest: MechanismManifest):
+        self.manifests.append(manifest)
+
+    @profiled("edit")
+    def write(self, armature) -> int:
+        """
+        Applies the planned bones to the edit bones of the armature: creates the new
+        bones, sets the changed parents, then writes the changed rows, with one
+        foreach_set per property if enough of them changed. Constraints and manifests
+        are left to the caller. Returns the number of rows written.
+        """
+        dirty_count = int(np.count_nonzero(self.dirty))
+        for _ in self.write_steps(armature):
+            pass
+        return dirty_count
+
+    @property
+    def pending_writes(self) -> int:
+        """
+        Units of work left for `write_steps`: new bones plus changed rows.
+        """
+        return len(self) - self.base + int(np.count_nonzero(self.dirty))
+
+    def write_steps(self, armature, chunk_size: Optional[int] = None) -> Iterator[int]:
+        """
+        `write` split into chunks of at most `chunk_size` bones, yields the units of
+        work done by each chunk. A chunk leaves the model consistent with what was
+        written so far.
+        """
+        chunk_size = chunk_size or max(len(self), 1)
+        edit_bones = armature.data.edit_bones
+
+        while self.base < len(self):
+            chunk = self.names[self.base : self.base + chunk_size]
+            for bone_name in chunk:
+                edit_bone = edit_bones.new(bone_name)
+                if edit_bone.name != bone_name:
+                    raise RuntimeError(
+                        f"Could not add bone {bone_name}, it already exists"
+                    )
+            profile_count("bones_created", len(chunk))
+            self.base += len(chunk)
+            yield len(chunk)
+
+        # Pointers can not be written in bulk
+        for row in np.flatnonzero(self._parent_dirty[: len(self)]):
+            parent = self._parents[row]
+            edit_bones[self.names[row]].parent = (
+                edit_bones[self.names[parent]] if parent >= 0 else None
+            )
+        self._parent_dirty[:] = False
+
+        yield from write_bone_rows(
+            edit_bones, self, np.flatnonzero(self.dirty), chunk_size
+        )
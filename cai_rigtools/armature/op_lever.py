@@ -11,7 +11,9 @@ from .utils import (
     find_pose_bone,
     find_edit_bone,
     create_or_update_bone,
+    update_bone,
     find_axis_vectors,
+    find_axis_vectors_batch,
 )
 
 from .op_target import create_target_armature
@@ -19,65 +21,107 @@ from .op_target import create_target_armature
 from .tree_utils import (
     find_bone_chain,
 )
+from .transaction import RigBuildTransaction, rig_build
+from .constraints import ConstraintSpec
+from .manifest import MechanismManifest
+from .model import ArmatureModel
 
 # TODO: Separate these to individual files as well
 
 
-def create_lever_mechanism(armature, selected_bones: List[str]) -> List[str]:
-    bone_chain = find_bone_chain(armature, selected_bones[0], selected_bones[-1])
+def plan_lever_mechanism(model: ArmatureModel, bone_chain: List[str]) -> List[str]:
+    """
+    Plans the lever bones and constraints of an ordered bone chain on the model.
+    """
+    if len(bone_chain) < 2:
+        raise ValueError(f"A lever needs a chain of at least two bones")
 
-    if not bone_chain:
-        raise RuntimeError(f"There is no direct path between the first and last bone")
-
-    first_bone = find_edit_bone(armature, bone_chain[0])
-
-    last_bone = find_edit_bone(armature, bone_chain[-1])
+    first_bone = model[bone_chain[0]]
+    last_bone = model[bone_chain[-1]]
 
     # create lever control
-    control_bone_name = create_or_update_bone(armature, f"CTRL-ROOT-{first_bone.name}")
-    control_bone = find_edit_bone(armature, control_bone_name)
-    control_bone.head = first_bone.tail
     # TODO: Must align this bone to a [closest] major axis of world coordinates
-    axis_vectors = find_axis_vectors(first_bone.tail, first_bone.head, last_bone.tail)
-    control_bone.tail = axis_vectors[2] + first_bone.tail  # TODO: Adjust length
+    _, _, axis = find_axis_vectors_batch(
+        first_bone.tail, first_bone.head, last_bone.tail
+    )
+    control_bone = model.add_bone(
+        f"CTRL-ROOT-{first_bone.name}",
+        head=first_bone.tail,
+        tail=axis[0] + first_bone.tail,  # TODO: Adjust length
+    )
 
     # create lever bottom - This controls the hips
-    bottom_bone_name = create_or_update_bone(armature, f"CTRL-PIVOT-{first_bone.name}")
-    bottom_bone = find_edit_bone(armature, bottom_bone_name)
-    bottom_bone.head = first_bone.tail
-    bottom_bone.tail = first_bone.head
+    bottom_bone = model.add_bone(
+        f"CTRL-PIVOT-{first_bone.name}",
+        head=first_bone.tail,
+        tail=first_bone.head,
+        use_connect=False,
+        parent=control_bone,
+    )
 
     # create lever top - This controls the spine rotation
-    top_bone_name = create_or_update_bone(armature, f"CTRL-PIVOT-{last_bone.name}")
-    top_bone = find_edit_bone(armature, top_bone_name)
-    top_bone.head = first_bone.tail
-    top_bone.tail = last_bone.tail
+    top_bone = model.add_bone(
+        f"CTRL-PIVOT-{last_bone.name}",
+        head=first_bone.tail,
+        tail=last_bone.tail,
+        use_connect=False,
+        parent=control_bone,
+    )
 
     # parenting
-    top_bone.use_connect = False
-    top_bone.parent = control_bone
-
-    bottom_bone.use_connect = False
-    bottom_bone.parent = control_bone
-
-    first_bone.use_connect = False
-    first_bone.parent = bottom_bone
-
-    second_bone = find_edit_bone(armature, bone_chain[1])
-    second_bone.use_connect = False
-    second_bone.parent = control_bone
+    first_bone.update(use_connect=False, parent=bottom_bone)
+    model[bone_chain[1]].update(use_connect=False, parent=control_bone)
 
     # constraints
-    bpy.ops.object.mode_set(mode="POSE")
-
-    for bone_name in bone_chain[1:]:
-        bone = find_pose_bone(armature, bone_name)
-        constraint = bone.constraints.new("COPY_ROTATION")
-        constraint.target = armature
-        constraint.subtarget = top_bone_name
-        constraint.target_space = "LOCAL"
-        constraint.owner_space = "LOCAL"
-
-    bpy.ops.object.mode_set(mode="EDIT")
-
-    return [top_bone_name, bottom_bone_name, control_bone_name]
+    constraints = [
+        ConstraintSpec(
+            bone_name,
+            "COPY_ROTATION",
+            top_bone.name,
+            properties={"target_space": "LOCAL", "owner_space": "LOCAL"},
+        )
+        for bone_name in bone_chain[1:]
+    ]
+    model.constrain(constraints)
+
+    created_bones = [top_bone.name, bottom_bone.name, control_bone.name]
+    model.record(
+        MechanismManifest(
+            "lever",
+            list(bone_chain),
+            bones=created_bones,
+            constraints=[[spec.bone, spec.key] for spec in constraints],
+        )
+    )
+
+    return created_bones
+
+
+def create_lever_mechanism(
+    armature,
+    selected_bones: List[str],
+    transaction: Optional[RigBuildTransaction] = None,
+    is_chain: bool = False,
+) -> List[str]:
+    """
+    Set `is_chain` if the selected bones are already the ordered bone chain, the
+    mechanism reparents the chain so it can not be looked up again on a rebuild.
+    """
+    with rig_build(armature, transaction) as transaction:
+        if is_chain:
+            bone_chain = list(selected_bones)
+        else:
+            bone_chain = find_bone_chain(
+                armature, selected_bones[0], selected_bones[-1], transaction.hierarchy
+            )
+
+        if not bone_chain:
+            raise RuntimeError(
+                f"There is no direct path between the first and last bone"
+            )
+
+        created_bones = transaction.plan_chain(
+            "lever", plan_lever_mechanism, bone_chain
+        )
+
+    return created_bones
@@ -0,0 +1,83 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .op_target import create_target_armature
+from .op_lever import create_lever_mechanism
+from .op_tail import create_tail_mechanism
+from .op_tentacle import DEFAULT_CONTROL_COUNT, create_tentacle_mechanism
+from .op_unity_leg_helper import create_unity_leg_helpers
+from .manifest import MechanismManifest, find_changed_manifests
+from .transaction import RigBuildTransaction, rig_build
+
+
+def _rebuild_target(armature, manifests: List[MechanismManifest], transaction):
+    for manifest in manifests:
+        create_target_armature(
+            armature,
+            manifest.sources,
+            manifest.inputs["prefix"],
+            transaction,
+            mode=manifest.inputs.get("mode", "IN_PLACE"),
+        )
+
+
+def _rebuild_lever(armature, manifests: List[MechanismManifest], transaction):
+    for manifest in manifests:
+        create_lever_mechanism(armature, manifest.sources, transaction, is_chain=True)
+
+
+def _rebuild_tail(armature, manifests: List[MechanismManifest], transaction):
+    for manifest in manifests:
+        create_tail_mechanism(armature, manifest.sources, transaction, is_chain=True)
+
+
+def _rebuild_tentacle(armature, manifests: List[MechanismManifest], transaction):
+    for manifest in manifests:
+        create_tentacle_mechanism(
+            armature,
+            manifest.sources,
+            transaction,
+            is_chain=True,
+            control_count=manifest.inputs.get("control_count", DEFAULT_CONTROL_COUNT),
+        )
+
+
+def _rebuild_unity_leg_helper(
+    armature, manifests: List[MechanismManifest], transaction
+):
+    # The legs are computed in one batch
+    create_unity_leg_helpers(
+        armature, [manifest.sources for manifest in manifests], transaction
+    )
+
+
+# Generator name of the manifest -> function re-running it for a list of manifests
+GENERATORS: Dict[str, Callable[..., None]] = {
+    "target": _rebuild_target,
+    "lever": _rebuild_lever,
+    "tail": _rebuild_tail,
+    "tentacle": _rebuild_tentacle,
+    "unity_leg_helper": _rebuild_unity_leg_helper,
+}
+
+
+def rebuild_changed_mechanisms(
+    armature, transaction: Optional[RigBuildTransaction] = None
+) -> Tuple[List[MechanismManifest], List[MechanismManifest]]:
+    """
+    Re-runs only the generators whose source bones changed since their manifest was
+    recorded. Returns the rebuilt manifests and the ones whose source bones are gone,
+    the latter are left untouched.
+    """
+    with rig_build(armature, transaction) as transaction:
+        changed, missing = find_changed_manifests(armature, transaction.snapshot)
+
+        by_generator: Dict[str, List[MechanismManifest]] = {}
+        for manifest in changed:
+            if manifest.generator not in GENERATORS:
+                raise RuntimeError(f"Unknown generator {manifest.generator}")
+            by_generator.setdefault(manifest.generator, []).append(manifest)
+
+        for generator, manifests in by_generator.items():
+            GENERATORS[generator](armature, manifests, transaction)
+
+    return changed, missing
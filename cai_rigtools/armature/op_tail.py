@@ -11,6 +11,7 @@ from .utils import (
     find_pose_bone,
     find_edit_bone,
     create_or_update_bone,
+    update_bone,
     find_axis_vectors,
 )
 
@@ -19,90 +20,121 @@ from .op_target import create_target_armature
 from .tree_utils import (
     find_bone_chain,
 )
+from .transaction import RigBuildTransaction, rig_build
+from .constraints import ConstraintSpec
+from .manifest import MechanismManifest
+from .model import ArmatureModel
 
 # TODO: Separate these to individual files as well
 
 
-def create_tail_mechanism(armature, selected_bones: List[str]) -> List[str]:
+def _plan_tail_bones(
+    model: ArmatureModel, bone_chain: List[str]
+) -> List[Tuple[Optional[str], str]]:
     bone_pairs = []
 
-    bone_chain = find_bone_chain(armature, selected_bones[0], selected_bones[-1])
-
-    if not bone_chain:
-        raise RuntimeError(f"There is no direct path between the first and last bone")
-
     for bone_name in bone_chain:
+        bone = model[bone_name]
         # 1/ Disconnect (all) bones
-        bone = find_edit_bone(armature, bone_name)
-        bone.use_connect = False
+        bone.update(use_connect=False)
 
         # 2/ Create a control bone for each target bone
-        control_bone_name = create_or_update_bone(armature, f"CTRL-{bone_name}")
+        head, tail = bone.head, bone.tail
+        control_bone = model.add_bone(
+            f"CTRL-{bone_name}", head=head, tail=(head + tail) * 0.5
+        )
         bone_pairs.append(
-            (bone_name, control_bone_name)
+            (bone_name, control_bone.name)
         )  # TODO: Dataclass for better maintainability?
 
-        control_bone = find_edit_bone(armature, control_bone_name)
-        control_bone.head = bone.head
-        control_bone.tail = (bone.head + bone.tail) * 0.5
-
-    # 2/b Create one extra bone at the end of the last one
-    def _find_next_ctrl_pos(
-        head: mathutils.Vector, tail: mathutils.Vector
-    ) -> Tuple[mathutils.Vector, mathutils.Vector]:
-        d = tail - head
-        l = d.length
-        d.normalize()
-        return (tail, tail + l * d * 0.5)
-
-    last_control_bone_name = create_or_update_bone(
-        armature, f"CTRL-{bone_chain[-1]}"
-    )  # Blender must increase the numbering
-
-    last_bone = find_edit_bone(armature, bone_chain[-1])
-    last_control_bone = find_edit_bone(armature, last_control_bone_name)
-    last_control_bone.head, last_control_bone.tail = _find_next_ctrl_pos(
-        last_bone.head, last_bone.tail
+    # 2/b Create one extra bone at the end of the last one, half as long
+    last_bone = model[bone_chain[-1]]
+    head, tail = last_bone.head, last_bone.tail
+    last_control_bone = model.add_bone(
+        f"CTRL-END-{bone_chain[-1]}", head=tail, tail=tail + (tail - head) * 0.5
     )
 
-    bone_pairs.append((None, last_control_bone_name))
+    bone_pairs.append((None, last_control_bone.name))
 
     # 3/ reparent bones
     # 3/a Control -> Next control
     for i in range(len(bone_pairs) - 1):
-        control_bone = find_edit_bone(armature, bone_pairs[i][1])
-        next_control_bone = find_edit_bone(armature, bone_pairs[i + 1][1])
-        next_control_bone.parent = control_bone
+        model.update(bone_pairs[i + 1][1], parent=bone_pairs[i][1])
 
     # 3/b Control -> Target
     for target_bone_name, control_bone_name in bone_pairs:
         if target_bone_name is not None:
-            target_bone = find_edit_bone(armature, target_bone_name)
-            control_bone = find_edit_bone(armature, control_bone_name)
-            target_bone.parent = control_bone
+            model.update(target_bone_name, parent=control_bone_name)
+
+    return bone_pairs
+
+
+def plan_tail_mechanism(model: ArmatureModel, bone_chain: List[str]) -> List[str]:
+    """
+    Plans the tail controls and constraints of an ordered bone chain on the model.
+    """
+    bone_pairs = _plan_tail_bones(model, bone_chain)
 
     # 4/ Add damped track from next ctrl to prev target
-    bpy.ops.object.mode_set(mode="POSE")
+    constraints = []
     for i in range(len(bone_pairs) - 1):
         target_bone_name = bone_pairs[i][0]
         if target_bone_name is not None:
-            target_bone = find_pose_bone(armature, target_bone_name)
             next_control_bone_name = bone_pairs[i + 1][1]
 
-            constraint = target_bone.constraints.new("COPY_ROTATION")
-            constraint.target = armature
-            constraint.subtarget = next_control_bone_name
-
-            constraint = target_bone.constraints.new("DAMPED_TRACK")
-            constraint.target = armature
-            constraint.subtarget = next_control_bone_name
+            constraints += [
+                ConstraintSpec(
+                    target_bone_name, "COPY_ROTATION", next_control_bone_name
+                ),
+                ConstraintSpec(
+                    target_bone_name, "DAMPED_TRACK", next_control_bone_name
+                ),
+                # There is an untold trick behind this one
+                ConstraintSpec(
+                    target_bone_name,
+                    "STRETCH_TO",
+                    next_control_bone_name,
+                    properties={"enabled": False},
+                ),
+            ]
+
+    model.constrain(constraints)
+
+    model.record(
+        MechanismManifest(
+            "tail",
+            [name for name, _ in bone_pairs if name is not None],
+            bones=[name for _, name in bone_pairs],
+            constraints=[[spec.bone, spec.key] for spec in constraints],
+        )
+    )
 
-            # There is an untold trick behind this one
-            constraint = target_bone.constraints.new("STRETCH_TO")
-            constraint.target = armature
-            constraint.subtarget = next_control_bone_name
-            constraint.enabled = False
+    return [name for pairs in bone_pairs for name in pairs if name is not None]
 
-    bpy.ops.object.mode_set(mode="EDIT")
 
-    return [name for pairs in bone_pairs for name in pairs if name is not None]
+def create_tail_mechanism(
+    armature,
+    selected_bones: List[str],
+    transaction: Optional[RigBuildTransaction] = None,
+    is_chain: bool = False,
+) -> List[str]:
+    """
+    Set `is_chain` if the selected bones are already the ordered bone chain, the
+    mechanism reparents the chain so it can not be looked up again on a rebuild.
+    """
+    with rig_build(armature, transaction) as transaction:
+        if is_chain:
+            bone_chain = list(selected_bones)
+        else:
+            bone_chain = find_bone_chain(
+                armature, selected_bones[0], selected_bones[-1], transaction.hierarchy
+            )
+
+        if not bone_chain:
+            raise RuntimeError(
+                f"There is no direct path between the first and last bone"
+            )
+
+        created_bones = transaction.plan_chain("tail", plan_tail_mechanism, bone_chain)
+
+    return created_bones
@@ -3,6 +3,7 @@ import uuid
 
 import bpy
 import mathutils
+import numpy as np
 
 from .utils import (
     get_armature,
@@ -11,15 +12,57 @@ from .utils import (
     find_pose_bone,
     find_edit_bone,
     create_or_update_bone,
+    update_bone,
     find_axis_vectors,
+    request_view_layer_update,
+    bone_rows,
 )
 
 from .tree_utils import (
     find_bone_chain,
 )
+from .transaction import RigBuildTransaction, rig_build
+from .constraints import ConstraintSpec
+from .manifest import MechanismManifest
+from .arrays import BoneArrays
+from .model import ArmatureModel
 
 # TODO: Separate these to individual files as well
 
+# IN_PLACE adds the target bones to the armature, SEPARATE to an armature object of their own
+TARGET_MODES = ["IN_PLACE", "SEPARATE"]
+
+# Bone settings copied to the target bones besides the geometry, with one
+# foreach_get / foreach_set each. Ones missing from this Blender are skipped.
+BONE_FLOAT_PROPERTIES = [
+    "envelope_distance",
+    "envelope_weight",
+    "head_radius",
+    "tail_radius",
+    "bbone_x",
+    "bbone_z",
+    "bbone_easein",
+    "bbone_easeout",
+]
+BONE_INT_PROPERTIES = ["bbone_segments"]
+BONE_BOOL_PROPERTIES = [
+    "use_envelope_multiply",
+    "use_inherit_rotation",
+    "use_local_location",
+    "use_relative_parent",
+    "hide",
+]
+POSE_BONE_FLOAT_PROPERTIES = [
+    "custom_shape_scale_xyz",
+    "custom_shape_translation",
+    "custom_shape_rotation_euler",
+]
+POSE_BONE_BOOL_PROPERTIES = ["use_custom_shape_bone_size"]
+
+# foreach_get can not read enums and pointers, these are copied bone by bone
+BONE_ENUM_PROPERTIES = ["inherit_scale"]
+POSE_BONE_ENUM_PROPERTIES = ["rotation_mode", "custom_shape"]
+
 
 # TODO: Add typing
 def _check_target_bones(armature, selected_bones: List[str]) -> List[str]:
@@ -40,17 +83,22 @@ def _check_target_bones(armature, selected_bones: List[str]) -> List[str]:
 #         setattr(target, key, value)
 
 
-# TODO: Add typing
-def create_target_armature(armature, selected_bones: List[str], prefix:str="TGT") -> List[str]:
-    selected_bones = _check_target_bones(armature, selected_bones)
-
-    bpy.ops.object.mode_set(mode="EDIT")
-
+def plan_target_armature(
+    model: ArmatureModel, selected_bones: List[str], prefix: str = "TGT"
+) -> List[str]:
+    """
+    Plans a copy of the selected bones with the given prefix, each bone copying
+    the transforms of its copy.
+    """
     bone_map = {}
     for bone_name in selected_bones:
-        bone = find_edit_bone(armature, bone_name)
-        target_bone_name = create_or_update_bone(armature, f"{prefix}-{bone_name}")
-        target_bone = find_edit_bone(armature, target_bone_name)
+        bone = model[bone_name]
+        target_bone = model.add_bone(
+            f"{prefix}-{bone_name}",
+            head=bone.head,
+            tail=bone.tail,
+            roll=bone.roll,
+        )
 
         # TODO: proper copy bone:
         # bpy.ops.armature.duplicate()
@@ -62,41 +110,278 @@ def create_target_armature(armature, selected_bones: List[str], prefix:str="TGT"
         # Then use at the end:
         # bpy.context.view_layer.update()
 
-        target_bone.head = bone.head
-        target_bone.tail = bone.tail
-        target_bone.roll = bone.roll
-        # TODO: Rest of the properties
-
-        bone.use_deform = False
+        bone.update(use_deform=False)
 
-        bone_map[bone.name] = target_bone_name
+        bone_map[bone_name] = target_bone.name
 
     for bone_name, target_bone_name in bone_map.items():
-        bone = find_edit_bone(armature, bone_name)
-        target_bone = find_edit_bone(armature, target_bone_name)
+        bone = model[bone_name]
+        parent = bone.parent
 
         # Connect parents
-        if bone.parent and bone.parent.name in bone_map:
-            print(f"Parenting {target_bone_name}: {bone.name} -> {bone.parent.name}")
-            target_bone_parent = find_edit_bone(armature, bone_map[bone.parent.name])
-            target_bone.parent = target_bone_parent
-
+        if parent is not None and parent.name in bone_map:
             # Copy connection type
-            target_bone.use_connect = bone.use_connect
-            target_bone.use_deform = bone.use_deform
+            model.update(
+                target_bone_name,
+                parent=bone_map[parent.name],
+                use_connect=bone.use_connect,
+                use_deform=bone.use_deform,
+            )
 
-    bpy.ops.object.mode_set(mode="POSE")
+    constraints = [
+        ConstraintSpec(bone_name, "COPY_TRANSFORMS", target_bone_name)
+        for bone_name, target_bone_name in bone_map.items()
+    ]
+    model.constrain(constraints)
 
-    for bone_name, target_bone_name in bone_map.items():
-        # TODO: Find updates here
+    model.record(
+        MechanismManifest(
+            "target",
+            list(bone_map.keys()),
+            inputs={"prefix": prefix},
+            bones=list(bone_map.values()),
+            constraints=[[spec.bone, spec.key] for spec in constraints],
+            name=f"target:{prefix}:{selected_bones[0]}",
+        )
+    )
+
+    return [n for n in bone_map.values()]
+
+
+def _copy_properties(
+    source, target, source_rows, target_rows, attributes: List[str], dtype
+):
+    """
+    Copies the attributes between the given rows of two bone collections.
+    """
+    sample = source[int(source_rows[0])]
+    for attribute in attributes:
+        if not hasattr(sample, attribute):
+            continue
+
+        value = getattr(sample, attribute)
+        width = len(value) if hasattr(value, "__len__") else 1
+        values = np.empty(len(source) * width, dtype=dtype)
+        source.foreach_get(attribute, values)
+        target_values = np.empty(len(target) * width, dtype=dtype)
+        target.foreach_get(attribute, target_values)
+
+        target_values.reshape(-1, width)[target_rows] = values.reshape(-1, width)[
+            source_rows
+        ]
+        target.foreach_set(attribute, target_values)
+
+
+def copy_bone_properties(
+    source_armature,
+    target_armature,
+    source_bones: List[str],
+    target_bones: List[str],
+):
+    """
+    Copies the envelope, B-Bone, inheritance and custom shape settings of the source
+    bones to the target bones, has to be called outside of edit mode. The armatures
+    may be the same.
+    """
+    if not source_bones:
+        return
+
+    for collection, float_properties, bool_properties in (
+        ("bones", BONE_FLOAT_PROPERTIES, BONE_BOOL_PROPERTIES),
+        ("pose", POSE_BONE_FLOAT_PROPERTIES, POSE_BONE_BOOL_PROPERTIES),
+    ):
+        if collection == "bones":
+            source, target = source_armature.data.bones, target_armature.data.bones
+        else:
+            source, target = source_armature.pose.bones, target_armature.pose.bones
+        source_rows = bone_rows(source, source_bones)
+        target_rows = bone_rows(target, target_bones)
+
+        _copy_properties(
+            source, target, source_rows, target_rows, float_properties, np.float32
+        )
+        _copy_properties(
+            source, target, source_rows, target_rows, bool_properties, bool
+        )
+        if collection == "bones":
+            _copy_properties(
+                source,
+                target,
+                source_rows,
+                target_rows,
+                BONE_INT_PROPERTIES,
+                np.int32,
+            )
+
+    for attributes, source, target in (
+        (BONE_ENUM_PROPERTIES, source_armature.data.bones, target_armature.data.bones),
+        (
+            POSE_BONE_ENUM_PROPERTIES,
+            source_armature.pose.bones,
+            target_armature.pose.bones,
+        ),
+    ):
+        for attribute in attributes:
+            if not hasattr(source[source_bones[0]], attribute):
+                continue
+            for source_bone, target_bone in zip(source_bones, target_bones):
+                setattr(
+                    target[target_bone],
+                    attribute,
+                    getattr(source[source_bone], attribute),
+                )
+
+
+def separate_target_name(armature, prefix: str) -> str:
+    return f"{armature.name}-{prefix}"
+
+
+def _plan_separate_target(
+    armature, selected_bones: List[str], prefix: str
+) -> ArmatureModel:
+    """
+    Plans prefixed copies of the selected bones on an empty model. A bone whose
+    parent is not selected gets the nearest selected ancestor and is disconnected,
+    the same way removing its parent would do, has to be called in edit mode.
+    """
+    bones = BoneArrays.capture(armature)
+    rows = [bones.row(bone_name) for bone_name in selected_bones]
+    kept = {row: i for i, row in enumerate(rows)}
+    created_bones = [f"{prefix}-{bone_name}" for bone_name in selected_bones]
+
+    empty = np.empty((0, 3), dtype=np.float32)
+    model = ArmatureModel([], empty, empty, [], [], [], [])
+    for bone_name, row in zip(created_bones, rows):
+        model.add_bone(
+            bone_name,
+            head=bones.heads[row],
+            tail=bones.tails[row],
+            roll=float(bones.rolls[row]),
+            use_deform=bool(bones.use_deform[row]),
+        )
+
+    # Parents may come after their children, they are set once all bones exist
+    for bone_name, row in zip(created_bones, rows):
+        parent = bones.parents[row]
+        if parent < 0:
+            continue
+        use_connect = parent in kept and bool(bones.use_connect[row])
+        while parent >= 0 and parent not in kept:
+            parent = bones.parents[parent]
+        if parent >= 0:
+            model.update(
+                bone_name,
+                parent=created_bones[kept[parent]],
+                use_connect=use_connect,
+            )
+
+    return model
+
+
+def _create_separate_target(
+    armature,
+    selected_bones: List[str],
+    prefix: str,
+    transaction: RigBuildTransaction,
+) -> List[str]:
+    """
+    Writes prefixed copies of the selected bones into new armature data of an
+    object of its own, see `_plan_separate_target`. A target object left by a
+    previous run gets the new data, so its animation is kept, its previous data is
+    only removed once the transaction commits. A rollback removes the new data and
+    puts the previous one back.
+    """
+    target_name = separate_target_name(armature, prefix)
+    transaction.set_mode("EDIT")
+    model = _plan_separate_target(armature, selected_bones, prefix)
+    created_bones = list(model.names)
+
+    transaction.set_mode("OBJECT")
+    data = bpy.data.armatures.new(target_name)
+    transaction.on_rollback(lambda: bpy.data.armatures.remove(data))
+
+    target = bpy.data.objects.get(target_name)
+    if target is None:
+        target = bpy.data.objects.new(target_name, data)
+        for collection in armature.users_collection:
+            collection.objects.link(target)
+        transaction.on_rollback(lambda: bpy.data.objects.remove(target))
+    else:
+        previous_data, target.data = target.data, data
+        transaction.on_rollback(lambda: setattr(target, "data", previous_data))
+
+        def remove_previous_data():
+            if previous_data.users == 0:
+                bpy.data.armatures.remove(previous_data)
+            # The new data gets the name once the previous data is gone
+            data.name = target_name
+
+        transaction.on_commit(remove_previous_data)
+    target.matrix_world = armature.matrix_world.copy()
+
+    view_layer = bpy.context.view_layer
+    view_layer.objects.active = target
+    try:
+        bpy.ops.object.mode_set(mode="EDIT")
+        model.write(target)
+    finally:
+        bpy.ops.object.mode_set(mode="OBJECT")
+        view_layer.objects.active = armature
+
+    copy_bone_properties(armature, target, selected_bones, created_bones)
+    transaction.set_mode("EDIT")
+
+    constraints = [
+        ConstraintSpec(bone_name, "COPY_TRANSFORMS", target_bone_name, target_name)
+        for bone_name, target_bone_name in zip(selected_bones, created_bones)
+    ]
+    transaction.constrain(constraints)
+
+    transaction.record(
+        MechanismManifest(
+            "target",
+            list(selected_bones),
+            inputs={"prefix": prefix, "mode": "SEPARATE"},
+            bones=created_bones,
+            constraints=[[spec.bone, spec.key] for spec in constraints],
+            name=f"target:{prefix}:{selected_bones[0]}",
+        )
+    )
+
+    return created_bones
+
+
+# TODO: Add typing
+def create_target_armature(
+    armature,
+    selected_bones: List[str],
+    prefix: str = "TGT",
+    transaction: Optional[RigBuildTransaction] = None,
+    mode: str = "IN_PLACE",
+) -> List[str]:
+    """
+    Creates the target bones of the selected bones, see `TARGET_MODES`.
+    """
+    if mode not in TARGET_MODES:
+        raise ValueError(f"Unknown target mode {mode}")
+
+    selected_bones = _check_target_bones(armature, selected_bones)
 
-        bone = find_pose_bone(armature, bone_name)
-        constraint = bone.constraints.new("COPY_TRANSFORMS")
-        constraint.target = armature
-        constraint.subtarget = target_bone_name
+    with rig_build(armature, transaction) as transaction:
+        if mode == "SEPARATE":
+            created_bones = _create_separate_target(
+                armature, selected_bones, prefix, transaction
+            )
+        else:
+            created_bones = plan_target_armature(
+                transaction.plan(), selected_bones, prefix
+            )
+            transaction.pose(
+                lambda: copy_bone_properties(
+                    armature, armature, selected_bones, created_bones
+                )
+            )
 
-    bpy.ops.object.mode_set(mode="EDIT")
-    
-    bpy.context.view_layer.update()
+    request_view_layer_update()
 
-    return [n for n in bone_map.values()]
\ No newline at end of file
+    return created_bones
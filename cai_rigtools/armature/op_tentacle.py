@@ -1,26 +1,282 @@
 from typing import List, Optional, Tuple
-import uuid
 
 import bpy
-import mathutils
-
-from .utils import (
-    get_armature,
-    select_bones,
-    get_selected_bones,
-    find_pose_bone,
-    find_edit_bone,
-    create_or_update_bone,
-    find_axis_vectors,
-)
+import numpy as np
 
-from .op_target import create_target_armature
+from .utils import normalize_vectors
 
 from .tree_utils import (
     find_bone_chain,
 )
+from .transaction import RigBuildTransaction, rig_build
+from .constraints import ConstraintSpec, constraint_name
+from .manifest import MechanismManifest, load_manifests
+from .model import ArmatureModel
+
+# Control bones of a tentacle, independent of the number of segments
+DEFAULT_CONTROL_COUNT = 4
+
+# Blender clamps the chain length of a Spline IK constraint to this
+MAX_SPLINE_IK_CHAIN = 255
+
+
+def tentacle_curve_name(armature, first_bone_name: str) -> str:
+    return f"{armature.name}-TENTACLE-{first_bone_name}"
+
+
+def tentacle_segments(bone_chain: List[str]) -> List[List[str]]:
+    """
+    Splits the chain into the runs of bones a single Spline IK constraint can drive,
+    as even as possible.
+    """
+    count = -(-len(bone_chain) // MAX_SPLINE_IK_CHAIN)
+    bounds = np.linspace(0, len(bone_chain), count + 1).round().astype(int)
+    return [bone_chain[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def sample_polyline(points: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Samples `count` points evenly spaced by arc length along the polyline through
+    the given (N, 3) points. Returns the sampled points and their unit tangents.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    segments = np.diff(points, axis=0)
+    lengths = np.linalg.norm(segments, axis=1)
+    arc_lengths = np.concatenate([[0.0], np.cumsum(lengths)])
+
+    samples = np.linspace(0.0, arc_lengths[-1], count)
+    indices = np.searchsorted(arc_lengths, samples, side="right") - 1
+    indices = np.clip(indices, 0, len(segments) - 1)
+    factors = np.divide(
+        samples - arc_lengths[indices],
+        lengths[indices],
+        out=np.zeros(count),
+        where=lengths[indices] > 0,
+    )
+    positions = points[indices] + segments[indices] * factors[:, None]
+
+    # Tangents of the sampled curve, not the segments, so the controls follow its bends
+    tangents = normalize_vectors(np.gradient(positions, axis=0))
+    return positions, tangents
+
+
+def plan_tentacle_mechanism(
+    model: ArmatureModel,
+    bone_chain: List[str],
+    curve_name: str,
+    control_count: int = DEFAULT_CONTROL_COUNT,
+) -> List[str]:
+    """
+    Plans the control bones of an ordered bone chain on the model. The controls are
+    spaced evenly along the chain and hook the points of the curve `curve_name`,
+    a single Spline IK constraint on the last bone fits the whole chain onto it.
+    Chains longer than `MAX_SPLINE_IK_CHAIN` are split into `tentacle_segments`,
+    each with its own curve and constraint, see `segment_curve_name`. Neighbouring
+    segments share the control between them.
+    """
+    if control_count < 2:
+        raise ValueError(f"A tentacle needs at least two controls")
+
+    positions, tails = [], []
+    segments = tentacle_segments(bone_chain)
+    for i, segment in enumerate(segments):
+        rows = [model.rows[name] for name in segment]
+        points = np.concatenate([model.heads[rows], model.tails[rows[-1:]]])
+        segment_positions, tangents = sample_polyline(points, control_count)
+
+        # Controls are half as long as the distance between them
+        spacing = np.linalg.norm(np.diff(points, axis=0), axis=1).sum() / (
+            control_count - 1
+        )
+        segment_tails = segment_positions + tangents * spacing * 0.5
+        # The first control of a segment is the last one of the previous segment
+        start = 1 if i else 0
+        positions.extend(segment_positions[start:])
+        tails.extend(segment_tails[start:])
+
+    # Controls follow whatever the tentacle is attached to
+    parent = model[bone_chain[0]].parent
+    created_bones = []
+    for i in range(len(positions)):
+        control_bone = model.add_bone(
+            f"CTRL-TENTACLE-{i:02d}-{bone_chain[0]}",
+            head=positions[i],
+            tail=tails[i],
+            parent=parent,
+            use_connect=False,
+            use_deform=False,
+        )
+        created_bones.append(control_bone.name)
+
+    constraints = []
+    for i, segment in enumerate(segments):
+        segment_curve = segment_curve_name(curve_name, i)
+        constraints.append(
+            ConstraintSpec(
+                segment[-1],
+                "SPLINE_IK",
+                target=segment_curve,
+                properties={"chain_count": len(segment)},
+                name=constraint_name("SPLINE_IK", segment_curve),
+            )
+        )
+    model.constrain(constraints)
+
+    model.record(
+        MechanismManifest(
+            "tentacle",
+            list(bone_chain),
+            inputs={"control_count": control_count},
+            bones=created_bones,
+            constraints=[[spec.bone, spec.key] for spec in constraints],
+        )
+    )
+
+    return created_bones
+
+
+def segment_curve_name(curve_name: str, index: int) -> str:
+    # The curve of the first segment keeps the name of the whole tentacle
+    return f"{curve_name}-{index:02d}" if index else curve_name
+
+
+def _build_curve(armature, curve_name: str, heads: np.ndarray, tails: np.ndarray):
+    """
+    Creates or updates the Bezier curve with one point per control, in the armature's
+    space. Handles point along the controls, so a hooked point turns with its control.
+    """
+    curve_object = bpy.data.objects.get(curve_name)
+    if curve_object is None:
+        curve = bpy.data.curves.new(curve_name, "CURVE")
+        curve_object = bpy.data.objects.new(curve_name, curve)
+        for collection in armature.users_collection:
+            collection.objects.link(curve_object)
+
+    curve = curve_object.data
+    curve.dimensions = "3D"
+    curve.splines.clear()
+    spline = curve.splines.new("BEZIER")
+    points = spline.bezier_points
+    points.add(len(heads) - 1)
+
+    for point in points:
+        point.handle_left_type = "FREE"
+        point.handle_right_type = "FREE"
+
+    # Handles reach a third of the way to the next point
+    handles = (tails - heads) * (2.0 / 3.0)
+    points.foreach_set("co", heads.ravel())
+    points.foreach_set("handle_left", (heads - handles).ravel())
+    points.foreach_set("handle_right", (heads + handles).ravel())
+
+    curve_object.parent = armature
+    curve_object.hide_render = True
+    return curve_object
+
+
+def _hook_curve(armature, curve_object, control_bones: List[str]):
+    """
+    Hooks every Bezier point (with its handles) to its control bone and drops the
+    hooks of other bones of the armature, has to run after the control bones left
+    edit mode.
+    """
+    for modifier in list(curve_object.modifiers):
+        if (
+            modifier.type == "HOOK"
+            and modifier.object == armature
+            and modifier.subtarget not in control_bones
+        ):
+            curve_object.modifiers.remove(modifier)
+
+    for i, bone_name in enumerate(control_bones):
+        modifier_name = f"Hook-{bone_name}"
+        modifier = curve_object.modifiers.get(modifier_name)
+        if modifier is None:
+            modifier = curve_object.modifiers.new(modifier_name, "HOOK")
+        modifier.object = armature
+        modifier.subtarget = bone_name
+        # The curve shares the armature's space, at rest the hooks must not move it
+        modifier.matrix_inverse = armature.data.bones[bone_name].matrix_local.inverted()
+        modifier.vertex_indices_set([3 * i, 3 * i + 1, 3 * i + 2])
+
+
+def _remove_bones(armature, transaction: RigBuildTransaction, bone_names: List[str]):
+    mode = armature.mode
+    transaction.set_mode("EDIT")
+    edit_bones = armature.data.edit_bones
+    for bone_name in bone_names:
+        edit_bone = edit_bones.get(bone_name)
+        if edit_bone is not None:
+            edit_bones.remove(edit_bone)
+    transaction.set_mode(mode)
+
+
+def create_tentacle_mechanism(
+    armature,
+    selected_bones: List[str],
+    transaction: Optional[RigBuildTransaction] = None,
+    is_chain: bool = False,
+    control_count: int = DEFAULT_CONTROL_COUNT,
+) -> List[str]:
+    """
+    Drives a long chain with a few controls through a Spline IK curve, the number
+    of constraints only grows by one every `MAX_SPLINE_IK_CHAIN` bones.
+    Set `is_chain` if the selected bones are already the ordered bone chain.
+    """
+    with rig_build(armature, transaction) as transaction:
+        if is_chain:
+            bone_chain = list(selected_bones)
+        else:
+            bone_chain = find_bone_chain(
+                armature, selected_bones[0], selected_bones[-1], transaction.hierarchy
+            )
+
+        if not bone_chain:
+            raise RuntimeError(
+                f"There is no direct path between the first and last bone"
+            )
+
+        curve_name = tentacle_curve_name(armature, bone_chain[0])
+        # The hooks are pose work, which already counts for the saved mode switches
+        model = transaction.model
+        created_bones = plan_tentacle_mechanism(
+            model, bone_chain, curve_name, control_count
+        )
+
+        # Controls of an earlier run with more of them
+        previous = load_manifests(armature).get(
+            MechanismManifest("tentacle", bone_chain).key
+        )
+        if previous is not None:
+            stale_bones = [b for b in previous.bones if b not in created_bones]
+            if stale_bones:
+                # After the commit, so a rollback still finds the bones it captured
+                transaction.on_commit(
+                    lambda: _remove_bones(armature, transaction, stale_bones)
+                )
+
+        heads = np.array([model[name].head for name in created_bones])
+        tails = np.array([model[name].tail for name in created_bones])
+        curves = []
+        for i in range(len(tentacle_segments(bone_chain))):
+            # Neighbouring segments share a control
+            start = i * (control_count - 1)
+            curves.append(
+                (segment_curve_name(curve_name, i), slice(start, start + control_count))
+            )
+
+        def build_curves():
+            # On commit, so nothing is left behind by a rollback of the plan
+            for name, controls in curves:
+                curve_object = _build_curve(
+                    armature, name, heads[controls], tails[controls]
+                )
+                transaction.pose(
+                    lambda curve_object=curve_object, controls=controls: _hook_curve(
+                        armature, curve_object, created_bones[controls]
+                    )
+                )
 
+        transaction.edit(build_curves)
 
-def create_tentacle_mechanism(armature, selected_bones: List[str]) -> List[str]:
-    # TODO: ... 
-    pass
+    return created_bones
@@ -1,15 +1,21 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import bpy
 from mathutils import Vector
+import numpy as np
 
 from .utils import (
     find_edit_bone,
     find_pose_bone,
     create_or_update_bone,
-    project_point_onto_plane,
+    normalize_vectors,
+    project_points_onto_planes,
 )
 from .tree_utils import find_bone_chain
+from .transaction import RigBuildTransaction, rig_build
+from .constraints import ConstraintSpec
+from .manifest import MechanismManifest
+from .model import ArmatureModel
 
 
 def _helper_name(name: str, suffix: str = "helper") -> str:
@@ -17,104 +23,187 @@ def _helper_name(name: str, suffix: str = "helper") -> str:
     return f"{name_segments[0]}.{suffix}.{'.'.join(name_segments[1:])}"
 
 
-def create_unity_leg_helper(armature, selected_bones: List[str]) -> List[str]:
-    """
-    Create a helper for Unity's humanoid rig which support anthropomorphic digitigrade legs
-    """
-
+def _find_leg_chain(
+    armature, selected_bones: List[str], transaction: RigBuildTransaction
+) -> List[str]:
     # Find the bones and order them in hierarchy
+    registry = transaction.registry
     # It is only sufficient to select two bones, the first and the last
-    chain = find_bone_chain(armature, selected_bones[0], selected_bones[-1])
+    chain = find_bone_chain(
+        armature, selected_bones[0], selected_bones[-1], transaction.hierarchy
+    )
 
     if not chain:
         raise RuntimeError(f"There is no direct path between the first and last bone")
 
-    bones = list([find_edit_bone(armature, name) for name in chain])
-
-    if len(bones) != 4 or any(bone is None for bone in bones):
+    if len(chain) != 4 or any(registry.edit_bone(name) is None for name in chain):
         raise ValueError(f"Select exactly four bones")
 
+    return chain
+
+
+def plan_unity_leg_helpers(model: ArmatureModel, chains: List[List[str]]) -> List[str]:
+    """
+    Plans the helpers of any number of ordered leg chains on the model.
+    The geometry of all the legs is computed with batched array operations.
+    """
+    heads, tails = model.heads, model.tails
+
     # If the armature was done right the bones should be in the correct order
-    upper_leg, lower_leg, foot, toes = bones
-    bpy.ops.object.mode_set(mode="EDIT")
+    rows = np.array([[model.rows[name] for name in chain] for chain in chains])
+    upper_leg, lower_leg, foot, toes = rows.T
 
     # Project all bone points onto the plane defined by the triangle of the upper and lower leg bones
-    plane_points = (upper_leg.head, upper_leg.tail, lower_leg.tail)
-
-    for bone in [upper_leg, lower_leg, foot, toes]:
-        bone.head = project_point_onto_plane(bone.head, *plane_points)
-        bone.tail = project_point_onto_plane(bone.tail, *plane_points)
+    planes = np.stack([heads[upper_leg], tails[upper_leg], tails[lower_leg]], axis=1)
+    leg_rows = rows.ravel()
+    plane_indices = np.tile(np.repeat(np.arange(len(chains)), 4), 2)
+    projected = project_points_onto_planes(
+        np.concatenate([heads[leg_rows], tails[leg_rows]]), planes, plane_indices
+    )
+    model.set_heads(leg_rows, projected[: len(leg_rows)])
+    model.set_tails(leg_rows, projected[len(leg_rows) :])
 
     # Find the parallelogram for the helper bones
     # The upper leg bone (and its helper) has to be parallel with the foot bone
 
     # First we create a trapezoid from the upper leg bone and the foot bone
-    upper_leg_direction = (upper_leg.tail - upper_leg.head).normalized()
-    upper_helper_tail = upper_leg.tail + upper_leg_direction * foot.length
+    upper_leg_direction = normalize_vectors(tails[upper_leg] - heads[upper_leg])
+    foot_length = np.linalg.norm(tails[foot] - heads[foot], axis=1, keepdims=True)
+    upper_helper_tail = tails[upper_leg] + upper_leg_direction * foot_length
 
     # Adjust foot tail to be parallel with the upper leg bone
-    foot.tail = foot.head + upper_leg_direction * foot.length
-    
-    # Crate a helper bones for upper leg, lower leg, foot and toes
-    upper_helper_name = create_or_update_bone(armature, _helper_name(upper_leg.name))
-    upper_helper = find_edit_bone(armature, upper_helper_name)
-    upper_helper.head = upper_leg.head
-    upper_helper.tail = upper_helper_tail
+    foot_tail = heads[foot] + upper_leg_direction * foot_length
+    model.set_tails(foot, foot_tail)
+    # Connected toes follow the foot the same way an edit bone update would do
+    connected = model.use_connect[toes]
+    model.set_heads(toes[connected], foot_tail[connected])
+
+    toes_direction = normalize_vectors(tails[toes] - heads[toes])
+    foot_helper_tail = tails[toes] + 0.05 * toes_direction
+
+    # Adding bones reallocates the arrays, take copies first
+    upper_helper_head = heads[upper_leg]
+    foot_helper_head = heads[toes]
+
+    created_bones = []
+    for i, chain in enumerate(chains):
+        created_bones += _plan_leg_helper(
+            model,
+            chain,
+            upper_helper_head=upper_helper_head[i],
+            upper_helper_tail=upper_helper_tail[i],
+            lower_helper_tail=foot_tail[i],
+            foot_helper_head=foot_helper_head[i],
+            foot_helper_tail=foot_helper_tail[i],
+        )
+
+    return created_bones
+
+
+def _plan_leg_chain(model: ArmatureModel, chain: List[str]) -> List[str]:
+    return plan_unity_leg_helpers(model, [chain])
+
+
+def create_unity_leg_helpers(
+    armature,
+    leg_selections: List[List[str]],
+    transaction: Optional[RigBuildTransaction] = None,
+) -> List[str]:
+    """
+    Create helpers for Unity's humanoid rig for any number of legs at once.
+    """
 
-    lower_helper_name = create_or_update_bone(armature, _helper_name(lower_leg.name))
-    lower_helper = find_edit_bone(armature, lower_helper_name)
-    lower_helper.head = upper_helper_tail
-    lower_helper.tail = foot.tail
+    with rig_build(armature, transaction) as transaction:
+        chains = [
+            _find_leg_chain(armature, selected_bones, transaction)
+            for selected_bones in leg_selections
+        ]
+        if transaction.templates is None:
+            created_bones = plan_unity_leg_helpers(transaction.plan(), chains)
+        else:
+            # Legs of the same shape are planned once
+            created_bones = []
+            for chain in chains:
+                created_bones += transaction.plan_chain(
+                    "unity_leg_helper", _plan_leg_chain, chain
+                )
+
+    return created_bones
+
+
+def _plan_leg_helper(
+    model: ArmatureModel,
+    chain: List[str],
+    upper_helper_head: np.ndarray,
+    upper_helper_tail: np.ndarray,
+    lower_helper_tail: np.ndarray,
+    foot_helper_head: np.ndarray,
+    foot_helper_tail: np.ndarray,
+) -> List[str]:
+    upper_leg, lower_leg, foot, toes = chain
 
-    foot_helper_name = create_or_update_bone(armature, _helper_name(foot.name))
-    foot_helper = find_edit_bone(armature, foot_helper_name)
-    foot_helper.head = toes.head
-    foot_helper.tail = toes.tail + 0.05 * (toes.tail - toes.head).normalized()
+    # Crate a helper bones for upper leg, lower leg, foot and toes
+    upper_leg_bone = model[upper_leg]
+    upper_helper = model.add_bone(
+        _helper_name(upper_leg),
+        head=upper_helper_head,
+        tail=upper_helper_tail,
+        parent=upper_leg_bone.parent,
+        use_connect=upper_leg_bone.use_connect,
+        use_deform=False,
+    )
 
     # Parent the helper bones
-    upper_helper.use_connect = upper_leg.use_connect
-    upper_helper.parent = upper_leg.parent
-    upper_helper.use_deform = False
-
-    lower_helper.use_connect = False
-    lower_helper.parent = upper_helper
-    lower_helper.use_deform = False
-
-    foot_helper.use_connect = True
-    foot_helper.parent = lower_helper
-    foot_helper.use_deform = False
+    lower_helper = model.add_bone(
+        _helper_name(lower_leg),
+        head=upper_helper_tail,
+        tail=lower_helper_tail,
+        parent=upper_helper,
+        use_connect=False,
+        use_deform=False,
+    )
+
+    foot_helper = model.add_bone(
+        _helper_name(foot),
+        head=foot_helper_head,
+        tail=foot_helper_tail,
+        parent=lower_helper,
+        use_connect=True,
+        use_deform=False,
+    )
 
     # Create constraints ---
-    bpy.ops.object.mode_set(mode="POSE")
-
-    pose_bones = list([find_pose_bone(armature, name) for name in chain])
-    (
-        pose_upper_leg,
-        pose_lower_leg,
-        pose_foot,
-        pose_toes,
-    ) = pose_bones
-
-    upper_constraint = pose_upper_leg.constraints.new("COPY_ROTATION")
-    upper_constraint.target = armature
-    upper_constraint.subtarget = upper_helper_name
-
-    lower_constraint = pose_lower_leg.constraints.new("COPY_ROTATION")
-    lower_constraint.target = armature
-    lower_constraint.subtarget = lower_helper_name
-
-    foot_constraint = pose_foot.constraints.new("COPY_ROTATION")
-    foot_constraint.target = armature
-    foot_constraint.subtarget = upper_helper_name
-
-    toe_constraint = pose_toes.constraints.new("CHILD_OF")
-    toe_constraint.target = armature
-    toe_constraint.subtarget = foot_helper_name
-
-    bpy.ops.object.mode_set(mode="EDIT")
-
-    return [
-        upper_helper_name,
-        lower_helper_name,
-        foot_helper_name,
+    constraints = [
+        ConstraintSpec(upper_leg, "COPY_ROTATION", upper_helper.name),
+        ConstraintSpec(lower_leg, "COPY_ROTATION", lower_helper.name),
+        ConstraintSpec(foot, "COPY_ROTATION", upper_helper.name),
+        ConstraintSpec(toes, "CHILD_OF", foot_helper.name),
     ]
+    model.constrain(constraints)
+
+    created_bones = [
+        upper_helper.name,
+        lower_helper.name,
+        foot_helper.name,
+    ]
+    model.record(
+        MechanismManifest(
+            "unity_leg_helper",
+            list(chain),
+            bones=created_bones,
+            constraints=[[spec.bone, spec.key] for spec in constraints],
+        )
+    )
+
+    return created_bones
+
+
+def create_unity_leg_helper(
+    armature,
+    selected_bones: List[str],
+    transaction: Optional[RigBuildTransaction] = None,
+) -> List[str]:
+    """
+    Create a helper for Unity's humanoid rig which support anthropomorphic digitigrade legs
+    """
+    return create_unity_leg_helpers(armature, [selected_bones], transaction)
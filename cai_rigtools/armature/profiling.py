@@ -0,0 +1,187 @@
+from contextlib import contextmanager
+from functools import wraps
+import json
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Phases reported by the helpers, time outside of them is reported as "other"
+PHASES = ["selection", "edit", "mode_switch", "constraints", "depsgraph"]
+
+_active: Optional["RigProfile"] = None
+
+
+class RigProfile:
+    """
+    Wall time per phase and counters of a single operator run.
+    Phases nest, the time of an inner phase is not counted for the outer one.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.phases: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.seconds = 0.0
+        self._stack: List[Tuple[str, float]] = []
+
+    def enter(self, phase: str):
+        now = time.perf_counter()
+        if self._stack:
+            outer, start = self._stack[-1]
+            self.phases[outer] = self.phases.get(outer, 0.0) + now - start
+        self._stack.append((phase, now))
+
+    def exit(self):
+        now = time.perf_counter()
+        phase, start = self._stack.pop()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - start
+        if self._stack:
+            self._stack[-1] = (self._stack[-1][0], now)
+
+    def count(self, name: str, amount: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    @property
+    def other_seconds(self) -> float:
+        return max(0.0, self.seconds - sum(self.phases.values()))
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seconds": self.seconds,
+            "phases": dict(self.phases, other=self.other_seconds),
+            "counts": dict(self.counts),
+        }
+
+    def summary(self) -> str:
+        phases = sorted(
+            dict(self.phases, other=self.other_seconds).items(),
+            key=lambda item: -item[1],
+        )
+        text = f"{self.name} {self.seconds * 1000:.1f} ms: " + ", ".join(
+            f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in phases
+        )
+        if self.counts:
+            text += " | " + ", ".join(
+                f"{amount} {name.replace('_', ' ')}"
+                for name, amount in sorted(self.counts.items())
+            )
+        return text
+
+
+def active_profile() -> Optional[RigProfile]:
+    return _active
+
+
+@contextmanager
+def profiling(name: str, log_path: Optional[str] = None) -> Iterator[RigProfile]:
+    """
+    Profiles the helpers called inside the block, the profile is appended to the
+    JSON lines file at `log_path` if given. Nested blocks join the outermost one.
+    """
+    if _active is not None:
+        yield _active
+        return
+
+    profile = RigProfile(name)
+    try:
+        with resume_profiling(profile):
+            yield profile
+    finally:
+        log_profile(profile, log_path)
+
+
+@contextmanager
+def resume_profiling(profile: RigProfile) -> Iterator[RigProfile]:
+    """
+    Profiles the helpers called inside the block into an existing profile, adding
+    the block's time to it. Modal operators profile each of their events this way
+    and log the profile with `log_profile` once they are done.
+    """
+    global _active
+    if _active is not None:
+        yield _active
+        return
+
+    _active = profile
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.seconds += time.perf_counter() - start
+        _active = None
+
+
+def log_profile(profile: RigProfile, log_path: Optional[str] = None):
+    """
+    Appends the profile to the JSON lines file at `log_path`, if given.
+    """
+    if log_path:
+        with open(log_path, "a") as f:
+            f.write(json.dumps(profile.to_dict()) + "\n")
+
+
+class _Phase:
+    __slots__ = ("profile", "phase")
+
+    def __init__(self, profile: RigProfile, phase: str):
+        self.profile = profile
+        self.phase = phase
+
+    def __enter__(self):
+        self.profile.enter(self.phase)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profile.exit()
+        return False
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def profile_phase(phase: str):
+    """
+    Context manager timing a phase, a shared no-op when profiling is off.
+    """
+    if _active is None:
+        return _NO_PHASE
+    return _Phase(_active, phase)
+
+
+def profile_count(name: str, amount: int = 1):
+    if _active is not None and amount:
+        _active.count(name, amount)
+
+
+def profiled(phase: str):
+    """
+    Decorator timing every call of the function as the given phase. When profiling
+    is off the only cost is checking for an active profile.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _active
+            if profile is None:
+                return func(*args, **kwargs)
+
+            profile.enter(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.exit()
+
+        return wrapper
+
+    return decorator
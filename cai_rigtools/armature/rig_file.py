@@ -0,0 +1,223 @@
+import copy
+from dataclasses import replace
+from typing import List, Optional
+
+import bpy
+import numpy as np
+
+from .arrays import BoneArrays
+from .utils import (
+    LayerOccupancy,
+    bone_rows,
+    request_view_layer_update,
+    uses_bone_collections,
+    _bone_collections,
+    _layer_bones,
+)
+from .constraints import ConstraintSpec
+from .manifest import load_manifests
+from .rig_format import RigDescription
+from .transaction import RigBuildTransaction, rig_build
+
+# Constraint settings kept besides the target, the ones a constraint lacks are skipped
+CONSTRAINT_PROPERTIES = [
+    "enabled",
+    "mute",
+    "influence",
+    "owner_space",
+    "target_space",
+    "chain_count",
+    "use_tail",
+    "use_stretch",
+]
+
+
+def _read_constraints(armature) -> List[ConstraintSpec]:
+    specs = []
+    for pose_bone in armature.pose.bones:
+        for constraint in pose_bone.constraints:
+            target = getattr(constraint, "target", None)
+            subtarget = getattr(constraint, "subtarget", "")
+            if target is None or (target == armature and subtarget):
+                # The armature itself is implied, so the rig can be loaded onto a copy
+                target_name = None
+            else:
+                target_name = target.name
+            properties = {}
+            for attribute in CONSTRAINT_PROPERTIES:
+                value = getattr(constraint, attribute, None)
+                if isinstance(value, (bool, int, float, str)):
+                    properties[attribute] = value
+            specs.append(
+                ConstraintSpec(
+                    pose_bone.name,
+                    constraint.type,
+                    subtarget,
+                    target_name,
+                    properties,
+                    constraint.name,
+                )
+            )
+    return specs
+
+
+def _read_layers(armature, names: List[str]):
+    bones = _layer_bones(armature)
+    if uses_bone_collections(armature):
+        collections = list(_bone_collections(armature))
+        layer_names = [collection.name for collection in collections]
+        rows = {name: i for i, name in enumerate(names)}
+        layers = np.zeros((len(names), len(collections)), dtype=bool)
+        for column, collection in enumerate(collections):
+            for bone in collection.bones:
+                if bone.name in rows:
+                    layers[rows[bone.name], column] = True
+        return layer_names, layers
+
+    layer_count = LayerOccupancy.LAYER_COUNT
+    layers = np.zeros(len(bones) * layer_count, dtype=bool)
+    bones.foreach_get("layers", layers)
+    layers = layers.reshape(-1, layer_count)[bone_rows(bones, names)]
+    layer_names = [armature.data.get(f"layer_name_{i}", "") for i in range(layer_count)]
+    return layer_names, layers
+
+
+def _write_layers(armature, names: List[str], layer_names: List[str], layers):
+    """
+    Puts the bones on their layers, or bone collections on newer Blender, creating
+    the named collections which are missing. The bones are taken off every other
+    layer or collection. Has to be called outside of edit mode.
+    """
+    bones = _layer_bones(armature)
+    if uses_bone_collections(armature):
+        for layer_name in layer_names:
+            if _bone_collections(armature).get(layer_name) is None:
+                armature.data.collections.new(layer_name)
+
+        # Bones the description does not know are left alone
+        rows = {name: i for i, name in enumerate(names)}
+        columns = {name: i for i, name in enumerate(layer_names)}
+        for collection in _bone_collections(armature):
+            column = columns.get(collection.name)
+            assigned = np.zeros(len(names), dtype=bool)
+            for bone in collection.bones:
+                row = rows.get(bone.name)
+                if row is not None:
+                    assigned[row] = True
+            if column is not None:
+                wanted = layers[:, column]
+            else:
+                wanted = np.zeros(len(names), dtype=bool)
+
+            for row in np.flatnonzero(wanted & ~assigned):
+                collection.assign(bones[names[row]])
+            for row in np.flatnonzero(assigned & ~wanted):
+                collection.unassign(bones[names[row]])
+        return
+
+    layer_count = LayerOccupancy.LAYER_COUNT
+    current = np.zeros(len(bones) * layer_count, dtype=bool)
+    bones.foreach_get("layers", current)
+    current = current.reshape(-1, layer_count)
+    current[bone_rows(bones, names)] = layers[:, :layer_count]
+    bones.foreach_set("layers", current.ravel())
+
+    for i, layer_name in enumerate(layer_names):
+        if layer_name:
+            armature.data[f"layer_name_{i}"] = layer_name
+    request_view_layer_update()
+
+
+def capture_rig(armature) -> RigDescription:
+    """
+    Reads the rig of the armature, has to be called in edit mode.
+    """
+    bones = BoneArrays.capture(armature)
+    layer_names, layers = _read_layers(armature, bones.names)
+    return RigDescription(
+        bones.names,
+        bones.heads,
+        bones.tails,
+        bones.rolls,
+        bones.parents,
+        bones.use_connect,
+        bones.use_deform,
+        layer_names,
+        layers,
+        _read_constraints(armature),
+        list(load_manifests(armature).values()),
+        armature.name,
+    )
+
+
+def save_rig(armature, path: str) -> RigDescription:
+    """
+    Saves the rig of the armature, has to be called in edit mode.
+    """
+    description = capture_rig(armature)
+    description.save(path)
+    return description
+
+
+def _resolve_targets(
+    armature, description: RigDescription, skipped: Optional[List[ConstraintSpec]]
+) -> List[ConstraintSpec]:
+    """
+    The constraints of the description with the armature it was captured from
+    replaced by `armature`, without the ones whose target object is missing.
+    """
+    specs = []
+    for spec in description.constraints:
+        if spec.target is not None:
+            if spec.target == description.name:
+                spec = replace(spec, target=armature.name)
+            elif spec.target not in bpy.data.objects:
+                if skipped is not None:
+                    skipped.append(spec)
+                continue
+        specs.append(spec)
+    return specs
+
+
+def apply_rig_description(
+    armature,
+    description: RigDescription,
+    transaction: Optional[RigBuildTransaction] = None,
+    skipped: Optional[List[ConstraintSpec]] = None,
+) -> List[str]:
+    """
+    Rebuilds the described rig on the armature through the model's bulk writes,
+    without running any generator. Returns the names of the created bones.
+    Constraints targeting objects which are not in the file, e.g. the curves of a
+    tentacle or a separate target armature, are left out and appended to `skipped`
+    if given.
+    """
+    resolved = copy.copy(description)
+    resolved.constraints = _resolve_targets(armature, description, skipped)
+
+    with rig_build(armature, transaction) as transaction:
+        created_bones = resolved.plan(transaction.plan())
+        if len(description.layer_names):
+            transaction.pose(
+                lambda: _write_layers(
+                    armature,
+                    description.names,
+                    description.layer_names,
+                    description.layers,
+                )
+            )
+    return created_bones
+
+
+def load_rig(
+    armature,
+    path: str,
+    transaction: Optional[RigBuildTransaction] = None,
+    skipped: Optional[List[ConstraintSpec]] = None,
+) -> List[str]:
+    """
+    Loads a saved rig onto the armature, see `apply_rig_description`.
+    """
+    return apply_rig_description(
+        armature, RigDescription.load(path), transaction, skipped
+    )
@@ -0,0 +1,278 @@
+from dataclasses import asdict
+import json
+import mmap
+import struct
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .arrays import BONE_EPSILON
+from .specs import ConstraintSpec
+from .manifest import MechanismManifest
+from .model import ArmatureModel
+
+# File layout: magic, header length, JSON header, then the arrays, each aligned
+RIG_FILE_MAGIC = b"CAIRIG\0\0"
+RIG_FILE_VERSION = 1
+
+_PREFIX = struct.Struct("<8sII")
+# Arrays start on cache line boundaries, mapped arrays are aligned as well
+_ALIGNMENT = 64
+
+# Per-bone arrays and their types, little endian on every platform
+_ARRAYS = {
+    "heads": "<f4",
+    "tails": "<f4",
+    "rolls": "<f4",
+    "parents": "<i4",
+    "use_connect": "|b1",
+    "use_deform": "|b1",
+}
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+class RigDescription:
+    """
+    Everything needed to rebuild a rig without its generators: the edit bones and
+    their hierarchy as arrays in the layout of `BoneArrays`, the layers of the
+    bones, the constraints as specs and the manifests. Works without Blender, see
+    `rig_file` for reading one from an armature and applying it.
+
+    Saved as a small JSON header followed by the raw arrays, which `load` copies
+    straight out of a memory map of the file.
+
+        capture_rig(armature).save("npc.rig")
+        load_rig(other_armature, "npc.rig")
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        heads: np.ndarray,
+        tails: np.ndarray,
+        rolls: np.ndarray,
+        parents: np.ndarray,
+        use_connect: np.ndarray,
+        use_deform: np.ndarray,
+        layer_names: Optional[List[str]] = None,
+        layers: Optional[np.ndarray] = None,
+        constraints: Optional[List[ConstraintSpec]] = None,
+        manifests: Optional[List[MechanismManifest]] = None,
+        name: str = "",
+    ):
+        self.names = list(names)
+        self.heads = heads
+        self.tails = tails
+        self.rolls = rolls
+        self.parents = parents
+        self.use_connect = use_connect
+        self.use_deform = use_deform
+        self.layer_names = list(layer_names or [])
+        self.layers = (
+            layers
+            if layers is not None
+            else np.zeros((len(self.names), len(self.layer_names)), dtype=bool)
+        )
+        self.constraints = list(constraints or [])
+        self.manifests = list(manifests or [])
+        self.name = name
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_model(
+        cls,
+        model: ArmatureModel,
+        layer_names: Optional[List[str]] = None,
+        layers: Optional[np.ndarray] = None,
+        name: str = "",
+    ) -> "RigDescription":
+        """
+        Description of the bones, constraints and manifests planned on the model.
+        """
+        return cls(
+            model.names,
+            model.heads,
+            model.tails,
+            model.rolls,
+            model.parents,
+            model.use_connect,
+            model.use_deform,
+            layer_names,
+            layers,
+            model.constraints,
+            model.manifests,
+            name,
+        )
+
+    def to_model(self) -> ArmatureModel:
+        model = ArmatureModel(
+            self.names,
+            self.heads,
+            self.tails,
+            self.rolls,
+            self.parents,
+            self.use_connect,
+            self.use_deform,
+        )
+        model.constrain(self.constraints)
+        for manifest in self.manifests:
+            model.record(MechanismManifest(**asdict(manifest)))
+        return model
+
+    def plan(self, model: ArmatureModel) -> List[str]:
+        """
+        Plans the described rig on the model: adds the missing bones, then brings the
+        hierarchy and geometry of every described bone in line, comparing whole
+        arrays so only the bones which differ are written. Bones the description does
+        not know are left alone. Returns the names of the added bones.
+        """
+        created_bones = [name for name in self.names if name not in model]
+        for bone_name in created_bones:
+            model.add_bone(bone_name)
+
+        rows = np.fromiter(
+            (model.rows[name] for name in self.names),
+            dtype=np.int64,
+            count=len(self.names),
+        )
+        parents = np.where(self.parents >= 0, rows[self.parents], -1)
+
+        # Connecting moves the head, hierarchy first then the geometry
+        relinked = np.flatnonzero(
+            (model.parents[rows] != parents)
+            | (model.use_connect[rows] != self.use_connect)
+            | (model.use_deform[rows] != self.use_deform)
+        )
+        for i in relinked:
+            model.update(
+                int(rows[i]),
+                parent=model.names[parents[i]] if parents[i] >= 0 else None,
+                use_connect=self.use_connect[i],
+                use_deform=self.use_deform[i],
+            )
+
+        moved = np.flatnonzero(
+            (np.linalg.norm(model.heads[rows] - self.heads, axis=1) > BONE_EPSILON)
+            | (np.linalg.norm(model.tails[rows] - self.tails, axis=1) > BONE_EPSILON)
+        )
+        model.set_heads(rows[moved], self.heads[moved])
+        model.set_tails(rows[moved], self.tails[moved])
+
+        rolled = np.flatnonzero(np.abs(model.rolls[rows] - self.rolls) > BONE_EPSILON)
+        model.set_rolls(rows[rolled], self.rolls[rolled])
+
+        model.constrain(self.constraints)
+        for manifest in self.manifests:
+            model.record(MechanismManifest(**asdict(manifest)))
+
+        return created_bones
+
+    def _header(self) -> Dict[str, Any]:
+        return {
+            "version": RIG_FILE_VERSION,
+            "name": self.name,
+            "bones": self.names,
+            "layer_names": self.layer_names,
+            "constraints": [asdict(spec) for spec in self.constraints],
+            "manifests": [asdict(manifest) for manifest in self.manifests],
+        }
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {
+            name: np.ascontiguousarray(getattr(self, name), dtype=dtype)
+            for name, dtype in _ARRAYS.items()
+        }
+        arrays["layers"] = np.ascontiguousarray(self.layers, dtype="|b1")
+        return arrays
+
+    def to_bytes(self) -> bytes:
+        header = self._header()
+        arrays = self._arrays()
+
+        # The offsets depend on the header length, which depends on the offsets
+        header["arrays"] = {}
+        offset = 0
+        for name, array in arrays.items():
+            header["arrays"][name] = {
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": offset,
+            }
+            offset = _aligned(offset + array.nbytes)
+
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        data_start = _aligned(_PREFIX.size + len(encoded))
+
+        chunks = bytearray(data_start + offset)
+        _PREFIX.pack_into(chunks, 0, RIG_FILE_MAGIC, RIG_FILE_VERSION, len(encoded))
+        chunks[_PREFIX.size : _PREFIX.size + len(encoded)] = encoded
+        for name, array in arrays.items():
+            start = data_start + header["arrays"][name]["offset"]
+            chunks[start : start + array.nbytes] = array.tobytes()
+        return bytes(chunks)
+
+    @classmethod
+    def from_buffer(cls, buffer, copy: bool = False) -> "RigDescription":
+        """
+        Reads a description from bytes or a memory map, the arrays are read-only views
+        of the buffer unless `copy` is set.
+        """
+        magic, version, header_length = _PREFIX.unpack_from(buffer, 0)
+        if magic != RIG_FILE_MAGIC:
+            raise ValueError("Not a rig description")
+        if version > RIG_FILE_VERSION:
+            raise ValueError(
+                f"Rig description version {version} is newer than {RIG_FILE_VERSION}"
+            )
+
+        header = json.loads(
+            bytes(buffer[_PREFIX.size : _PREFIX.size + header_length]).decode("utf-8")
+        )
+        data_start = _aligned(_PREFIX.size + header_length)
+
+        arrays = {}
+        for name, layout in header["arrays"].items():
+            dtype = np.dtype(layout["dtype"])
+            shape = tuple(layout["shape"])
+            arrays[name] = np.frombuffer(
+                buffer,
+                dtype=dtype,
+                count=int(np.prod(shape)),
+                offset=data_start + layout["offset"],
+            ).reshape(shape)
+            if copy:
+                arrays[name] = arrays[name].copy()
+
+        return cls(
+            header["bones"],
+            arrays["heads"],
+            arrays["tails"],
+            arrays["rolls"],
+            arrays["parents"],
+            arrays["use_connect"],
+            arrays["use_deform"],
+            header["layer_names"],
+            arrays["layers"],
+            [ConstraintSpec(**spec) for spec in header["constraints"]],
+            [MechanismManifest(**manifest) for manifest in header["manifests"]],
+            header["name"],
+        )
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "RigDescription":
+        """
+        Copies the arrays out of a memory map of the file, which is closed before
+        returning, an open map would keep the file locked on Windows.
+        """
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return cls.from_buffer(mapped, copy=True)
@@ -0,0 +1,69 @@
+from dataclasses import dataclass, field
+import hashlib
+from typing import Any, Dict, Optional
+
+# Constraint types offered as filters in the UI
+CONSTRAINT_TYPES = [
+    "COPY_LOCATION",
+    "COPY_ROTATION",
+    "COPY_SCALE",
+    "COPY_TRANSFORMS",
+    "LIMIT_DISTANCE",
+    "LIMIT_LOCATION",
+    "LIMIT_ROTATION",
+    "LIMIT_SCALE",
+    "MAINTAIN_VOLUME",
+    "TRANSFORM",
+    "CLAMP_TO",
+    "DAMPED_TRACK",
+    "IK",
+    "LOCKED_TRACK",
+    "SPLINE_IK",
+    "STRETCH_TO",
+    "TRACK_TO",
+    "ACTION",
+    "ARMATURE",
+    "CHILD_OF",
+    "FLOOR",
+    "FOLLOW_PATH",
+    "PIVOT",
+    "SHRINKWRAP",
+]
+
+# Prefix of the constraint names generated from specs
+CONSTRAINT_NAME_PREFIX = "RT-"
+
+# Blender truncates longer names, which would break the lookup by name
+_MAX_NAME_BYTES = 63
+
+
+def constraint_name(constraint_type: str, subtarget: str) -> str:
+    """
+    Stable name of a generated constraint, used as the key when updating it
+    """
+    name = f"{CONSTRAINT_NAME_PREFIX}{constraint_type}-{subtarget}"
+    if len(name.encode("utf-8")) <= _MAX_NAME_BYTES:
+        return name
+
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+    shortened = name.encode("utf-8")[: _MAX_NAME_BYTES - 9].decode("utf-8", "ignore")
+    return f"{shortened}-{digest}"
+
+
+@dataclass
+class ConstraintSpec:
+    """
+    Declarative description of a pose bone constraint. `target` is an object
+    name, it defaults to the armature itself when a subtarget is given.
+    """
+
+    bone: str
+    type: str
+    subtarget: str = ""
+    target: Optional[str] = None
+    properties: Dict[str, Any] = field(default_factory=dict)
+    name: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return self.name or constraint_name(self.type, self.subtarget)
@@ -0,0 +1,83 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Side markers, the first matching pattern wins
+_SIDE = r"(?P<side>[LlRr]|[Ll]eft|[Rr]ight|LEFT|RIGHT)"
+_NUMBER = r"(?P<number>\.\d+)?"
+_SIDE_PATTERNS = [
+    # Leg.L, Leg_r, Leg-Left, Leg.Lower.L.001
+    re.compile(rf"^(?P<base>.+[._\- ]){_SIDE}{_NUMBER}$"),
+    # L.Leg, r_Leg, Left-Leg
+    re.compile(rf"^{_SIDE}(?P<base>[._\- ].+)$"),
+    # LeftLeg, RightHand
+    re.compile(r"^(?P<side>Left|Right)(?P<base>[A-Z0-9].*)$"),
+    # legLeft, HandRight.001
+    re.compile(rf"^(?P<base>.*[a-z0-9])(?P<side>Left|Right){_NUMBER}$"),
+]
+
+
+def split_side(bone_name: str) -> Tuple[str, Optional[str]]:
+    """
+    Splits a bone name into a side independent key and its side ("L", "R" or None).
+    The key keeps the naming convention, so `Leg.L` pairs with `Leg.R` but not with `Leg_R`.
+    """
+    for pattern in _SIDE_PATTERNS:
+        match = pattern.match(bone_name)
+        if not match:
+            continue
+
+        groups = match.groupdict()
+        side = "L" if groups["side"][0] in "Ll" else "R"
+        # L/R and Left/Right are different conventions and are not paired
+        marker = "<s>" if len(groups["side"]) == 1 else "<side>"
+        start, end = match.span("side")
+        return bone_name[:start] + marker + bone_name[end:], side
+
+    return bone_name, None
+
+
+class SymmetryIndex:
+    """
+    Hash map from side independent bone names to the rows of the left and right bones.
+    """
+
+    def __init__(self, bone_names: Sequence[str], rows: Optional[Sequence[int]] = None):
+        rows = range(len(bone_names)) if rows is None else rows
+
+        self.keys: Dict[int, str] = {}
+        self.pairs: Dict[str, List[int]] = {}
+        self.center: List[int] = []
+
+        for bone_name, row in zip(bone_names, rows):
+            key, side = split_side(bone_name)
+            if side is None:
+                self.center.append(row)
+                continue
+            self.keys[row] = key
+            pair = self.pairs.setdefault(key, [-1, -1])
+            pair[0 if side == "L" else 1] = row
+
+    def mirror_of(self, row: int) -> int:
+        """
+        Row of the bone on the other side, -1 if there is none
+        """
+        key = self.keys.get(row)
+        if key is None:
+            return -1
+        left, right = self.pairs[key]
+        return right if row == left else left
+
+    def first_of_pairs(self, rows: Sequence[int]) -> List[int]:
+        """
+        Keeps only the first of the given rows from each symmetric pair
+        """
+        seen = set()
+        result = []
+        for row in rows:
+            key = self.keys.get(row)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            result.append(row)
+        return result
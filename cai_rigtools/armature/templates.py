@@ -0,0 +1,413 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .specs import ConstraintSpec
+from .manifest import MechanismManifest
+from .model import ArmatureModel
+from .profiling import profile_count
+
+# A planner adds one mechanism for one ordered chain to the model
+ChainPlanner = Callable[[ArmatureModel, List[str]], List[str]]
+
+# Farthest a chain point may be from the transformed template point, in armature units.
+# New bones are off by about as much from where planning would put them.
+TEMPLATE_TOLERANCE = 1e-5
+# Templates kept per topology, chains of the same topology but another shape
+# (mirrored sides for example) get templates of their own
+TEMPLATES_PER_KEY = 8
+
+# A bone of a template, index into the chain bones followed by the new bones and the
+# bone the chain hangs from
+BoneRef = int
+
+
+def _name_recipe(name: str, chain: List[str]) -> Optional[Tuple]:
+    """
+    How a generated bone name derives from a chain bone name: the chain bone with a
+    prefix and a suffix ("CTRL-spine"), or with an extra dot separated segment
+    ("thigh.helper.L"). The longest matching chain name wins, affixes holding a chain
+    name are ambiguous and do not match.
+    """
+    for i in sorted(range(len(chain)), key=lambda i: -len(chain[i])):
+        prefix, found, suffix = name.partition(chain[i])
+        if found and not any(
+            chain_name in prefix or chain_name in suffix for chain_name in chain
+        ):
+            return ("affix", i, prefix, suffix)
+
+    segments = name.split(".")
+    for i, chain_name in enumerate(chain):
+        chain_segments = chain_name.split(".")
+        if len(segments) != len(chain_segments) + 1:
+            continue
+        for position in range(len(segments)):
+            if segments[:position] + segments[position + 1 :] == chain_segments:
+                return ("segment", i, position, segments[position])
+    return None
+
+
+def _apply_name_recipe(recipe: Tuple, chain: List[str]) -> str:
+    if recipe[0] == "affix":
+        _, i, prefix, suffix = recipe
+        return f"{prefix}{chain[i]}{suffix}"
+
+    _, i, position, segment = recipe
+    segments = chain[i].split(".")
+    segments.insert(position, segment)
+    return ".".join(segments)
+
+
+def fit_rigid_transform(
+    source: np.ndarray, target: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Rotation and translation best mapping the (N, 3) source points onto the target
+    points (Kabsch), without mirroring. Returns the rotation, the translation and the
+    largest distance left between a mapped point and its target.
+    """
+    source = np.asarray(source, dtype=np.float64)
+    target = np.asarray(target, dtype=np.float64)
+    source_center = source.mean(axis=0)
+    target_center = target.mean(axis=0)
+
+    covariance = (source - source_center).T @ (target - target_center)
+    u, _, vt = np.linalg.svd(covariance)
+    # A reflection would turn left handed mechanisms into right handed ones
+    sign = np.sign(np.linalg.det(vt.T @ u.T)) or 1.0
+    rotation = vt.T @ np.diag([1.0, 1.0, sign]) @ u.T
+    translation = target_center - rotation @ source_center
+
+    mapped = source @ rotation.T + translation
+    residual = float(np.linalg.norm(mapped - target, axis=1).max(initial=0.0))
+    return rotation, translation, residual
+
+
+def _chain_points(model: ArmatureModel, rows: np.ndarray) -> np.ndarray:
+    return np.concatenate([model.heads[rows], model.tails[rows]])
+
+
+def _is_collinear(points: np.ndarray, tolerance: float) -> bool:
+    centered = points - points.mean(axis=0)
+    singular_values = np.linalg.svd(centered.astype(np.float64), compute_uv=False)
+    return singular_values[1] <= tolerance
+
+
+class MechanismTemplate:
+    """
+    One generated mechanism in terms of its chain: the bones it added, with their
+    geometry in the coordinates of the chain it was captured from, the chain bones
+    it relinked, and its constraints and manifests with bones as references into
+    the chain. Applying it to another chain of the same shape takes one rigid
+    transform of the geometry, no planning. Mechanisms moving or turning the chain
+    bones themselves are not templated.
+    """
+
+    def __init__(self, points: np.ndarray):
+        self.points = points
+        self.names: List[Tuple] = []
+        # Chain bones given another parent, connect or deform flag, their geometry
+        # is left alone: (bone, parent, use_connect, use_deform)
+        self.relinked: List[Tuple[BoneRef, BoneRef, bool, bool]] = []
+        # Parents of the new bones, -1 for bones without a parent
+        self.parents = np.empty(0, dtype=np.int64)
+        self.heads = np.empty((0, 3))
+        self.tails = np.empty((0, 3))
+        self.rolls = np.empty(0)
+        self.use_connect = np.empty(0, dtype=bool)
+        self.use_deform = np.empty(0, dtype=bool)
+        self.constraints: List[Tuple] = []
+        self.manifests: List[Tuple] = []
+        self.created: List[BoneRef] = []
+
+    @classmethod
+    def capture(
+        cls,
+        model: ArmatureModel,
+        bone_chain: List[str],
+        planner: ChainPlanner,
+    ) -> Tuple[Optional["MechanismTemplate"], ArmatureModel, List[str]]:
+        """
+        Plans the mechanism on a model holding only the chain and its parent. Returns
+        the template, or None when the mechanism refers to bones outside the chain or
+        names its bones in a way the template can not follow, together with the
+        scratch model and the bones the planner returned.
+        """
+        rows = np.array([model.rows[name] for name in bone_chain], dtype=np.int64)
+        parent = int(model.parents[rows[0]])
+        scratch_rows = np.concatenate([[parent], rows]) if parent >= 0 else rows
+
+        local = {int(row): i for i, row in enumerate(scratch_rows)}
+        # Only the chain's parent may hang from bones outside the scratch model
+        if any(
+            model.parents[row] >= 0 and model.parents[row] not in local for row in rows
+        ):
+            return None, None, None
+        scratch = ArmatureModel(
+            [model.names[row] for row in scratch_rows],
+            model.heads[scratch_rows],
+            model.tails[scratch_rows],
+            model.rolls[scratch_rows],
+            [local.get(int(model.parents[row]), -1) for row in scratch_rows],
+            model.use_connect[scratch_rows],
+            model.use_deform[scratch_rows],
+        )
+        before = ArmatureModel(
+            scratch.names,
+            scratch.heads,
+            scratch.tails,
+            scratch.rolls,
+            scratch.parents,
+            scratch.use_connect,
+            scratch.use_deform,
+        )
+        created_bones = planner(scratch, list(bone_chain))
+
+        template = cls(_chain_points(before, np.arange(len(before))))
+        new_names = scratch.names[scratch.base :]
+        bone_refs = {
+            name: i
+            for i, name in enumerate(
+                bone_chain + new_names + ([model.names[parent]] if parent >= 0 else [])
+            )
+        }
+        if len(bone_refs) != len(bone_chain) + len(new_names) + (parent >= 0):
+            # The mechanism reuses the chain's parent, the chain was rigged already
+            return None, scratch, created_bones
+        ref = bone_refs.get
+
+        for name in new_names:
+            recipe = _name_recipe(name, bone_chain)
+            if recipe is None or _apply_name_recipe(recipe, bone_chain) != name:
+                return None, scratch, created_bones
+            template.names.append(recipe)
+
+        existing = slice(0, scratch.base)
+        if (
+            np.any(scratch.heads[existing] != before.heads)
+            or np.any(scratch.tails[existing] != before.tails)
+            or np.any(scratch.rolls[existing] != before.rolls)
+        ):
+            # Moved or turned chain bones would be written from the template, they
+            # have to keep their own geometry
+            return None, scratch, created_bones
+        relinked_rows = np.flatnonzero(
+            (scratch.parents[existing] != before.parents)
+            | (scratch.use_connect[existing] != before.use_connect)
+            | (scratch.use_deform[existing] != before.use_deform)
+        )
+        if parent >= 0 and 0 in relinked_rows:
+            # The chain's parent was cut from its own parent, it can not be written
+            return None, scratch, created_bones
+
+        # Every row of the scratch model has a reference
+        parent_refs = [
+            ref(scratch.names[parent_row]) if parent_row >= 0 else -1
+            for parent_row in scratch.parents
+        ]
+        template.relinked = [
+            (
+                ref(scratch.names[row]),
+                parent_refs[row],
+                bool(scratch.use_connect[row]),
+                bool(scratch.use_deform[row]),
+            )
+            for row in relinked_rows
+        ]
+        new_rows = np.arange(scratch.base, len(scratch))
+        template.parents = np.array(
+            [parent_refs[row] for row in new_rows], dtype=np.int64
+        )
+        template.heads = scratch.heads[new_rows].astype(np.float64)
+        template.tails = scratch.tails[new_rows].astype(np.float64)
+        template.rolls = scratch.rolls[new_rows].copy()
+        template.use_connect = scratch.use_connect[new_rows].copy()
+        template.use_deform = scratch.use_deform[new_rows].copy()
+
+        for spec in scratch.constraints:
+            bone_ref = ref(spec.bone)
+            subtarget_ref = ref(spec.subtarget) if spec.subtarget else None
+            if (
+                bone_ref is None
+                or (spec.subtarget and subtarget_ref is None)
+                or spec.target is not None
+                or spec.name is not None
+            ):
+                return None, scratch, created_bones
+            template.constraints.append(
+                (bone_ref, spec.type, subtarget_ref, dict(spec.properties))
+            )
+
+        for manifest in scratch.manifests:
+            refs = [ref(name) for name in manifest.sources + manifest.bones]
+            if None in refs or manifest.name is not None:
+                return None, scratch, created_bones
+            keys = [tuple(pair) for pair in manifest.constraints]
+            spec_keys = [(spec.bone, spec.key) for spec in scratch.constraints]
+            template.manifests.append(
+                (
+                    manifest.generator,
+                    refs[: len(manifest.sources)],
+                    dict(manifest.inputs),
+                    refs[len(manifest.sources) :],
+                    [spec_keys.index(key) for key in keys],
+                )
+            )
+
+        template.created = [ref(name) for name in created_bones]
+        if None in template.created:
+            return None, scratch, created_bones
+        return template, scratch, created_bones
+
+    def apply(
+        self,
+        model: ArmatureModel,
+        bone_chain: List[str],
+        rotation: np.ndarray,
+        translation: np.ndarray,
+    ) -> List[str]:
+        """
+        Adds the mechanism to the chain of the model, moved by the given transform.
+        Returns the bones the planner would have returned.
+        """
+        parent = model.parents[model.rows[bone_chain[0]]]
+        names = list(bone_chain)
+        names += [_apply_name_recipe(recipe, bone_chain) for recipe in self.names]
+        if parent >= 0:
+            names.append(model.names[parent])
+
+        rows = np.array(
+            [model.add_bone(name).row for name in names] + [-1], dtype=np.int64
+        )
+        for bone_ref, parent_ref, use_connect, use_deform in self.relinked:
+            model.update(
+                int(rows[bone_ref]),
+                use_connect=use_connect,
+                parent=names[parent_ref] if parent_ref >= 0 else None,
+                use_deform=use_deform,
+            )
+        model.set_rows(
+            rows[len(bone_chain) : len(bone_chain) + len(self.names)],
+            self.heads @ rotation.T + translation,
+            self.tails @ rotation.T + translation,
+            self.rolls,
+            rows[self.parents],
+            self.use_connect,
+            self.use_deform,
+        )
+
+        constraints = [
+            ConstraintSpec(
+                names[bone_ref],
+                constraint_type,
+                names[subtarget_ref] if subtarget_ref is not None else "",
+                properties=dict(properties),
+            )
+            for bone_ref, constraint_type, subtarget_ref, properties in self.constraints
+        ]
+        model.constrain(constraints)
+
+        for generator, sources, inputs, bones, spec_indices in self.manifests:
+            model.record(
+                MechanismManifest(
+                    generator,
+                    [names[bone_ref] for bone_ref in sources],
+                    inputs=dict(inputs),
+                    bones=[names[bone_ref] for bone_ref in bones],
+                    constraints=[
+                        [constraints[i].bone, constraints[i].key] for i in spec_indices
+                    ],
+                )
+            )
+
+        return [names[bone_ref] for bone_ref in self.created]
+
+
+class TemplateCache:
+    """
+    Mechanism templates by generator and chain topology. The first chain of a
+    topology is planned and captured, the next ones of the same shape only fit a
+    rigid transform onto the template. Chains which can not be fit closer than
+    `tolerance` are planned and captured as another template of their topology.
+
+    Templates only hold for planners whose result turns and moves with the chain,
+    which is the case for the lever, tail and leg helper generators. The fit is rigid
+    since they use fixed lengths and unit axes, a scaled chain does not get a scaled
+    mechanism. Rolls of the new bones are copied as planned, the generators set
+    constant rolls, the chain bones keep their own.
+    """
+
+    def __init__(self, tolerance: float = TEMPLATE_TOLERANCE):
+        self.tolerance = tolerance
+        self._templates: Dict[Tuple, List[MechanismTemplate]] = {}
+        # Topologies whose mechanism can not be templated
+        self._untemplated = set()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return sum(len(templates) for templates in self._templates.values())
+
+    @staticmethod
+    def key(model: ArmatureModel, generator: str, bone_chain: List[str]) -> Tuple:
+        """
+        Chain length, how its bones hang from each other and from the chain's parent,
+        and their connect and deform flags.
+        """
+        rows = np.array([model.rows[name] for name in bone_chain], dtype=np.int64)
+        parents = model.parents[rows]
+        in_chain = parents[:, None] == rows
+        local = np.where(in_chain.any(axis=1), in_chain.argmax(axis=1), -1)
+        return (
+            generator,
+            len(rows),
+            local.tobytes(),
+            bool(parents[0] >= 0),
+            model.use_connect[rows].tobytes(),
+            model.use_deform[rows].tobytes(),
+        )
+
+    def plan(
+        self,
+        model: ArmatureModel,
+        generator: str,
+        planner: ChainPlanner,
+        bone_chain: List[str],
+    ) -> List[str]:
+        """
+        Adds the generator's mechanism for the chain to the model, from a template
+        if one fits, otherwise from the planner.
+        """
+        key = self.key(model, generator, bone_chain)
+        if key in self._untemplated:
+            return planner(model, bone_chain)
+
+        rows = np.array([model.rows[name] for name in bone_chain], dtype=np.int64)
+        parent = int(model.parents[rows[0]])
+        points_rows = np.concatenate([[parent], rows]) if parent >= 0 else rows
+        points = _chain_points(model, points_rows)
+
+        templates = self._templates.setdefault(key, [])
+        for template in templates:
+            rotation, translation, residual = fit_rigid_transform(
+                template.points, points
+            )
+            if residual <= self.tolerance:
+                self.hits += 1
+                profile_count("template_hits")
+                return template.apply(model, bone_chain, rotation, translation)
+
+        self.misses += 1
+        template, _, _ = MechanismTemplate.capture(model, bone_chain, planner)
+        if template is None:
+            self._untemplated.add(key)
+            return planner(model, bone_chain)
+
+        # Any turn around a straight chain fits it, the mechanism could come out turned
+        if len(templates) < TEMPLATES_PER_KEY and not _is_collinear(
+            template.points, self.tolerance
+        ):
+            templates.append(template)
+        # Captured on a copy of the chain, applying it as is plans the real chain
+        return template.apply(model, bone_chain, np.identity(3), np.zeros(3))
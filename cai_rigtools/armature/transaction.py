@@ -0,0 +1,293 @@
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import bpy
+
+from .tree_utils import BoneHierarchyIndex
+from .utils import ArmatureSnapshot, BoneRegistry
+from .constraints import ConstraintSpec, apply_constraint_specs
+from .manifest import MechanismManifest, store_manifests
+from .model import ArmatureModel
+from .journal import RigJournal
+from .templates import ChainPlanner, TemplateCache
+from .profiling import profile_count, profile_phase
+
+
+class RigBuildTransaction:
+    """
+    Collects the edit bone and pose constraint work of any number of generators
+    and applies it with exactly one EDIT and one POSE phase.
+
+        with RigBuildTransaction(armature) as transaction:
+            create_tail_mechanism(armature, first_chain, transaction)
+            create_tail_mechanism(armature, second_chain, transaction)
+
+    Edit work either runs right away inside the `with` block (the transaction
+    keeps the armature in edit mode) or is queued with `edit()`. Constraints
+    are declared with `constrain()` and applied in one pass once all the edit
+    work is done, other pose work can be queued with `pose()`. Generators
+    `record()` a manifest of what they did, these are stored on the armature
+    once the edit work is written back.
+
+    Generators may also `plan()` against an `ArmatureModel` of the edit bones
+    instead of touching them, the model is written with bulk writes on commit.
+    With a `TemplateCache`, chain generators reuse the mechanism planned for an
+    earlier chain of the same shape, see `plan_chain()`.
+
+    A `journaled` transaction can be rolled back completely, it does so when the
+    `with` block raises. Generators which change Blender data right away register
+    what undoes it with `on_rollback`, and what has to wait until the work is done
+    for good, like removing data it replaced, with `on_commit`.
+    """
+
+    def __init__(
+        self,
+        armature,
+        hierarchy: Optional[BoneHierarchyIndex] = None,
+        journaled: bool = False,
+        templates: Optional[TemplateCache] = None,
+    ):
+        self.armature = armature
+        self._hierarchy = hierarchy
+        self._snapshot = None
+        self._model = None
+        self._entry_mode = None
+        self._journaled = journaled
+        self.journal: Optional[RigJournal] = None
+        self.templates = templates
+
+        self.registry = BoneRegistry(armature)
+
+        self.edit_work: List[Callable[[], None]] = []
+        self.pose_work: List[Callable[[], None]] = []
+        self.commit_work: List[Callable[[], None]] = []
+        self.rollback_work: List[Callable[[], None]] = []
+        self.constraint_specs: List[ConstraintSpec] = []
+        self.constraint_counts: Dict[str, int] = {}
+        self.manifests: List[MechanismManifest] = []
+
+        self.mode_switches = 0
+        self.requested_mode_switches = 0
+
+    @property
+    def hierarchy(self) -> BoneHierarchyIndex:
+        if self._hierarchy is None:
+            self._hierarchy = BoneHierarchyIndex.from_armature(self.armature)
+        return self._hierarchy
+
+    @property
+    def snapshot(self) -> ArmatureSnapshot:
+        """
+        Edit bone geometry captured on first use, changes are written back on commit.
+        """
+        if self._snapshot is None:
+            self._snapshot = ArmatureSnapshot.capture(self.armature)
+        return self._snapshot
+
+    @property
+    def model(self) -> ArmatureModel:
+        """
+        Edit bones captured on first use, the plan is written and its constraints and
+        manifests are applied on commit.
+        """
+        if self._model is None:
+            self._model = ArmatureModel.capture(self.armature)
+        return self._model
+
+    @property
+    def mode_switches_saved(self) -> int:
+        """
+        Mode switches the generators would have done on their own minus the ones done.
+        """
+        return max(0, self.requested_mode_switches - self.mode_switches)
+
+    def set_mode(self, mode: str):
+        if self.armature.mode != mode:
+            with profile_phase("mode_switch"):
+                bpy.ops.object.mode_set(mode=mode)
+            profile_count("mode_switches")
+            self.mode_switches += 1
+            self.registry.invalidate()
+
+    def edit(self, work: Callable[[], None]):
+        self.edit_work.append(work)
+
+    def pose(self, work: Callable[[], None]):
+        # Each generator used to go EDIT -> POSE -> EDIT for its own constraints
+        self.requested_mode_switches += 2
+        self.pose_work.append(work)
+
+    def constrain(self, specs: Iterable[ConstraintSpec]):
+        # Each generator used to go EDIT -> POSE -> EDIT for its own constraints
+        self.requested_mode_switches += 2
+        self.constraint_specs.extend(specs)
+
+    def on_commit(self, work: Callable[[], None]):
+        self.commit_work.append(work)
+
+    def on_rollback(self, work: Callable[[], None]):
+        # Undone in reverse order, the last change first
+        self.rollback_work.append(work)
+
+    def record(self, manifest: MechanismManifest):
+        self.manifests.append(manifest)
+
+    def plan(self) -> ArmatureModel:
+        # Each generator used to go EDIT -> POSE -> EDIT for its own constraints
+        self.requested_mode_switches += 2
+        return self.model
+
+    def plan_chain(
+        self, generator: str, planner: ChainPlanner, bone_chain: List[str]
+    ) -> List[str]:
+        """
+        Plans one chain's mechanism, from the transaction's templates if it has any.
+        """
+        model = self.plan()
+        if self.templates is None:
+            return planner(model, bone_chain)
+        return self.templates.plan(model, generator, planner, bone_chain)
+
+    def commit(self):
+        """
+        Runs the queued edit work, then the queued pose work, then returns to the
+        mode the transaction was started from.
+        """
+        for _ in self.commit_steps():
+            pass
+
+    def commit_steps(self, chunk_size: Optional[int] = None) -> Iterator[float]:
+        """
+        `commit` split into chunks of at most `chunk_size` bones or constraints,
+        yields the fraction of the bones and constraints done after each chunk.
+        """
+        self.set_mode("EDIT")
+        with profile_phase("edit"):
+            # Edit work may queue further edit work
+            while self.edit_work:
+                self.edit_work.pop(0)()
+
+        if self._snapshot is not None:
+            self._snapshot.write_back(self.armature)
+            self._snapshot = None
+
+        model, self._model = self._model, None
+        if model is not None:
+            self.constraint_specs.extend(model.constraints)
+            self.manifests.extend(model.manifests)
+
+        total = len(self.constraint_specs) + (model.pending_writes if model else 0)
+        done = 0
+
+        if model is not None:
+            steps = model.write_steps(self.armature, chunk_size)
+            while True:
+                with profile_phase("edit"):
+                    written = next(steps, None)
+                if written is None:
+                    break
+                done += written
+                yield done / total
+            self.registry.invalidate()
+
+        if self.manifests:
+            # Fingerprints have to see the bones as the generators left them
+            manifests, self.manifests = self.manifests, []
+            store_manifests(
+                self.armature, manifests, ArmatureSnapshot.capture(self.armature)
+            )
+
+        if self.pose_work or self.constraint_specs:
+            self.set_mode("POSE")
+            specs, self.constraint_specs = self.constraint_specs, []
+            created = self.journal.constraints if self.journal else None
+            previous = self.journal.changed_constraints if self.journal else None
+            chunk_size = chunk_size or max(len(specs), 1)
+            counts = Counter()
+            for start in range(0, len(specs), chunk_size):
+                chunk = specs[start : start + chunk_size]
+                counts.update(
+                    apply_constraint_specs(
+                        self.armature, chunk, self.registry, created, previous
+                    )
+                )
+                done += len(chunk)
+                yield done / total
+            self.constraint_counts = dict(counts)
+
+            pose_work, self.pose_work = self.pose_work, []
+            for work in pose_work:
+                work()
+
+        self.set_mode(self._entry_mode or "EDIT")
+        self.journal = None
+
+        commit_work, self.commit_work = self.commit_work, []
+        self.rollback_work.clear()
+        for work in commit_work:
+            work()
+
+    def rollback(self):
+        """
+        Drops the queued work and runs the `on_rollback` work. With a journal
+        everything the transaction did so far is undone as well: created constraints,
+        bones and objects are removed, bones, changed constraints and manifests are
+        restored.
+        """
+        self.edit_work.clear()
+        self.pose_work.clear()
+        self.commit_work.clear()
+        self.constraint_specs.clear()
+        self.manifests.clear()
+        self._snapshot = None
+        self._model = None
+
+        rollback_work, self.rollback_work = self.rollback_work, []
+        for work in reversed(rollback_work):
+            work()
+
+        journal, self.journal = self.journal, None
+        if journal is not None:
+            if journal.constraints or journal.changed_constraints:
+                self.set_mode("POSE")
+                journal.remove_constraints(self.armature)
+                journal.restore_constraints(self.armature)
+            self.set_mode("EDIT")
+            journal.restore_edit_bones(self.armature)
+            journal.restore_data(self.armature)
+            self.registry.invalidate()
+
+        self.set_mode(self._entry_mode or "EDIT")
+
+    def __enter__(self) -> "RigBuildTransaction":
+        self._entry_mode = self.armature.mode
+        self.set_mode("EDIT")
+        if self._journaled:
+            self.journal = RigJournal(self.armature)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.rollback()
+            return False
+
+        try:
+            self.commit()
+        except BaseException:
+            self.rollback()
+            raise
+        return False
+
+
+@contextmanager
+def rig_build(armature, transaction: Optional[RigBuildTransaction] = None):
+    """
+    Joins the given transaction, or opens and commits a new one when there is none.
+    """
+    if transaction is not None:
+        yield transaction
+        return
+
+    with RigBuildTransaction(armature) as transaction:
+        yield transaction
@@ -1,8 +1,199 @@
-from typing import List, Optional
-import bpy
+from typing import Dict, List, Optional, Sequence
 
 # TODO: Typing
 
+
+class BoneHierarchyIndex:
+    """
+    Flat, index based view of an armature's bone hierarchy.
+
+    Holds parent and depth arrays, Euler-tour entry/exit times and a binary
+    lifting table, so ancestor checks are O(1) and lowest common ancestor
+    queries are O(log n). Build it once per operator run and pass it around.
+    """
+
+    def __init__(self, names: Sequence[str], parents: Sequence[int]):
+        self.names: List[str] = list(names)
+        self.parents: List[int] = list(parents)
+        self.rows: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+        count = len(self.names)
+        self.children: List[List[int]] = [[] for _ in range(count)]
+        self.roots: List[int] = []
+        for i, parent in enumerate(self.parents):
+            if parent < 0:
+                self.roots.append(i)
+            else:
+                self.children[parent].append(i)
+
+        self.depths: List[int] = [0] * count
+        self.tree_ids: List[int] = [-1] * count
+        self.time_in: List[int] = [0] * count
+        self.time_out: List[int] = [0] * count
+
+        # Iterative DFS, deep chains would hit the recursion limit otherwise
+        timer = 0
+        for tree_id, root in enumerate(self.roots):
+            stack = [(root, False)]
+            while stack:
+                node, leaving = stack.pop()
+                if leaving:
+                    self.time_out[node] = timer
+                    timer += 1
+                    continue
+                self.time_in[node] = timer
+                timer += 1
+                self.tree_ids[node] = tree_id
+                stack.append((node, True))
+                for child in reversed(self.children[node]):
+                    self.depths[child] = self.depths[node] + 1
+                    stack.append((child, False))
+
+        if count and min(self.tree_ids) < 0:
+            raise RuntimeError("Bone hierarchy contains a cycle")
+
+        # up[k][i] is the 2^k-th ancestor of i, or -1
+        self.up: List[List[int]] = [self.parents]
+        max_depth = max(self.depths, default=0)
+        while (1 << len(self.up)) <= max_depth:
+            prev = self.up[-1]
+            self.up.append([prev[p] if p >= 0 else -1 for p in prev])
+
+    @classmethod
+    def from_armature(cls, armature) -> "BoneHierarchyIndex":
+        bones = armature.data.bones
+        names = [bone.name for bone in bones]
+        rows = {name: i for i, name in enumerate(names)}
+        parents = [rows[bone.parent.name] if bone.parent else -1 for bone in bones]
+        return cls(names, parents)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, bone_name: str) -> bool:
+        return bone_name in self.rows
+
+    def index_of(self, bone_name: str) -> int:
+        return self.rows[bone_name]
+
+    def is_ancestor(self, ancestor: int, bone: int) -> bool:
+        """
+        True if `ancestor` is `bone` itself or one of its parents.
+        """
+        return (
+            self.time_in[ancestor] <= self.time_in[bone]
+            and self.time_out[bone] <= self.time_out[ancestor]
+        )
+
+    def ancestor_at_depth(self, bone: int, depth: int) -> int:
+        distance = self.depths[bone] - depth
+        if distance < 0:
+            return -1
+        k = 0
+        while distance and bone >= 0:
+            if distance & 1:
+                bone = self.up[k][bone]
+            distance >>= 1
+            k += 1
+        return bone
+
+    def lowest_common_ancestor(self, first: int, second: int) -> int:
+        """
+        Returns the lowest common ancestor of two bones or -1 if they live in
+        separate trees.
+        """
+        if self.tree_ids[first] != self.tree_ids[second]:
+            return -1
+        if self.is_ancestor(first, second):
+            return first
+        if self.is_ancestor(second, first):
+            return second
+
+        for k in reversed(range(len(self.up))):
+            candidate = self.up[k][first]
+            if candidate >= 0 and not self.is_ancestor(candidate, second):
+                first = candidate
+        return self.parents[first]
+
+    def path_up(self, bone: int, ancestor: int) -> List[int]:
+        """
+        Bones from `ancestor` (exclusive) down to `bone` (inclusive).
+        """
+        path = []
+        while bone != ancestor:
+            path.append(bone)
+            bone = self.parents[bone]
+        path.reverse()
+        return path
+
+    def chain(self, first_bone_name: str, second_bone_name: str) -> List[str]:
+        """
+        Same result as the recursive `find_bone_chain`, computed in O(depth).
+        """
+        first, second = self.rows[first_bone_name], self.rows[second_bone_name]
+
+        common = self.lowest_common_ancestor(first, second)
+        if common < 0:
+            raise RuntimeError(
+                f"Bones {first_bone_name} and {second_bone_name} are not part of the same parent chain"
+            )
+
+        # First bone has to be higher in the tree than the second one
+        if self.depths[first] > self.depths[second]:
+            first, second = second, first
+
+        bone_chain = (
+            [first] + self.path_up(first, common) + self.path_up(second, common)
+        )
+        return [self.names[i] for i in bone_chain]
+
+
+def partition_bone_chain_rows(
+    hierarchy: BoneHierarchyIndex, rows: Sequence[int]
+) -> List[List[int]]:
+    """
+    Splits a selection of bone rows into maximal parent chains in a single pass.
+    A chain breaks where a bone's parent is not selected or where the parent
+    branches into more than one selected child. Chains are ordered from root to tip.
+    """
+    rows = list(dict.fromkeys(int(row) for row in rows))
+    selected = set(rows)
+
+    selected_children: Dict[int, List[int]] = {}
+    for row in rows:
+        parent = hierarchy.parents[row]
+        if parent in selected:
+            selected_children.setdefault(parent, []).append(row)
+
+    chains = []
+    for row in rows:
+        parent = hierarchy.parents[row]
+        if parent in selected and len(selected_children[parent]) == 1:
+            continue  # Continues its parent's chain
+
+        chain = [row]
+        children = selected_children.get(row, ())
+        while len(children) == 1:
+            chain.append(children[0])
+            children = selected_children.get(children[0], ())
+        chains.append(chain)
+
+    return chains
+
+
+def partition_bone_chains(
+    hierarchy: BoneHierarchyIndex, bone_names: Sequence[str]
+) -> List[List[str]]:
+    """
+    Name based version of `partition_bone_chain_rows`
+    """
+    rows = [hierarchy.rows[name] for name in bone_names]
+    return [
+        [hierarchy.names[row] for row in chain]
+        for chain in partition_bone_chain_rows(hierarchy, rows)
+    ]
+
+
 def _find_root(armature, bone_name: str) -> str:
     # TODO: data.bones are not always up to date after the prev. operation
     bone = armature.data.bones[bone_name]
@@ -38,7 +229,22 @@ def _find_path(armature, root_bone_name: str, bone_name: str) -> List[str]:
     return bone_chain
 
 
-def find_bone_chain(armature, first_bone_name: str, second_bone_name: str) -> List[str]:
+def find_bone_chain(
+    armature,
+    first_bone_name: str,
+    second_bone_name: str,
+    hierarchy: Optional[BoneHierarchyIndex] = None,
+    legacy: bool = False,
+) -> List[str]:
+    """
+    Returns the bones between two bones of the same parent chain, the upper one first.
+    Uses the given hierarchy index, or builds one. `legacy` selects the old
+    recursive search which is kept for comparison and benchmarking.
+    """
+    if not legacy:
+        hierarchy = hierarchy or BoneHierarchyIndex.from_armature(armature)
+        return hierarchy.chain(first_bone_name, second_bone_name)
+
     # The root is the armature itself but there is no such thing as a true root node in the tree.
     root_bone_name = _find_root(armature, first_bone_name)
     if root_bone_name != _find_root(armature, second_bone_name):
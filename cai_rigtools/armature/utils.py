@@ -1,8 +1,13 @@
-from typing import List, Optional, Tuple
+from contextlib import contextmanager
+from typing import List, Optional, Sequence, Tuple
 import uuid
 
 import bpy
 from mathutils import Vector
+import numpy as np
+
+from .arrays import BONE_EPSILON, BoneArrays
+from .profiling import profile_count, profiled
 
 
 # TODO: Typing
@@ -25,57 +30,123 @@ def get_armature(armature_name=None):
     return None
 
 
-def get_selected_bones(armature_obj) -> List[str]:
-    return [bone.name for bone in armature_obj.data.bones if bone.select] or [
-        bone.name for bone in armature_obj.data.edit_bones if bone.select
-    ]
+_deferred_update_depth = 0
+_view_layer_dirty = False
+
 
+def request_view_layer_update():
+    """
+    Marks the view layer as dirty. Inside `deferred_view_layer_update` the update
+    is postponed to the end of the outermost block, otherwise it happens right away.
+    """
+    global _view_layer_dirty
+    if _deferred_update_depth:
+        _view_layer_dirty = True
+    else:
+        _update_view_layer()
 
-def select_bones(armature, bone_names: List[str], clear_selection: bool = True):
-    # bpy.ops.object.mode_set(mode='EDIT') # Should be in edit mode already
 
-    return 
+@profiled("depsgraph")
+def _update_view_layer():
+    profile_count("depsgraph_updates")
+    bpy.context.view_layer.update()
 
-    # TODO: Refer to bone manager [plugin] on how to change selection of bones
 
+@contextmanager
+def deferred_view_layer_update():
+    """
+    Collects the view layer updates requested by the helpers and flushes them
+    exactly once when the outermost block exits.
+    """
+    global _deferred_update_depth, _view_layer_dirty
+    _deferred_update_depth += 1
+    try:
+        yield
+    finally:
+        _deferred_update_depth -= 1
+        if not _deferred_update_depth and _view_layer_dirty:
+            _view_layer_dirty = False
+            _update_view_layer()
+
+
+class BoneSelection:
+    """
+    Selected bones of an armature as row indices and names of the collection
+    (`bones` or `edit_bones`) the selection was read from.
     """
-        if context.mode == 'POSE':
-            bones = context.selected_pose_bones
-        else:
-            obs = (
-                # List of selected rigs, starting with the active object (if it's a rig)
-                *[o for o in {obj} if o and o.type == 'ARMATURE'],
-                *[o for o in context.selected_objects
-                  if (o != obj and o.type == 'ARMATURE')],
-            )
-            if context.mode == 'EDIT_ARMATURE':
-                bones = [
-                    b
-                    for o in obs
-                    for b in getattr(o.pose, 'bones', [])
-                    if o.data.edit_bones[f'{b.name}'].select
-                ]
-            else:
-                bones = [
-                    b
-                    for o in obs
-                    for b in getattr(o.pose, 'bones', [])
-                    if b.bone.select
-                ]
-    """
-
-    if clear_selection:
-        bpy.ops.armature.select_all(action="DESELECT")
-
-    for bone_name in bone_names:
-        bone = armature.data.bones.get(bone_name)
-        if bone:
-            bone.select = True
-
-    armature.data.edit_bones.active = armature.data.edit_bones.get(bone_names[0])
-    armature.select_set(True)
 
-    bpy.context.view_layer.update()
+    def __init__(self, source: str, indices: np.ndarray, names: List[str]):
+        self.source = source
+        self.indices = indices
+        self.names = names
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __bool__(self) -> bool:
+        return bool(self.names)
+
+
+@profiled("selection")
+def get_bone_selection(armature_obj) -> BoneSelection:
+    """
+    Reads the select flags with foreach_get, names are only read for the selected rows.
+    Falls back to the edit bones if none of the bones are selected.
+    """
+    for source in ("bones", "edit_bones"):
+        collection = getattr(armature_obj.data, source)
+        mask = np.zeros(len(collection), dtype=bool)
+        collection.foreach_get("select", mask)
+
+        indices = np.flatnonzero(mask)
+        if len(indices):
+            names = [collection[int(i)].name for i in indices]
+            return BoneSelection(source, indices, names)
+
+    return BoneSelection("bones", np.empty(0, dtype=np.int64), [])
+
+
+def get_selected_bones(armature_obj) -> List[str]:
+    return get_bone_selection(armature_obj).names
+
+
+_SELECT_ATTRIBUTES = ("select", "select_head", "select_tail")
+
+
+@profiled("selection")
+def select_bones(
+    armature,
+    bone_names: Sequence[str],
+    clear_selection: bool = True,
+    active: Optional[str] = None,
+) -> int:
+    """
+    Selects the given bones (with their heads and tails) in one foreach_set per
+    flag, works in edit mode on the edit bones and in pose or object mode on the
+    bones. The active bone is `active`, or else the first of the given bones.
+    Unknown names are skipped, returns the number of bones selected.
+    """
+    bones = _layer_bones(armature)
+    rows = {bone.name: i for i, bone in enumerate(bones)}
+    indices = np.fromiter(
+        (rows[name] for name in bone_names if name in rows), dtype=np.int64
+    )
+
+    for attribute in _SELECT_ATTRIBUTES:
+        mask = np.zeros(len(bones), dtype=bool)
+        if not clear_selection:
+            bones.foreach_get(attribute, mask)
+        mask[indices] = True
+        bones.foreach_set(attribute, mask)
+
+    if active in rows:
+        bones.active = bones[rows[active]]
+    elif len(indices):
+        bones.active = bones[int(indices[0])]
+
+    armature.select_set(True)
+    request_view_layer_update()
+    return len(indices)
 
 
 ## TODO: add Warning if no bone found
@@ -89,25 +160,140 @@ def find_pose_bone(armature, bone_name: str):
     return armature.pose.bones.get(bone_name, None)
 
 
-def new_bone(obj, bone_name: Optional[str] = None) -> str:
+class ArmatureSnapshot(BoneArrays):
+    """
+    Read side cache of the edit bone geometry of an armature, `BoneArrays` with
+    the single bone accessors returning vectors.
+    """
+
+    def head(self, bone_name: str) -> Vector:
+        return Vector(self.heads[self.rows[bone_name]])
+
+    def tail(self, bone_name: str) -> Vector:
+        return Vector(self.tails[self.rows[bone_name]])
+
+
+class BoneRegistry:
+    """
+    Caches edit and pose bone handles by name for the length of one operator run.
+    Handles die on mode switches, so the cache empties itself whenever the
+    armature's mode differs from the one the handles were taken in.
+    """
+
+    def __init__(self, armature):
+        self.armature = armature
+        self._mode = None
+        self._edit_bones = {}
+        self._pose_bones = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def _check_mode(self):
+        mode = self.armature.mode
+        if mode != self._mode:
+            self.invalidate()
+            self._mode = mode
+
+    def invalidate(self):
+        self._edit_bones.clear()
+        self._pose_bones.clear()
+
+    def register(self, edit_bone):
+        self._check_mode()
+        self._edit_bones[edit_bone.name] = edit_bone
+
+    def edit_bone(self, bone_name: str):
+        self._check_mode()
+        bone = self._edit_bones.get(bone_name)
+        if bone is not None:
+            self.hits += 1
+            return bone
+
+        self.misses += 1
+        bone = find_edit_bone(self.armature, bone_name)
+        if bone is not None:
+            self._edit_bones[bone_name] = bone
+        return bone
+
+    def pose_bone(self, bone_name: str):
+        self._check_mode()
+        bone = self._pose_bones.get(bone_name)
+        if bone is not None:
+            self.hits += 1
+            return bone
+
+        self.misses += 1
+        bone = find_pose_bone(self.armature, bone_name)
+        if bone is not None:
+            self._pose_bones[bone_name] = bone
+        return bone
+
+
+def new_bone(
+    obj, bone_name: Optional[str] = None, registry: Optional[BoneRegistry] = None
+) -> str:
     """
     Adds a new bone to the given armature object.
-    Returns the resulting bone's name.
+    Returns the resulting bone's name. The new bone is added to the registry if given.
     """
     bone_name = bone_name or str(uuid.uuid4())
 
     if obj == bpy.context.active_object and bpy.context.mode == "EDIT_ARMATURE":
         edit_bone = obj.data.edit_bones.new(bone_name)
+        profile_count("bones_created")
         name = edit_bone.name
         edit_bone.head = (0, 0, 0)
         edit_bone.tail = (0, 1, 0)
         edit_bone.roll = 0
+        if registry is not None:
+            registry.register(edit_bone)
         return name
     else:
         raise RuntimeError("Can't add new bone '%s' outside of edit mode" % bone_name)
 
 
-create_or_update_bone = new_bone
+def update_bone(edit_bone, **fields) -> bool:
+    """
+    Writes the given edit bone fields (head, tail, roll, parent, use_connect, ...)
+    in the given order, skipping the ones whose value would not change.
+    Returns True if anything was written.
+    """
+    changed = False
+    for field, value in fields.items():
+        current = getattr(edit_bone, field)
+        if field in ("head", "tail"):
+            unchanged = (current - Vector(value)).length <= BONE_EPSILON
+        elif isinstance(current, float):
+            unchanged = abs(current - value) <= BONE_EPSILON
+        else:
+            unchanged = current == value
+
+        if not unchanged:
+            setattr(edit_bone, field, value)
+            changed = True
+    return changed
+
+
+def create_or_update_bone(
+    obj, bone_name: str, registry: Optional[BoneRegistry] = None, **fields
+) -> str:
+    """
+    Reuses the bone with the given name or adds it if there is none, then updates
+    the given fields with `update_bone`, so re-running a generator converges to
+    the same bones. Returns the bone's name.
+    """
+    if registry is not None:
+        find = registry.edit_bone
+    else:
+        find = lambda name: find_edit_bone(obj, name)
+
+    edit_bone = find(bone_name)
+    if edit_bone is None:
+        edit_bone = find(new_bone(obj, bone_name, registry))
+
+    update_bone(edit_bone, **fields)
+    return edit_bone.name
 
 
 def find_axis_vectors(
@@ -125,34 +311,141 @@ def find_axis_vectors(
     return normal, tangent, bitangent
 
 
-def move_bones_to_layer(armature, bones: List[str], layer_num: int):
+def uses_bone_collections(armature) -> bool:
+    # Blender 4.0 replaced the 32 bone layers with bone collections
+    return hasattr(armature.data, "collections")
+
+
+def _bone_collections(armature):
+    # Nested collections are only listed in collections_all since Blender 4.1
+    return getattr(armature.data, "collections_all", armature.data.collections)
+
+
+def bone_rows(collection, bone_names: Sequence[str]) -> np.ndarray:
+    """
+    Row indices of the given bones in a bone collection, names are read once per bone
+    """
+    rows = {bone.name: i for i, bone in enumerate(collection)}
+    return np.fromiter(
+        (rows[name] for name in bone_names), dtype=np.int64, count=len(bone_names)
+    )
+
+
+def _layer_bones(armature):
+    # data.bones are not up to date in edit mode
+    if armature.mode == "EDIT":
+        return armature.data.edit_bones
+    return armature.data.bones
+
+
+class LayerOccupancy:
+    """
+    Number of bones on each bone layer (or bone collection on newer Blender),
+    read in one vectorized pass. Keep it for the operator run and update it as
+    bones are moved, then finding a free layer costs O(1).
+    """
+
+    LAYER_COUNT = 32
+
+    def __init__(self, counts: np.ndarray):
+        self.counts = counts
+
+    @classmethod
+    def capture(cls, armature) -> "LayerOccupancy":
+        if uses_bone_collections(armature):
+            collections = _bone_collections(armature)
+            counts = [len(collection.bones) for collection in collections]
+            return cls(np.array(counts, dtype=np.int64))
+
+        bones = _layer_bones(armature)
+        layers = np.zeros(len(bones) * cls.LAYER_COUNT, dtype=bool)
+        bones.foreach_get("layers", layers)
+        layers = layers.reshape(-1, cls.LAYER_COUNT)
+        return cls(layers.sum(axis=0, dtype=np.int64))
+
+    @property
+    def mask(self) -> int:
+        """
+        Bitmask of the occupied layers
+        """
+        return sum(1 << int(i) for i in np.flatnonzero(self.counts))
+
+    def is_free(self, layer: int) -> bool:
+        return layer >= len(self.counts) or not self.counts[layer]
+
+    def move(self, old_layers: np.ndarray, layer: int):
+        """
+        Updates the counts after moving bones, given the (N, 32) layers they had before
+        """
+        self.counts -= old_layers.sum(axis=0, dtype=np.int64)
+        self.counts[layer] += len(old_layers)
+
+
+def move_bones_to_layer(
+    armature,
+    bones: List[str],
+    layer_num: int,
+    occupancy: Optional[LayerOccupancy] = None,
+):
     """
     Moves given bones to a specified layer
     """
-    for bone_name in bones:
-        # TODO: Based on the context get edit mode or pose mode bones:
-        # if context.mode == 'EDIT_ARMATURE' ...
-        bone = find_edit_bone(armature, bone_name)
-        bone.layers = [i == layer_num for i in range(len(bone.layers))]
+    if uses_bone_collections(armature):
+        target = _bone_collections(armature)[layer_num]
+        for bone_name in bones:
+            bone = find_edit_bone(armature, bone_name)
+            for collection in list(bone.collections):
+                collection.unassign(bone)
+            target.assign(bone)
+        if occupancy is not None:
+            # Counting the members of the collections is cheap
+            occupancy.counts = LayerOccupancy.capture(armature).counts
+    else:
+        # Rewrite the layers of every bone with a single foreach_set
+        collection = _layer_bones(armature)
+        layers = np.zeros(len(collection) * LayerOccupancy.LAYER_COUNT, dtype=bool)
+        collection.foreach_get("layers", layers)
+        layers = layers.reshape(-1, LayerOccupancy.LAYER_COUNT)
 
-    bpy.context.view_layer.update()
+        rows = bone_rows(collection, bones)
+        if occupancy is not None:
+            occupancy.move(layers[rows], layer_num)
+        layers[rows] = False
+        layers[rows, layer_num] = True
+        collection.foreach_set("layers", layers.ravel())
+
+    request_view_layer_update()
 
 
-def assign_bone_layer_name(armature, layer_name: str) -> int:
+def assign_bone_layer_name(
+    armature, layer_name: str, occupancy: Optional[LayerOccupancy] = None
+) -> int:
     """
-    Finds the first available bone layer of the given armature and assigns
-    the given name to it. If a layer is already activated without bones assigned,
-    reuses that layer instead. Returns the index of the layer.
+    Finds the first bone layer of the given armature without bones assigned and
+    assigns the given name to it, turning the layer visible if needed. On newer
+    Blender it reuses or creates the bone collection with the given name.
+    Returns the index of the layer or collection.
     """
+    if occupancy is None:
+        occupancy = LayerOccupancy.capture(armature)
+
+    if uses_bone_collections(armature):
+        collections = _bone_collections(armature)
+        index = collections.find(layer_name)
+        if index < 0:
+            armature.data.collections.new(layer_name)
+            index = collections.find(layer_name)
+            occupancy.counts = LayerOccupancy.capture(armature).counts
+        return index
+
     for i in range(len(armature.data.layers)):
+        if not occupancy.is_free(i):
+            continue
         if not armature.data.layers[i]:
             armature.data.layers[i] = True
-            bpy.context.view_layer.update()
-            armature.data[f"layer_name_{i}"] = layer_name
-            return i
-        elif not any(bone.layers[i : i + 4] for bone in armature.data.bones):
-            armature.data[f"layer_name_{i}"] = layer_name
-            return i
+            request_view_layer_update()
+        armature.data[f"layer_name_{i}"] = layer_name
+        return i
     return None
 
 
@@ -178,3 +471,67 @@ def project_point_onto_plane(
 
     projection = point - distance * normal
     return projection
+
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """
+    Normalizes an array of vectors along its last axis.
+    Zero length vectors stay zero, the same way Vector.normalized() does.
+    """
+    lengths = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > 0)
+
+
+def find_plane_normals(planes: np.ndarray) -> np.ndarray:
+    """
+    Batched version of `find_plane_normal`.
+    Takes (M, 3, 3) plane point triplets and returns (M, 3) unit normals.
+    """
+    planes = np.asarray(planes, dtype=np.float64).reshape(-1, 3, 3)
+    return normalize_vectors(
+        np.cross(planes[:, 1] - planes[:, 0], planes[:, 2] - planes[:, 0])
+    )
+
+
+def project_points_onto_planes(
+    points: np.ndarray,
+    planes: np.ndarray,
+    plane_indices: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Batched version of `project_point_onto_plane`, every plane normal is computed once.
+    Projects (N, 3) points onto (M, 3, 3) plane triplets. With `plane_indices` of
+    shape (N,) each point is projected onto its own plane and the result is (N, 3),
+    otherwise every point is projected onto every plane and the result is (M, N, 3).
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    planes = np.asarray(planes, dtype=np.float64).reshape(-1, 3, 3)
+    normals = find_plane_normals(planes)
+    origins = planes[:, 0]
+
+    if plane_indices is not None:
+        normals = normals[plane_indices]
+        distances = np.einsum("ij,ij->i", points - origins[plane_indices], normals)
+        return points - distances[:, None] * normals
+
+    distances = np.einsum("mnj,mj->mn", points[None] - origins[:, None], normals)
+    return points[None] - distances[..., None] * normals[:, None]
+
+
+def find_axis_vectors_batch(
+    q: np.ndarray,
+    r: np.ndarray,
+    s: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Batched version of `find_axis_vectors` for (N, 3) arrays of points
+    """
+    q = np.asarray(q, dtype=np.float64).reshape(-1, 3)
+    r = np.asarray(r, dtype=np.float64).reshape(-1, 3)
+    s = np.asarray(s, dtype=np.float64).reshape(-1, 3)
+
+    normal = normalize_vectors(np.cross(r - q, s - q))
+    tangent = normalize_vectors(s - r)
+    bitangent = np.cross(tangent, normal)
+
+    return normal, tangent, bitangent
@@ -0,0 +1,476 @@
+"""
+Headless batch rigging: applies a list of generator invocations to many .blend files.
+
+    python -m cai_rigtools.batch npc_*.blend --jobs jobs.json --output-dir rigged/
+
+The jobs file is a JSON list of invocations, all of them are applied to every file:
+
+    [
+        {"generator": "target", "armature": "Armature", "bones": ["spine", "neck"], "prefix": "TGT"},
+        {"generator": "unity_leg_helper", "chains": [["thigh.L", "shin.L", "foot.L", "toe.L"]]}
+    ]
+
+Chain generators (lever, tail, tentacle, unity_leg_helper) take `chains`, the target
+generator takes `bones`, `rebuild` re-runs the mechanisms whose source bones changed.
+`analyze` estimates the evaluation cost of the rig so far and fails the file if it
+is above the optional `max_cost` or has dependency cycles, unless `allow_cycles` is
+set, the file is not saved then.
+The tentacle generator also takes an optional `control_count`, the target generator
+an optional `mode` (IN_PLACE or SEPARATE).
+Each file is processed by its own worker: a background Blender process, the `bpy`
+module in a worker process, or a fake worker which only copies the file.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+WORKERS = ["blender", "bpy", "fake"]
+
+# Keys each generator takes besides `generator` and `armature`
+GENERATOR_OPTIONS = {
+    "target": ["bones", "prefix", "mode"],
+    "lever": ["chains"],
+    "tail": ["chains"],
+    "tentacle": ["chains", "control_count"],
+    "unity_leg_helper": ["chains"],
+    "rebuild": [],
+    "analyze": ["max_cost", "allow_cycles"],
+}
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class BatchJob:
+    source: str
+    output: str
+    invocations: List[Dict[str, Any]]
+
+
+@dataclass
+class FileReport:
+    source: str
+    output: str
+    worker: str
+    status: str = "ok"
+    seconds: float = 0.0
+    error: Optional[str] = None
+    invocations: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@contextmanager
+def atomic_output(path: str):
+    """
+    Yields a temporary path next to `path` and moves it in place once the block
+    succeeds, so a failed or killed worker never leaves a half written file behind.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    suffix = os.path.splitext(path)[1]
+    fd, temporary = tempfile.mkstemp(prefix=".rigtools-", suffix=suffix, dir=directory)
+    os.close(fd)
+    # Blender writes a .blend1 backup when saving over an existing file
+    os.remove(temporary)
+    try:
+        yield temporary
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def check_invocation(invocation: Dict[str, Any]):
+    """
+    Raises a ValueError if the generator of the invocation is unknown or does not
+    take one of its keys.
+    """
+    generator = invocation.get("generator")
+    if generator not in GENERATOR_OPTIONS:
+        raise ValueError(
+            f"Unknown generator {generator!r}, expected one of {list(GENERATOR_OPTIONS)}"
+        )
+    unknown = set(invocation) - {"generator", "armature", *GENERATOR_OPTIONS[generator]}
+    if unknown:
+        raise ValueError(f"The {generator} generator does not take {sorted(unknown)}")
+
+
+def _find_armature_object(bpy, name: Optional[str]):
+    if name:
+        obj = bpy.data.objects.get(name)
+        if obj is None or obj.type != "ARMATURE":
+            raise RuntimeError(f"There is no armature named {name}")
+        return obj
+
+    armatures = [obj for obj in bpy.data.objects if obj.type == "ARMATURE"]
+    if len(armatures) != 1:
+        raise RuntimeError(
+            f"Found {len(armatures)} armatures, name the one to rig in the invocation"
+        )
+    return armatures[0]
+
+
+def _run_generator(armature, invocation: Dict[str, Any], transaction) -> List[str]:
+    from .armature import (
+        create_lever_mechanism,
+        create_tail_mechanism,
+        create_target_armature,
+        create_tentacle_mechanism,
+        create_unity_leg_helpers,
+        rebuild_changed_mechanisms,
+    )
+
+    check_invocation(invocation)
+    generator = invocation["generator"]
+    chains = invocation.get("chains", [])
+
+    if generator == "target":
+        return create_target_armature(
+            armature,
+            invocation["bones"],
+            invocation.get("prefix", "TGT"),
+            transaction,
+            mode=invocation.get("mode", "IN_PLACE"),
+        )
+    if generator == "unity_leg_helper":
+        return create_unity_leg_helpers(armature, chains, transaction)
+    if generator == "rebuild":
+        rebuilt, _ = rebuild_changed_mechanisms(armature, transaction)
+        return [bone for manifest in rebuilt for bone in manifest.bones]
+
+    create_mechanism = {
+        "lever": create_lever_mechanism,
+        "tail": create_tail_mechanism,
+        "tentacle": create_tentacle_mechanism,
+    }[generator]
+    options = {}
+    if generator == "tentacle" and "control_count" in invocation:
+        options["control_count"] = invocation["control_count"]
+
+    created_bones = []
+    for chain in chains:
+        created_bones += create_mechanism(armature, chain, transaction, **options)
+    return created_bones
+
+
+def process_file(
+    source: str, output: str, invocations: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Opens the file with `bpy`, applies the invocations and saves the result to
+    `output`. Runs inside Blender or wherever the `bpy` module is available.
+    Returns the timing and the number of created bones of each invocation.
+    """
+    import bpy
+    from .armature import (
+        RigBuildTransaction,
+        TemplateCache,
+        analyze_rig_cost,
+        deferred_view_layer_update,
+    )
+
+    bpy.ops.wm.open_mainfile(filepath=source)
+
+    results = []
+    # Chains of the same shape are planned once for all the invocations
+    templates = TemplateCache()
+    with deferred_view_layer_update():
+        for invocation in invocations:
+            start = time.perf_counter()
+            armature = _find_armature_object(bpy, invocation.get("armature"))
+            bpy.context.view_layer.objects.active = armature
+
+            if invocation["generator"] == "analyze":
+                report = analyze_rig_cost(armature)
+                results.append(
+                    {
+                        "generator": "analyze",
+                        "armature": armature.name,
+                        "bones": 0,
+                        "seconds": time.perf_counter() - start,
+                        "analysis": report.to_dict(),
+                    }
+                )
+                max_cost = invocation.get("max_cost")
+                if max_cost is not None and report.cost > max_cost:
+                    raise RuntimeError(
+                        f"{report.summary()} is above the maximum cost {max_cost}"
+                    )
+                if report.cycles and not invocation.get("allow_cycles", False):
+                    raise RuntimeError(
+                        f"{armature.name} has dependency cycles: {report.cycles}"
+                    )
+                continue
+
+            with RigBuildTransaction(armature, templates=templates) as transaction:
+                created_bones = _run_generator(armature, invocation, transaction)
+
+            results.append(
+                {
+                    "generator": invocation["generator"],
+                    "armature": armature.name,
+                    "bones": len(created_bones),
+                    "seconds": time.perf_counter() - start,
+                }
+            )
+
+    with atomic_output(output) as temporary:
+        bpy.ops.wm.save_as_mainfile(filepath=temporary, copy=True)
+
+    return results
+
+
+def _worker_main():
+    """
+    Entry point inside a background Blender process, arguments follow `--`.
+    """
+    arguments = json.loads(sys.argv[sys.argv.index("--") + 1])
+    result = {"invocations": [], "error": None}
+    try:
+        result["invocations"] = process_file(
+            arguments["source"], arguments["output"], arguments["invocations"]
+        )
+    except Exception:
+        result["error"] = traceback.format_exc()
+
+    with open(arguments["result"], "w") as f:
+        json.dump(result, f)
+
+
+def _run_blender(job: BatchJob, blender: str, timeout: Optional[float]) -> FileReport:
+    report = FileReport(job.source, job.output, "blender")
+    fd, result_path = tempfile.mkstemp(prefix="rigtools-", suffix=".json")
+    os.close(fd)
+
+    expression = (
+        f"import sys; sys.path.insert(0, {_PACKAGE_ROOT!r}); "
+        "from cai_rigtools.batch import _worker_main; _worker_main()"
+    )
+    arguments = {
+        "source": job.source,
+        "output": job.output,
+        "invocations": job.invocations,
+        "result": result_path,
+    }
+    command = [
+        blender,
+        "-b",
+        "--factory-startup",
+        "--python-exit-code",
+        "1",
+        "--python-expr",
+        expression,
+        "--",
+        json.dumps(arguments),
+    ]
+
+    try:
+        process = subprocess.run(
+            command, capture_output=True, text=True, timeout=timeout
+        )
+        with open(result_path) as f:
+            result = json.load(f) if os.path.getsize(result_path) else {}
+
+        report.invocations = result.get("invocations", [])
+        report.error = result.get("error")
+        if report.error is None and (process.returncode != 0 or not result):
+            report.error = process.stderr[-2000:] or f"Exit code {process.returncode}"
+    except subprocess.TimeoutExpired:
+        report.error = f"Timed out after {timeout} seconds"
+    except OSError as e:
+        report.error = f"Could not start {blender}: {e}"
+    finally:
+        os.remove(result_path)
+
+    return report
+
+
+def _run_bpy(job: BatchJob) -> FileReport:
+    report = FileReport(job.source, job.output, "bpy")
+    try:
+        report.invocations = process_file(job.source, job.output, job.invocations)
+    except Exception:
+        report.error = traceback.format_exc()
+    return report
+
+
+def _run_fake(job: BatchJob) -> FileReport:
+    """
+    Stands in for Blender: checks the invocations and copies the file unchanged.
+    """
+    report = FileReport(job.source, job.output, "fake")
+    try:
+        for invocation in job.invocations:
+            check_invocation(invocation)
+            report.invocations.append(
+                {"generator": invocation["generator"], "bones": 0, "seconds": 0.0}
+            )
+
+        with atomic_output(job.output) as temporary:
+            shutil.copyfile(job.source, temporary)
+    except Exception:
+        report.error = traceback.format_exc()
+    return report
+
+
+def _run_job(
+    job: BatchJob, worker: str, blender: str, timeout: Optional[float]
+) -> FileReport:
+    start = time.perf_counter()
+    if worker == "blender":
+        report = _run_blender(job, blender, timeout)
+    elif worker == "bpy":
+        report = _run_bpy(job)
+    else:
+        report = _run_fake(job)
+
+    report.seconds = time.perf_counter() - start
+    if report.error is not None:
+        report.status = "error"
+    return report
+
+
+def run_batch(
+    jobs: List[BatchJob],
+    worker: str = "blender",
+    workers: Optional[int] = None,
+    blender: str = "blender",
+    timeout: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Processes the jobs in parallel and returns the report of the whole batch.
+    Background Blender workers are separate processes already, a thread waits on
+    each of them. The `bpy` module can only load one file per process, so those
+    jobs go to a process pool which starts a fresh process for every file. Before
+    Python 3.11 the pool can not do that and reuses its processes.
+    """
+    workers = workers or os.cpu_count() or 1
+    if worker == "blender":
+        executor = ThreadPoolExecutor(max_workers=workers)
+    elif worker == "bpy" and sys.version_info >= (3, 11):
+        # Forked processes can not be limited to a number of tasks
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=1,
+        )
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    start = time.perf_counter()
+    with executor:
+        reports = list(
+            executor.map(
+                _run_job,
+                jobs,
+                [worker] * len(jobs),
+                [blender] * len(jobs),
+                [timeout] * len(jobs),
+            )
+        )
+    seconds = time.perf_counter() - start
+
+    failed = sum(report.status != "ok" for report in reports)
+    return {
+        "worker": worker,
+        "workers": workers,
+        "files": len(reports),
+        "failed": failed,
+        "seconds": seconds,
+        "files_per_second": len(reports) / seconds if seconds else 0.0,
+        "reports": [asdict(report) for report in reports],
+    }
+
+
+def _parse_arguments(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m cai_rigtools.batch",
+        description="Apply rig generators to many .blend files in parallel.",
+    )
+    parser.add_argument("files", nargs="+", help=".blend files to rig")
+    parser.add_argument(
+        "--jobs", required=True, help="JSON file with the list of generator invocations"
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="Directory of the rigged files, the files are replaced in place if not set",
+    )
+    parser.add_argument("--worker", choices=WORKERS, default="blender")
+    parser.add_argument(
+        "--blender",
+        default=os.environ.get("BLENDER_PATH", "blender"),
+        help="Blender executable of the background workers",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Number of parallel workers, CPU count by default"
+    )
+    parser.add_argument("--timeout", type=float, help="Time limit per file in seconds")
+    parser.add_argument("--report", help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arguments = _parse_arguments(argv)
+
+    with open(arguments.jobs) as f:
+        invocations = json.load(f)
+    for invocation in invocations:
+        try:
+            check_invocation(invocation)
+        except ValueError as e:
+            print(f"Invalid invocation {invocation}: {e}", file=sys.stderr)
+            return 2
+
+    jobs = []
+    for source in arguments.files:
+        source = os.path.abspath(source)
+        output = source
+        if arguments.output_dir:
+            output = os.path.join(
+                os.path.abspath(arguments.output_dir), os.path.basename(source)
+            )
+        jobs.append(BatchJob(source, output, invocations))
+
+    outputs = [job.output for job in jobs]
+    if len(set(outputs)) != len(outputs):
+        print("Several files would be written to the same output", file=sys.stderr)
+        return 2
+
+    result = run_batch(
+        jobs,
+        arguments.worker,
+        arguments.workers,
+        arguments.blender,
+        arguments.timeout,
+    )
+
+    if arguments.report:
+        with atomic_output(arguments.report) as temporary:
+            with open(temporary, "w") as f:
+                json.dump(result, f, indent=2)
+
+    for report in result["reports"]:
+        print(f"{report['status']:5} {report['seconds']:8.2f}s {report['source']}")
+        if report["error"]:
+            print(report["error"], file=sys.stderr)
+    print(
+        f"{result['files'] - result['failed']}/{result['files']} files rigged in {result['seconds']:.2f}s with {result['workers']} {result['worker']} workers"
+    )
+
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
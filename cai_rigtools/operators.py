@@ -1,8 +1,16 @@
+from abc import abstractmethod
+from contextlib import nullcontext
+import time
+from typing import List, Optional
+
 import bpy
+import numpy as np
 
 from .armature import (
+    ArmatureSnapshot,
+    SymmetryIndex,
     get_armature,
-    get_selected_bones,
+    get_bone_selection,
     find_pose_bone,
     find_edit_bone,
     select_bones,
@@ -12,11 +20,56 @@ from .armature import (
     create_target_armature,
     create_tail_mechanism,
     create_tentacle_mechanism,
-    create_unity_leg_helper,
+    create_unity_leg_helpers,
+    DEFAULT_CONTROL_COUNT,
+    rebuild_changed_mechanisms,
+    load_manifests,
+    BoneHierarchyIndex,
+    partition_bone_chain_rows,
+    RigBuildTransaction,
+    RigJob,
+    TemplateCache,
+    LayerOccupancy,
+    deferred_view_layer_update,
+    strip_constraints,
+    analyze_rig_cost,
+    RigProfile,
+    log_profile,
+    profiling,
+    resume_profiling,
+    CONSTRAINT_TYPES,
 )
+from .preferences import get_preferences
 
 
 class BaseOperator(bpy.types.Operator):
+    # Generator of the mechanisms the operator builds, as recorded in their manifests
+    generator = None
+
+    def execute(self, context):
+        log_path = self._profiling_log(context)
+        if log_path is None:
+            # Helpers only request view layer updates, it is updated once per operator run
+            with deferred_view_layer_update():
+                return self._execute(context)
+
+        with profiling(self.bl_idname, log_path or None) as profile:
+            with deferred_view_layer_update():
+                result = self._execute(context)
+
+        self.report({"INFO"}, profile.summary())
+        return result
+
+    @staticmethod
+    def _profiling_log(context) -> Optional[str]:
+        """
+        Path of the profile log, empty without one, None if profiling is off.
+        """
+        preferences = get_preferences(context)
+        if preferences is None or not preferences.profiling:
+            return None
+        return bpy.path.abspath(preferences.profiling_log)
+
     def _find_armature(self):
         self.armature = get_armature()
 
@@ -29,8 +82,8 @@ class BaseOperator(bpy.types.Operator):
         if not self._find_armature():
             return False
 
-        self.selected_bones = get_selected_bones(self.armature)
-        # self.selected_bone_names = [b.name for b in self.selected_bones]
+        self.selection = get_bone_selection(self.armature)
+        self.selected_bones = self.selection.names
 
         if not self.selected_bones:
             self.report({"ERROR_INVALID_INPUT"}, "No bones are selected.")
@@ -38,36 +91,219 @@ class BaseOperator(bpy.types.Operator):
 
         return True
 
+    def _build_hierarchy(self):
+        # Built once per operator run, chain lookups reuse it
+        self.hierarchy = BoneHierarchyIndex.from_armature(self.armature)
+        return self.hierarchy
+
+    def _rigged_chains(self, hierarchy: BoneHierarchyIndex):
+        """
+        Chains of the selected mechanisms the operator's generator built before, read
+        from their manifests, and the selected bones which are not part of one.
+        A rigged chain hangs from its controls, partitioning it again would split it.
+        """
+        owners = {}
+        if self.generator is not None:
+            for manifest in load_manifests(self.armature).values():
+                if manifest.generator != self.generator or any(
+                    name not in hierarchy.rows for name in manifest.sources
+                ):
+                    continue
+                for bone_name in manifest.sources + manifest.bones:
+                    owners.setdefault(bone_name, manifest)
+
+        chains, keys, rest = [], set(), []
+        for i, bone_name in enumerate(self.selected_bones):
+            manifest = owners.get(bone_name)
+            if manifest is None:
+                rest.append(i)
+            elif manifest.key not in keys:
+                keys.add(manifest.key)
+                chains.append(list(manifest.sources))
+        return chains, rest
+
+    def _find_bone_chains(self):
+        """
+        Splits the selection into parent chains, so chain generators run once per chain.
+        Chains are ordered from the root down and have at least two bones.
+        """
+        if not self._find_selected_bones():
+            return False
+
+        hierarchy = self._build_hierarchy()
+        missing = [name for name in self.selected_bones if name not in hierarchy]
+        if missing:
+            # New edit bones only reach the armature when leaving edit mode
+            self.report(
+                {"ERROR_INVALID_INPUT"},
+                f"Bones not found, leave edit mode once and retry: {', '.join(missing)}",
+            )
+            return False
+
+        self.bone_chains, rest = self._rigged_chains(hierarchy)
+        if self.selection.source == "bones":
+            # Selection rows are already hierarchy rows, no need to go through the names
+            rows = self.selection.indices[rest]
+        else:
+            rows = [hierarchy.rows[self.selected_bones[i]] for i in rest]
+        self.bone_chains += [
+            [hierarchy.names[row] for row in chain]
+            for chain in self._join_chain_ends(
+                hierarchy, partition_bone_chain_rows(hierarchy, rows)
+            )
+        ]
+
+        single = [chain[0] for chain in self.bone_chains if len(chain) < 2]
+        if single:
+            self.report(
+                {"ERROR_INVALID_INPUT"},
+                f"Select at least two bones of each chain, or its first and last bone: {', '.join(single)}",
+            )
+            return False
+
+        return True
+
+    @staticmethod
+    def _join_chain_ends(
+        hierarchy: BoneHierarchyIndex, chains: List[List[int]]
+    ) -> List[List[int]]:
+        """
+        Selecting only the first and the last bone of a chain is still supported: a
+        single bone chain is joined with the closest single bone chain above it, as
+        long as no other selected bone lies between them.
+        """
+        selected = {row for chain in chains for row in chain}
+        ends = {chain[0] for chain in chains if len(chain) == 1}
+        joined, dropped = {}, set()
+        # Deepest first, so every end is joined with the closest one above it
+        for last in sorted(ends, key=hierarchy.depths.__getitem__, reverse=True):
+            if last not in ends:
+                continue
+            first = hierarchy.parents[last]
+            while first >= 0 and first not in selected:
+                first = hierarchy.parents[first]
+            if first in ends:
+                ends -= {first, last}
+                joined[first] = [first] + hierarchy.path_up(last, first)
+                dropped.add(last)
+
+        return [
+            joined.get(chain[0], chain) for chain in chains if chain[0] not in dropped
+        ]
+
 
 class ClearAllConstraints(BaseOperator):
     """
-    Clear all constraints from selected bones
+    Clear all constraints from selected bones or the whole armature, optionally filtered
     """
 
     bl_idname = "rigtools.clear_constraints"
     bl_label = "Clear all constraints"
     bl_options = {"REGISTER", "UNDO"}
 
-    def execute(self, context):
-        if not self._find_selected_bones():
-            return {"CANCELLED"}
+    whole_armature: bpy.props.BoolProperty(
+        name="Whole armature",
+        description="Clear the constraints of every bone, not just the selected ones",
+        default=False,
+    )
+
+    constraint_types: bpy.props.EnumProperty(
+        name="Types",
+        description="Only clear constraints of these types, all types if none is set",
+        items=[(t, t.replace("_", " ").title(), "") for t in CONSTRAINT_TYPES],
+        options={"ENUM_FLAG"},
+    )
 
-        fail = 0
+    subtarget: bpy.props.StringProperty(
+        name="Subtarget",
+        description="Only clear constraints targeting this bone",
+    )
 
-        for bone_name in self.selected_bones:
-            pose_bone = find_pose_bone(self.armature, bone_name)
-            if pose_bone:
-                for constraint in pose_bone.constraints:
-                    pose_bone.constraints.remove(constraint)
-            else:
-                fail += 1
+    name_prefix: bpy.props.StringProperty(
+        name="Name prefix",
+        description="Only clear constraints whose name starts with this prefix",
+    )
+
+    def _execute(self, context):
+        if self.whole_armature:
+            if not self._find_armature():
+                return {"CANCELLED"}
+            bone_names = None
+        else:
+            if not self._find_selected_bones():
+                return {"CANCELLED"}
+            bone_names = self.selected_bones
+
+        pose_bones = self.armature.pose.bones
+        fail = 0 if bone_names is None else sum(n not in pose_bones for n in bone_names)
+        bone_count = len(pose_bones) if bone_names is None else len(bone_names) - fail
+
+        removed = strip_constraints(
+            self.armature,
+            bone_names,
+            types=self.constraint_types,
+            subtarget=self.subtarget,
+            name_prefix=self.name_prefix,
+        )
+        removed_per_type = ", ".join(f"{t}: {n}" for t, n in sorted(removed.items()))
+        message = f"{sum(removed.values())} constraints had been cleared from {bone_count} bones. {removed_per_type}"
 
         if not fail:
-            self.report({"INFO"}, f"{len(self.selected_bones)} had been cleared.")
+            self.report({"INFO"}, message)
         else:
             self.report(
                 {"WARNING"},
-                f"{len(self.selected_bones - fail)} had been cleared. {fail} Bones could not be cleared",
+                f"{message} {fail} Bones could not be cleared",
+            )
+
+        return {"FINISHED"}
+
+
+class AnalyzeRigCost(BaseOperator):
+    """
+    Estimate the pose evaluation cost of the armature from its constraint graph
+    """
+
+    bl_idname = "rigtools.analyze_rig_cost"
+    bl_label = "Analyze rig cost"
+    bl_options = {"REGISTER"}
+
+    max_cost: bpy.props.FloatProperty(
+        name="Maximum cost",
+        description="Warn when the estimated cost is above this, 0 for no limit",
+        default=0.0,
+        min=0.0,
+    )
+
+    def _execute(self, context):
+        if not self._find_armature():
+            return {"CANCELLED"}
+
+        mode = self.armature.mode
+        if mode == "EDIT":
+            # Pose bones only get the edit bones when leaving edit mode
+            bpy.ops.object.mode_set(mode="POSE")
+        report = analyze_rig_cost(self.armature)
+        if mode == "EDIT":
+            bpy.ops.object.mode_set(mode="EDIT")
+
+        self.report({"INFO"}, report.summary())
+        if report.hotspots:
+            self.report(
+                {"INFO"},
+                "Most read bones: "
+                + ", ".join(f"{name} ({count})" for name, count in report.hotspots),
+            )
+        if report.cycles:
+            self.report(
+                {"WARNING"},
+                f"{len(report.cycles)} dependency cycles: "
+                + "; ".join(", ".join(cycle) for cycle in report.cycles),
+            )
+        if self.max_cost and report.cost > self.max_cost:
+            self.report(
+                {"WARNING"},
+                f"Estimated cost {report.cost:.1f} is above the maximum {self.max_cost:.1f}",
             )
 
         return {"FINISHED"}
@@ -87,7 +323,7 @@ class BulkToggleDeformation(BaseOperator):
         default=True,
     )
 
-    def execute(self, context):
+    def _execute(self, context):
         if not self._find_selected_bones():
             return {"CANCELLED"}
 
@@ -108,38 +344,203 @@ class MirrorBones(BaseOperator):
     bl_label = "Mirror selected bones"
     bl_options = {"REGISTER", "UNDO"}
 
-    def execute(self, context):
+    def _execute(self, context):
         if not self._find_selected_bones():
             return {"CANCELLED"}
 
-        fail = 0
+        snapshot = ArmatureSnapshot.capture(self.armature)
+        bone_names = [name for name in self.selected_bones if name in snapshot]
+        rows = [snapshot.row(name) for name in bone_names]
+        fail = len(self.selected_bones) - len(bone_names)
 
-        _mirror_map = []
+        # Avoid modifying the same bone twice if mirroring is turned on
+        # selection duplicates if any mirroring option was turned on
+        symmetry = SymmetryIndex(bone_names, rows)
+        rows = np.array(symmetry.first_of_pairs(rows), dtype=np.int64)
 
-        for bone_name in self.selected_bones:
-            bone = find_edit_bone(self.armature, bone_name)
-            if bone:
-                # Avoid modifying the same bone twice if mirroring is turned on
-                # selection duplicates if any mirroring option was turned on
-                bone_name_stripped = bone_name.replace(".L", "").replace(".R", "")
-                if bone_name_stripped not in _mirror_map:
-                    bone.tail = bone.head + (bone.tail - bone.head) * -1
-                    _mirror_map.append(bone_name_stripped)
-            else:
-                fail += 1
+        heads, tails = snapshot.heads, snapshot.tails
+        snapshot.set_tails(rows, heads[rows] + (tails[rows] - heads[rows]) * -1)
+
+        if self.armature.data.use_mirror_x:
+            # Bulk writes skip the edit bone update which would mirror the other side
+            symmetry = SymmetryIndex(snapshot.names)
+            mirror_rows = np.array(
+                [symmetry.mirror_of(row) for row in rows], dtype=np.int64
+            )
+            rows, mirror_rows = rows[mirror_rows >= 0], mirror_rows[mirror_rows >= 0]
+            flip = np.array([-1.0, 1.0, 1.0], dtype=np.float32)
+            snapshot.set_heads(mirror_rows, heads[rows] * flip)
+            snapshot.set_tails(mirror_rows, tails[rows] * flip)
+            snapshot.set_rolls(mirror_rows, -snapshot.rolls[rows])
+
+        snapshot.write_back(self.armature)
 
         if not fail:
             self.report({"INFO"}, f"{len(self.selected_bones)} had been mirrored.")
         else:
             self.report(
                 {"WARNING"},
-                f"{len(self.selected_bones - fail)} had been mirrored. {fail} Bones failed.",
+                f"{len(self.selected_bones) - fail} had been mirrored. {fail} Bones failed.",
+            )
+
+        return {"FINISHED"}
+
+
+class GeneratorOperator(BaseOperator):
+    """
+    Runs a generator as a `RigJob`: right away from `execute`, or a few steps per
+    timer event when invoked on a large selection, with a progress bar. Esc cancels
+    the modal run and rolls back everything it did.
+    """
+
+    # Selections of at least this many bones run modal when invoked from the UI
+    MODAL_BONE_COUNT = 2000
+    # Generators planning everything in a single step would block the UI all the
+    # same, they always run right away
+    runs_modal = True
+    # Time spent stepping the job per timer event, the UI redraws in between
+    MODAL_STEP_SECONDS = 0.05
+
+    failure_message = "Failed to create rig"
+
+    def __init_subclass__(cls, **kwargs):
+        # Blender's operator metaclass can not be combined with ABCMeta
+        super().__init_subclass__(**kwargs)
+        abstract = sorted(
+            {
+                name
+                for base in cls.__mro__
+                for name, value in vars(base).items()
+                if getattr(value, "__isabstractmethod__", False)
+                and getattr(getattr(cls, name), "__isabstractmethod__", False)
+            }
+        )
+        if abstract and "bl_idname" in vars(cls):
+            raise TypeError(f"{cls.__name__} does not implement {', '.join(abstract)}")
+
+    @abstractmethod
+    def _create_job(self, journaled: bool = False) -> Optional[RigJob]:
+        """
+        Finds what to rig and returns the job doing it, None if there is nothing to do.
+        Only modal runs, which can be cancelled, need a `journaled` job.
+        """
+
+    def _finish_job(self, job: RigJob):
+        select_bones(self.armature, job.created_bones)
+
+    def _report_job(self, job: RigJob):
+        self.report(
+            {"INFO"},
+            f"{len(job.created_bones)} bones had been created or updated for {len(self.bone_chains)} chains, {job.transaction.mode_switches_saved} mode switches saved",
+        )
+
+    def _execute(self, context):
+        try:
+            job = self._create_job()
+            if job is None:
+                return {"CANCELLED"}
+
+            job.run()
+            self._finish_job(job)
+        except Exception as e:
+            self.report({"ERROR"}, f"{self.failure_message}: {e}")
+            return {"CANCELLED"}
+
+        self._report_job(job)
+        return {"FINISHED"}
+
+    def invoke(self, context, event):
+        armature = get_armature()
+        if (
+            not self.runs_modal
+            or armature is None
+            or len(get_bone_selection(armature)) < self.MODAL_BONE_COUNT
+        ):
+            return self.execute(context)
+
+        log_path = self._profiling_log(context)
+        self._profile = RigProfile(self.bl_idname) if log_path is not None else None
+        self._profile_log = log_path or None
+
+        try:
+            with self._profile_event():
+                self._job = self._create_job(journaled=True)
+                if self._job is not None:
+                    self._job.start()
+        except Exception as e:
+            self._end_profile()
+            self.report({"ERROR"}, f"{self.failure_message}: {e}")
+            return {"CANCELLED"}
+
+        if self._job is None:
+            self._end_profile()
+            return {"CANCELLED"}
+
+        window_manager = context.window_manager
+        self._timer = window_manager.event_timer_add(0.01, window=context.window)
+        window_manager.modal_handler_add(self)
+        window_manager.progress_begin(0, 100)
+        return {"RUNNING_MODAL"}
+
+    def _profile_event(self):
+        # Every event of a modal run adds to the same profile
+        if self._profile is None:
+            return nullcontext()
+        return resume_profiling(self._profile)
+
+    def _end_profile(self):
+        if self._profile is not None:
+            log_profile(self._profile, self._profile_log)
+            self.report({"INFO"}, self._profile.summary())
+
+    def _end_modal(self, context):
+        window_manager = context.window_manager
+        window_manager.event_timer_remove(self._timer)
+        window_manager.progress_end()
+        context.workspace.status_text_set(None)
+        self._end_profile()
+
+    def modal(self, context, event):
+        if event.type == "ESC":
+            with self._profile_event():
+                self._job.cancel()
+            self._end_modal(context)
+            self.report({"WARNING"}, f"{self.bl_label} cancelled, changes rolled back.")
+            return {"CANCELLED"}
+
+        if event.type in {"MIDDLEMOUSE", "WHEELUPMOUSE", "WHEELDOWNMOUSE"}:
+            # Navigating the view is fine, editing the armature meanwhile is not
+            return {"PASS_THROUGH"}
+        if event.type != "TIMER":
+            return {"RUNNING_MODAL"}
+
+        deadline = time.perf_counter() + self.MODAL_STEP_SECONDS
+        try:
+            with self._profile_event(), deferred_view_layer_update():
+                running = self._job.step()
+                while running and time.perf_counter() < deadline:
+                    running = self._job.step()
+                if not running:
+                    self._finish_job(self._job)
+        except Exception as e:
+            # A failed step already rolled the job back
+            self._end_modal(context)
+            self.report({"ERROR"}, f"{self.failure_message}: {e}")
+            return {"CANCELLED"}
+
+        if running:
+            context.window_manager.progress_update(int(self._job.progress * 100))
+            context.workspace.status_text_set(
+                f"{self.bl_label}: {self._job.progress:.0%}, Esc to cancel"
             )
+            return {"RUNNING_MODAL"}
 
+        self._end_modal(context)
+        self._report_job(self._job)
         return {"FINISHED"}
 
 
-class CreateTargetForArmature(BaseOperator):
+class CreateTargetForArmature(GeneratorOperator):
     """
     Create a target armature for selected bones.
     """
@@ -148,32 +549,93 @@ class CreateTargetForArmature(BaseOperator):
     bl_label = "Create target rig"
     bl_options = {"REGISTER", "UNDO"}
 
-    def execute(self, context):
+    mode: bpy.props.EnumProperty(
+        name="Mode",
+        description="Where the target bones are created",
+        items=[
+            ("IN_PLACE", "In place", "Add the target bones to this armature"),
+            (
+                "SEPARATE",
+                "Separate",
+                "Copy the target bones into an armature of their own",
+            ),
+        ],
+        default="IN_PLACE",
+    )
+
+    failure_message = "Failed to create target rig"
+    runs_modal = False
+
+    # TODO: Prefix as property
+    prefix = "TGT"
+
+    def _create_job(self, journaled: bool = False) -> Optional[RigJob]:
         if not self._find_selected_bones():
-            return {"CANCELLED"}
+            return None
+
+        armature, selected_bones, prefix, mode = (
+            self.armature,
+            self.selected_bones,
+            self.prefix,
+            self.mode,
+        )
+        return RigJob(
+            armature,
+            [
+                lambda transaction: create_target_armature(
+                    armature, selected_bones, prefix, transaction, mode=mode
+                )
+            ],
+            journaled=journaled,
+        )
 
-        # TODO: Prefix as property
-        prefix = "TGT"
+    def _finish_job(self, job: RigJob):
+        if self.mode == "SEPARATE":
+            # The target bones have an armature of their own, there is no layer to pick
+            return
 
-        try:
-            created_bones = create_target_armature(
-                self.armature, self.selected_bones, prefix
-            )
-            target_layer_id = assign_bone_layer_name(self.armature, prefix)
-            move_bones_to_layer(self.armature, created_bones, target_layer_id)
-            select_bones(self.armature, created_bones)
-        except Exception as e:
-            self.report({"ERROR"}, f"Failed to create target rig: {e}")
-            return {"CANCELLED"}
+        occupancy = LayerOccupancy.capture(self.armature)
+        target_layer_id = assign_bone_layer_name(self.armature, self.prefix, occupancy)
+        move_bones_to_layer(
+            self.armature, job.created_bones, target_layer_id, occupancy
+        )
+        select_bones(self.armature, job.created_bones)
 
+    def _report_job(self, job: RigJob):
         self.report(
-            {"INFO"}, f"{len(created_bones)} bones had been created or updated."
+            {"INFO"}, f"{len(job.created_bones)} bones had been created or updated."
         )
 
-        return {"FINISHED"}
+
+class ChainGeneratorOperator(GeneratorOperator):
+    """
+    Runs the generator once per selected bone chain.
+    """
+
+    @abstractmethod
+    def _create_mechanism(self, bone_chain: List[str], transaction) -> List[str]:
+        pass
+
+    def _create_job(self, journaled: bool = False) -> Optional[RigJob]:
+        if not self._find_bone_chains():
+            return None
+
+        # Every chain is a step of its own
+        return RigJob(
+            self.armature,
+            [
+                lambda transaction, bone_chain=bone_chain: self._create_mechanism(
+                    bone_chain, transaction
+                )
+                for bone_chain in self.bone_chains
+            ],
+            self.hierarchy,
+            templates=TemplateCache(),
+            journaled=journaled,
+        )
 
 
-class CreateBoneChainLeverMechanism(BaseOperator):
+class CreateBoneChainLeverMechanism(ChainGeneratorOperator):
     """
     Create a lever mechanism for manipulation bone chains (spine)
     """
@@ -182,25 +644,17 @@ class CreateBoneChainLeverMechanism(BaseOperator):
     bl_label = "Create bone lever rig"
     bl_options = {"REGISTER", "UNDO"}
 
-    def execute(self, context):
-        if not self._find_selected_bones():
-            return {"CANCELLED"}
+    generator = "lever"
 
-        try:
-            created_bones = create_lever_mechanism(self.armature, self.selected_bones)
-            select_bones(self.armature, created_bones)
-        except Exception as e:
-            self.report({"ERROR"}, f"Failed to create bone lever rig: {e}")
-            return {"CANCELLED"}
+    failure_message = "Failed to create bone lever rig"
 
-        self.report(
-            {"INFO"}, f"{len(created_bones)} bones had been created or updated."
+    def _create_mechanism(self, bone_chain: List[str], transaction) -> List[str]:
+        return create_lever_mechanism(
+            self.armature, bone_chain, transaction, is_chain=True
         )
 
-        return {"FINISHED"}
-
 
-class CreateTailChainMechanism(BaseOperator):
+class CreateTailChainMechanism(ChainGeneratorOperator):
     """
     Create a lever mechanism for manipulating simple tails
     """
@@ -209,50 +663,48 @@ class CreateTailChainMechanism(BaseOperator):
     bl_label = "Create tail rig"
     bl_options = {"REGISTER", "UNDO"}
 
-    def execute(self, context):
-        if not self._find_selected_bones():
-            return {"CANCELLED"}
+    generator = "tail"
 
-        try:
-            created_bones = create_tail_mechanism(self.armature, self.selected_bones)
-            select_bones(self.armature, created_bones)
-        except Exception as e:
-            self.report({"ERROR"}, f"Failed to create tail rig: {e}")
-            return {"CANCELLED"}
-
-        self.report({"INFO"}, f"{len(created_bones)} bones had been created or updated")
+    failure_message = "Failed to create tail rig"
 
-        return {"FINISHED"}
+    def _create_mechanism(self, bone_chain: List[str], transaction) -> List[str]:
+        return create_tail_mechanism(
+            self.armature, bone_chain, transaction, is_chain=True
+        )
 
 
-class CreateTentacleChainMechanism(BaseOperator):
+class CreateTentacleChainMechanism(ChainGeneratorOperator):
     """
-    Create a lever mechanism for manipulating simple tails
+    Create a spline IK mechanism with a few controls for manipulating long tentacles
     """
 
     bl_idname = "rigtools.create_tentacle"
     bl_label = "Create tentacle rig"
     bl_options = {"REGISTER", "UNDO"}
 
-    def execute(self, context):
-        if not self._find_selected_bones():
-            return {"CANCELLED"}
+    generator = "tentacle"
 
-        try:
-            created_bones = create_tentacle_mechanism(
-                self.armature, self.selected_bones
-            )
-            select_bones(self.armature, created_bones)
-        except Exception as e:
-            self.report({"ERROR"}, f"Failed to create tentacle rig: {e}")
-            return {"CANCELLED"}
+    control_count: bpy.props.IntProperty(
+        name="Controls",
+        description="Number of control bones along each chain",
+        default=DEFAULT_CONTROL_COUNT,
+        min=2,
+        soft_max=16,
+    )
 
-        self.report({"INFO"}, f"{len(created_bones)} bones had been created or updated")
+    failure_message = "Failed to create tentacle rig"
 
-        return {"FINISHED"}
+    def _create_mechanism(self, bone_chain: List[str], transaction) -> List[str]:
+        return create_tentacle_mechanism(
+            self.armature,
+            bone_chain,
+            transaction,
+            is_chain=True,
+            control_count=self.control_count,
+        )
 
 
-class CreateUnityLegHelper(BaseOperator):
+class CreateUnityLegHelper(GeneratorOperator):
     """
     Create a helper for Unity's humanoid rig
     """
@@ -261,17 +713,59 @@ class CreateUnityLegHelper(BaseOperator):
     bl_label = "Create Unity leg helper"
     bl_options = {"REGISTER", "UNDO"}
 
-    def execute(self, context):
-        if not self._find_selected_bones():
+    generator = "unity_leg_helper"
+
+    failure_message = "Failed to create Unity leg helper"
+    runs_modal = False
+
+    def _create_job(self, journaled: bool = False) -> Optional[RigJob]:
+        if not self._find_bone_chains():
+            return None
+
+        armature, bone_chains = self.armature, self.bone_chains
+        # All the legs are computed in one batch
+        return RigJob(
+            armature,
+            [
+                lambda transaction: create_unity_leg_helpers(
+                    armature, bone_chains, transaction
+                )
+            ],
+            self.hierarchy,
+            templates=TemplateCache(),
+            journaled=journaled,
+        )
+
+
+class RebuildChangedMechanisms(BaseOperator):
+    """
+    Re-run the mechanisms whose source bones changed since they were created
+    """
+
+    bl_idname = "rigtools.rebuild_changed"
+    bl_label = "Rebuild changed mechanisms"
+    bl_options = {"REGISTER", "UNDO"}
+
+    def _execute(self, context):
+        if not self._find_armature():
             return {"CANCELLED"}
 
         try:
-            created_bones = create_unity_leg_helper(self.armature, self.selected_bones)
-            select_bones(self.armature, created_bones)
+            with RigBuildTransaction(self.armature) as transaction:
+                rebuilt, missing = rebuild_changed_mechanisms(
+                    self.armature, transaction
+                )
         except Exception as e:
-            self.report({"ERROR"}, f"Failed to create Unity leg helper: {e}")
+            self.report({"ERROR"}, f"Failed to rebuild mechanisms: {e}")
             return {"CANCELLED"}
 
-        self.report({"INFO"}, f"{len(created_bones)} bones had been created or updated")
+        message = f"{len(rebuilt)} mechanisms had been rebuilt."
+        if not missing:
+            self.report({"INFO"}, message)
+        else:
+            self.report(
+                {"WARNING"},
+                f"{message} {len(missing)} mechanisms lost their source bones: {', '.join(m.key for m in missing)}",
+            )
 
         return {"FINISHED"}
@@ -0,0 +1,34 @@
+from typing import Optional
+
+import bpy
+
+
+class RigToolsPreferences(bpy.types.AddonPreferences):
+    bl_idname = __package__
+
+    profiling: bpy.props.BoolProperty(
+        name="Profile operators",
+        description="Report the time spent in each phase of the rig tool operators",
+        default=False,
+    )
+
+    profiling_log: bpy.props.StringProperty(
+        name="Profile log",
+        description="Append every profile to this JSON lines file",
+        subtype="FILE_PATH",
+    )
+
+    def draw(self, context):
+        self.layout.prop(self, "profiling")
+        row = self.layout.row()
+        row.enabled = self.profiling
+        row.prop(self, "profiling_log")
+
+
+def get_preferences(context=None) -> Optional["RigToolsPreferences"]:
+    """
+    Preferences of the addon, None if it is not enabled (e.g. imported as a module)
+    """
+    context = context or bpy.context
+    addon = context.preferences.addons.get(__package__)
+    return addon.preferences if addon is not None else None
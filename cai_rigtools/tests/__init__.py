@@ -0,0 +1,9 @@
+"""
+Tests of the add-on, unittest test cases:
+
+    python -m pytest cai_rigtools/tests
+    blender --background --python cai_rigtools/tests/run_tests.py
+
+Outside of Blender the tests needing `bpy` run against the stand-in of
+`benchmarks.fake_blender`, see `support`.
+"""
@@ -0,0 +1,19 @@
+"""
+Runs the tests inside Blender, used by run.bat:
+
+    blender --background --python cai_rigtools/tests/run_tests.py
+"""
+
+import os
+import sys
+import unittest
+
+_TESTS = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(os.path.dirname(_TESTS))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+if __name__ == "__main__":
+    suite = unittest.defaultTestLoader.discover(_TESTS, top_level_dir=_ROOT)
+    result = unittest.TextTestRunner(verbosity=2).run(suite)
+    sys.exit(0 if result.wasSuccessful() else 1)
@@ -0,0 +1,57 @@
+"""
+Shared set-up of the tests. Import it before the add-on: inside Blender the tests
+run against `bpy`, outside of it this installs the stand-in of `benchmarks.fake_blender`.
+Without either, the tests asking for a `backend` are skipped.
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _ROOT not in sys.path:
+    # The benchmarks live next to the add-on in the repository
+    sys.path.insert(0, _ROOT)
+
+try:
+    from benchmarks import fake_blender
+    from benchmarks.run import BlenderBackend, Environment, FakeBackend
+except ImportError:
+    # Installed add-on, without the repository around it
+    fake_blender = None
+
+IN_BLENDER = "bpy" in sys.modules and not (
+    fake_blender is not None and isinstance(sys.modules["bpy"], fake_blender._BpyModule)
+)
+
+_backend = None
+if fake_blender is not None and not IN_BLENDER:
+    _backend = FakeBackend()
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        if fake_blender is None:
+            raise unittest.SkipTest("Needs the benchmarks package next to the add-on")
+        _backend = BlenderBackend()
+    return _backend
+
+
+def environment(shape: str = "chain", size: int = 64) -> "Environment":
+    """
+    A fresh synthetic armature, active and in edit mode.
+    """
+    return Environment(backend(), shape, size)
+
+
+def run_without_blender(code: str) -> subprocess.CompletedProcess:
+    """
+    Runs the code in a new interpreter in which `bpy` and `mathutils` can not be
+    imported, even inside Blender.
+    """
+    code = "import sys\nsys.modules['bpy'] = sys.modules['mathutils'] = None\n" + code
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=_ROOT, capture_output=True, text=True
+    )
@@ -0,0 +1,59 @@
+import unittest
+
+from . import support
+
+
+class RigCostTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import armature
+
+        self.armature = armature
+        # A root bone and its children, none of them depends on another
+        self.env = support.environment("fan", 8)
+        self.names = self.env.names
+
+    def _analyze(self, specs):
+        with self.armature.RigBuildTransaction(self.env.armature) as transaction:
+            transaction.constrain(specs)
+        self.env.bpy.ops.object.mode_set(mode="POSE")
+        return self.armature.analyze_rig_cost(self.env.armature)
+
+    def test_cycles_are_found(self):
+        ConstraintSpec = self.armature.ConstraintSpec
+        names = self.names
+        report = self._analyze(
+            [
+                # Reads itself
+                ConstraintSpec(names[1], "COPY_LOCATION", names[1]),
+                # Constrain each other
+                ConstraintSpec(names[2], "DAMPED_TRACK", names[3]),
+                ConstraintSpec(names[3], "DAMPED_TRACK", names[2]),
+                ConstraintSpec(names[4], "COPY_ROTATION", names[5]),
+            ]
+        )
+
+        self.assertEqual(
+            sorted(report.cycles), sorted([[names[1]], sorted(names[2:4])])
+        )
+
+    def test_costs_and_hotspots_are_ranked(self):
+        ConstraintSpec = self.armature.ConstraintSpec
+        names = self.names
+        report = self._analyze(
+            [ConstraintSpec(name, "DAMPED_TRACK", names[5]) for name in names[1:4]]
+            + [ConstraintSpec(names[4], "IK", names[6], properties={"chain_count": 1})]
+        )
+
+        costs = self.armature.analysis.CONSTRAINT_COSTS
+        expected = 8 * self.armature.analysis.BONE_COST
+        expected += 3 * costs["DAMPED_TRACK"] + costs["IK"]
+        self.assertAlmostEqual(report.cost, expected)
+        self.assertEqual(report.hotspots, [(names[5], 3), (names[6], 1)])
+        self.assertEqual(report.cycles, [])
+        # The root, a target, then the bone constrained to it
+        self.assertEqual(len(report.longest_chain), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
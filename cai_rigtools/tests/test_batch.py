@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+import unittest
+
+from . import support
+
+
+class BatchCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sources = []
+        for name in ("npc_a.blend", "npc_b.blend"):
+            path = os.path.join(self.directory, name)
+            with open(path, "wb") as f:
+                f.write(name.encode())
+            self.sources.append(path)
+
+    def _run(self, invocations):
+        jobs = os.path.join(self.directory, "jobs.json")
+        with open(jobs, "w") as f:
+            json.dump(invocations, f)
+        arguments = self.sources + [
+            "--jobs",
+            jobs,
+            "--output-dir",
+            os.path.join(self.directory, "rigged"),
+            "--worker",
+            "fake",
+            "--workers",
+            "2",
+            "--report",
+            os.path.join(self.directory, "report.json"),
+        ]
+        return support.run_without_blender(
+            "from cai_rigtools.batch import main\n" f"sys.exit(main({arguments!r}))\n"
+        )
+
+    def test_fake_worker_copies_the_files_and_writes_the_report(self):
+        result = self._run(
+            [
+                {"generator": "target", "bones": ["spine"], "prefix": "TGT"},
+                {"generator": "tentacle", "chains": [["a", "b"]], "control_count": 3},
+                {"generator": "analyze", "max_cost": 100},
+            ]
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("2/2 files rigged", result.stdout)
+
+        for source in self.sources:
+            output = os.path.join(self.directory, "rigged", os.path.basename(source))
+            with open(output, "rb") as f:
+                self.assertEqual(f.read(), os.path.basename(source).encode())
+
+        with open(os.path.join(self.directory, "report.json")) as f:
+            report = json.load(f)
+        self.assertEqual(
+            (report["worker"], report["files"], report["failed"]), ("fake", 2, 0)
+        )
+        self.assertEqual(
+            [i["generator"] for i in report["reports"][0]["invocations"]],
+            ["target", "tentacle", "analyze"],
+        )
+
+    def test_invalid_invocations_are_rejected_up_front(self):
+        for invocation in (
+            {"generator": "spline"},
+            {"generator": "lever", "chains": [], "control_count": 3},
+        ):
+            with self.subTest(invocation=invocation):
+                result = self._run([invocation])
+                self.assertEqual(result.returncode, 2)
+                self.assertIn("Invalid invocation", result.stderr)
+                self.assertFalse(os.path.exists(os.path.join(self.directory, "rigged")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+from . import support
+
+# Constraints put on each of the constrained bones
+NAMES = ["RIG-location", "RIG-track", "user-rotation"]
+
+
+class StripConstraintsTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import armature
+
+        self.armature = armature
+        self.env = support.environment(size=8)
+        names = self.env.names
+        self.bones = names[1:4]
+        ConstraintSpec = armature.ConstraintSpec
+        specs = []
+        for name in self.bones:
+            specs += [
+                ConstraintSpec(name, "COPY_LOCATION", names[0], name=NAMES[0]),
+                ConstraintSpec(name, "DAMPED_TRACK", names[5], name=NAMES[1]),
+                ConstraintSpec(name, "COPY_ROTATION", names[0], name=NAMES[2]),
+            ]
+        with armature.RigBuildTransaction(self.env.armature) as transaction:
+            transaction.constrain(specs)
+        self.env.bpy.ops.object.mode_set(mode="POSE")
+
+    def _strip(self, *args, **kwargs):
+        return self.armature.strip_constraints(self.env.armature, *args, **kwargs)
+
+    def _remaining(self):
+        return {
+            pose_bone.name: [c.name for c in pose_bone.constraints]
+            for pose_bone in self.env.armature.pose.bones
+            if len(pose_bone.constraints)
+        }
+
+    def test_selected_bones(self):
+        removed = self._strip([self.bones[0], "missing"])
+
+        self.assertEqual(
+            removed, {"COPY_LOCATION": 1, "DAMPED_TRACK": 1, "COPY_ROTATION": 1}
+        )
+        self.assertEqual(self._remaining(), {name: NAMES for name in self.bones[1:]})
+
+    def test_types(self):
+        removed = self._strip(types=["DAMPED_TRACK", "IK"])
+
+        self.assertEqual(removed, {"DAMPED_TRACK": 3})
+        self.assertEqual(
+            self._remaining(), {name: [NAMES[0], NAMES[2]] for name in self.bones}
+        )
+
+    def test_subtarget(self):
+        removed = self._strip(subtarget=self.env.names[0])
+
+        self.assertEqual(removed, {"COPY_LOCATION": 3, "COPY_ROTATION": 3})
+        self.assertEqual(self._remaining(), {name: [NAMES[1]] for name in self.bones})
+
+    def test_name_prefix(self):
+        removed = self._strip(name_prefix="RIG-")
+
+        self.assertEqual(removed, {"COPY_LOCATION": 3, "DAMPED_TRACK": 3})
+        self.assertEqual(self._remaining(), {name: [NAMES[2]] for name in self.bones})
+
+    def test_filters_combine(self):
+        removed = self._strip(
+            [self.bones[1]],
+            types=["COPY_LOCATION", "COPY_ROTATION"],
+            name_prefix="RIG-",
+        )
+
+        self.assertEqual(removed, {"COPY_LOCATION": 1})
+        remaining = {name: NAMES for name in self.bones}
+        remaining[self.bones[1]] = NAMES[1:]
+        self.assertEqual(self._remaining(), remaining)
+
+
+if __name__ == "__main__":
+    unittest.main()
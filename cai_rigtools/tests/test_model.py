@@ -0,0 +1,146 @@
+import unittest
+
+import numpy as np
+
+from . import support
+from cai_rigtools.armature.arrays import BONE_EPSILON, BoneArrays
+from cai_rigtools.armature.model import ArmatureModel
+
+
+def _chain_model(count: int = 4) -> ArmatureModel:
+    # Connected bones along +Y, each the parent of the next
+    heads = np.zeros((count, 3), dtype=np.float32)
+    heads[:, 1] = np.arange(count)
+    tails = heads + (0.0, 1.0, 0.0)
+    return ArmatureModel(
+        [f"bone.{i}" for i in range(count)],
+        heads,
+        tails,
+        np.zeros(count),
+        np.arange(count) - 1,
+        np.arange(count) > 0,
+        np.ones(count, dtype=bool),
+    )
+
+
+class ImportTest(unittest.TestCase):
+    def test_planning_modules_import_without_blender(self):
+        result = support.run_without_blender(
+            "from cai_rigtools.armature.model import ArmatureModel\n"
+            "from cai_rigtools.armature import (\n"
+            "    BONE_EPSILON, BoneArrays, ConstraintSpec, MechanismManifest,\n"
+            "    TemplateCache, analyze_rig_cost,\n"
+            ")\n"
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+class ArmatureModelTest(unittest.TestCase):
+    def test_add_bone_reuses_existing_bones(self):
+        model = _chain_model()
+        bone = model.add_bone("bone.1", roll=0.5)
+
+        self.assertEqual(bone.row, 1)
+        self.assertEqual(model.new_bones, [])
+        self.assertAlmostEqual(bone.roll, 0.5)
+        self.assertEqual(list(np.flatnonzero(model.dirty)), [1])
+
+    def test_add_bone_appends_with_new_bone_defaults(self):
+        model = _chain_model()
+        for i in range(20):
+            model.add_bone(f"extra.{i}", parent="bone.3")
+
+        bone = model["extra.0"]
+        self.assertEqual(model.new_bones[0], "extra.0")
+        self.assertEqual(len(model), 24)
+        np.testing.assert_allclose(bone.tail, (0.0, 1.0, 0.0))
+        self.assertTrue(bone.use_deform)
+        self.assertEqual(bone.parent.name, "bone.3")
+        self.assertEqual(model.pending_writes, 40)
+
+    def test_update_skips_changes_below_epsilon(self):
+        model = _chain_model()
+        head = model["bone.0"].head + BONE_EPSILON / 2
+
+        self.assertFalse(model.update("bone.0", head=head, roll=BONE_EPSILON / 2))
+        self.assertFalse(model.dirty.any())
+
+    def test_connecting_moves_the_head_onto_the_parent_tail(self):
+        model = _chain_model()
+        model.update("bone.2", use_connect=False, head=(1.0, 0.0, 0.0))
+        model.update("bone.2", use_connect=True)
+
+        np.testing.assert_allclose(model["bone.2"].head, model["bone.1"].tail)
+
+    def test_set_rows_leaves_unchanged_rows_clean(self):
+        model = _chain_model()
+        rows = np.arange(4)
+        rolls = model.rolls.copy()
+        rolls[2] = 1.0
+
+        model.set_rows(
+            rows,
+            model.heads.copy(),
+            model.tails.copy(),
+            rolls,
+            model.parents.copy(),
+            model.use_connect.copy(),
+            model.use_deform.copy(),
+        )
+
+        self.assertEqual(list(np.flatnonzero(model.dirty)), [2])
+
+
+class PlannerTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import armature
+
+        self.armature = armature
+
+    def test_lever_plans_controls_and_constraints(self):
+        model = _chain_model()
+        created = self.armature.plan_lever_mechanism(model, list(model.names))
+
+        self.assertEqual(sorted(created), sorted(model.new_bones))
+        self.assertEqual(model["bone.0"].parent.name, "CTRL-PIVOT-bone.0")
+        self.assertEqual(model["bone.1"].parent.name, "CTRL-ROOT-bone.0")
+        self.assertFalse(model["bone.1"].use_connect)
+        self.assertEqual(
+            [spec.bone for spec in model.constraints], ["bone.1", "bone.2", "bone.3"]
+        )
+        self.assertEqual(model.manifests[0].sources, model.names[:4])
+
+    def test_tail_plans_a_control_per_bone(self):
+        model = _chain_model()
+        self.armature.plan_tail_mechanism(model, list(model.names))
+
+        self.assertEqual(len(model.new_bones), 5)
+        self.assertEqual(len(model.constraints), 12)
+        for i in range(4):
+            self.assertEqual(model[f"bone.{i}"].parent.name, f"CTRL-bone.{i}")
+            self.assertFalse(model[f"bone.{i}"].use_connect)
+
+    def test_written_model_matches_the_plan(self):
+        env = support.environment(size=16)
+        model = ArmatureModel.capture(env.armature)
+        created = self.armature.plan_tail_mechanism(model, env.segments(4, 1)[0])
+        model.write(env.armature)
+
+        written = BoneArrays.capture(env.armature)
+        rows = [written.row(name) for name in model.names]
+        self.assertTrue(set(created) <= set(written.names))
+        np.testing.assert_allclose(written.heads[rows], model.heads, atol=1e-6)
+        np.testing.assert_allclose(written.tails[rows], model.tails, atol=1e-6)
+        self.assertEqual(
+            [written.parent(name) for name in model.names],
+            [
+                bone.parent.name if bone.parent else None
+                for bone in map(model.__getitem__, model.names)
+            ],
+        )
+        self.assertFalse(model.dirty.any())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+from types import SimpleNamespace
+import unittest
+
+from . import support
+
+# Generator operators and the length of the chains they are run on
+CHAIN_LENGTHS = {
+    "CreateBoneChainLeverMechanism": 4,
+    "CreateTailChainMechanism": 8,
+    "CreateTentacleChainMechanism": 8,
+    "CreateUnityLegHelper": 4,
+}
+
+
+class GeneratorOperatorTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import operators
+
+        self.operators = operators
+
+    def _run(self, env, operator_name: str, bone_names):
+        env.ensure_edit_mode()
+        env.select(bone_names)
+        result = env.backend.run_operator(getattr(self.operators, operator_name))
+        self.assertEqual(result, {"FINISHED"})
+
+        env.ensure_edit_mode()
+        armature = env.armature
+        return (
+            len(armature.data.edit_bones),
+            sum(len(pose_bone.constraints) for pose_bone in armature.pose.bones),
+        )
+
+    def test_generators_have_to_implement_the_abstract_methods(self):
+        with self.assertRaisesRegex(TypeError, "_create_mechanism"):
+
+            class Incomplete(self.operators.ChainGeneratorOperator):
+                bl_idname = "rigtools.incomplete"
+
+    def test_running_a_generator_twice_changes_nothing(self):
+        for operator_name, length in CHAIN_LENGTHS.items():
+            with self.subTest(operator_name):
+                env = support.environment("tree", 120)
+                bone_names = [
+                    name for chain in env.segments(length, 3) for name in chain
+                ]
+
+                first = self._run(env, operator_name, bone_names)
+                self.assertEqual(self._run(env, operator_name, bone_names), first)
+
+    def test_first_and_last_bones_stand_for_their_chains(self):
+        for operator_name, length in CHAIN_LENGTHS.items():
+            with self.subTest(operator_name):
+                env = support.environment("tree", 120)
+                chains = env.segments(length, 2)
+                whole = self._run(env, operator_name, sum(chains, []))
+
+                env = support.environment("tree", 120)
+                ends = [name for chain in chains for name in (chain[0], chain[-1])]
+                self.assertEqual(self._run(env, operator_name, ends), whole)
+
+    def test_single_bones_are_rejected(self):
+        env = support.environment("tree", 120)
+        chain = env.segments(4, 1)[0]
+        env.select(chain[:1])
+
+        for operator_name in CHAIN_LENGTHS:
+            with self.subTest(operator_name):
+                with self.assertRaisesRegex(RuntimeError, "at least two bones|Cancel"):
+                    env.backend.run_operator(getattr(self.operators, operator_name))
+
+    def test_bones_missing_from_the_armature_are_reported(self):
+        env = support.environment("tree", 120)
+        chain = env.segments(4, 1)[0]
+        edit_bone = env.armature.data.edit_bones.new("unsaved")
+        edit_bone.parent = env.armature.data.edit_bones[chain[-1]]
+        env.select(chain + ["unsaved"])
+
+        with self.assertRaisesRegex(RuntimeError, "unsaved|Cancel"):
+            env.backend.run_operator(self.operators.CreateTailChainMechanism)
+
+
+@unittest.skipIf(support.IN_BLENDER, "Sends the modal events itself")
+class ModalOperatorTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import operators
+
+        self.operators = operators
+        self.env = support.environment("tree", 120)
+        self.context = self.env.bpy.context
+        self.context.preferences.addons["cai_rigtools"] = SimpleNamespace(
+            preferences=SimpleNamespace(profiling=True, profiling_log="")
+        )
+
+    def _invoke(self, operator_name: str):
+        chains = self.env.segments(CHAIN_LENGTHS.get(operator_name, 4), 3)
+        self.env.select(sum(chains, []))
+        operator = getattr(self.operators, operator_name)()
+        # Every selection is large enough to run modal
+        operator.MODAL_BONE_COUNT = 1
+        return operator, operator.invoke(self.context, None)
+
+    def test_modal_runs_are_journaled_and_profiled(self):
+        operator, result = self._invoke("CreateTailChainMechanism")
+        self.assertEqual(result, {"RUNNING_MODAL"})
+        self.assertIsNotNone(operator._job.transaction.journal)
+
+        event = SimpleNamespace(type="TIMER")
+        while result == {"RUNNING_MODAL"}:
+            result = operator.modal(self.context, event)
+
+        self.assertEqual(result, {"FINISHED"})
+        messages = [message for _, message in operator.reports]
+        self.assertTrue(any(m.startswith(operator.bl_idname) for m in messages))
+        self.assertEqual(self.context.window_manager.timers, [])
+
+    def test_single_step_generators_run_right_away(self):
+        for operator_name in ("CreateTargetForArmature", "CreateUnityLegHelper"):
+            with self.subTest(operator_name):
+                _, result = self._invoke(operator_name)
+                self.assertEqual(result, {"FINISHED"})
+                self.assertEqual(self.context.window_manager.modal_handlers, [])
+
+    def test_execute_does_not_journal(self):
+        self.env.select(self.env.segments(8, 3)[0])
+        operator = self.operators.CreateTailChainMechanism()
+        job = operator._create_job()
+        job.start()
+
+        self.assertIsNone(job.transaction.journal)
+        job.cancel()
+
+
+if __name__ == "__main__":
+    unittest.main()
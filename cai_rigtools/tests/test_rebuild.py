@@ -0,0 +1,40 @@
+import unittest
+
+from . import support
+
+
+class RebuildChangedMechanismsTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import armature
+
+        self.armature = armature
+        self.env = support.environment(size=32)
+        self.chains = self.env.segments(4, 2)
+        with armature.RigBuildTransaction(self.env.armature) as transaction:
+            for chain in self.chains:
+                armature.create_tail_mechanism(
+                    self.env.armature, chain, transaction, is_chain=True
+                )
+        self.env.ensure_edit_mode()
+
+    def _rebuild(self):
+        self.env.ensure_edit_mode()
+        changed, missing = self.armature.rebuild_changed_mechanisms(self.env.armature)
+        self.assertEqual(missing, [])
+        return [manifest.sources for manifest in changed]
+
+    def test_unchanged_sources_are_not_rebuilt(self):
+        self.assertEqual(self._rebuild(), [])
+
+    def test_changed_sources_are_rebuilt_once(self):
+        edit_bone = self.env.armature.data.edit_bones[self.chains[1][-1]]
+        edit_bone.tail = edit_bone.tail * 2.0
+
+        self.assertEqual(self._rebuild(), [self.chains[1]])
+        # The manifest got the new fingerprint
+        self.assertEqual(self._rebuild(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
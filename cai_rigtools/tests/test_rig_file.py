@@ -0,0 +1,217 @@
+import os
+import tempfile
+from types import SimpleNamespace
+import unittest
+
+import numpy as np
+
+from . import support
+from cai_rigtools.armature.arrays import BoneArrays
+from cai_rigtools.armature.manifest import MechanismManifest
+from cai_rigtools.armature.model import ArmatureModel
+from cai_rigtools.armature.rig_format import RigDescription
+from cai_rigtools.armature.specs import ConstraintSpec
+
+
+def _description() -> RigDescription:
+    model = ArmatureModel(
+        ["root", "spine", "head"],
+        np.array([(0, 0, 0), (0, 0, 1), (0, 0, 2)]),
+        np.array([(0, 0, 1), (0, 0, 2), (0, 0, 3)]),
+        np.array([0.0, 0.25, -0.5]),
+        np.array([-1, 0, 1]),
+        np.array([False, True, True]),
+        np.array([True, True, False]),
+    )
+    model.constrain(
+        [ConstraintSpec("head", "DAMPED_TRACK", "spine", properties={"influence": 0.5})]
+    )
+    model.record(MechanismManifest("tail", ["spine", "head"], bones=["root"]))
+    layers = np.array([[True, False], [False, True], [True, True]])
+    return RigDescription.from_model(model, ["Deform", "Controls"], layers, "rig")
+
+
+class RigDescriptionTest(unittest.TestCase):
+    def assertSameDescription(self, loaded: RigDescription, saved: RigDescription):
+        self.assertEqual(loaded.names, saved.names)
+        self.assertEqual(loaded.name, saved.name)
+        self.assertEqual(loaded.layer_names, saved.layer_names)
+        for attribute in (
+            "heads",
+            "tails",
+            "rolls",
+            "parents",
+            "use_connect",
+            "use_deform",
+            "layers",
+        ):
+            np.testing.assert_array_equal(
+                getattr(loaded, attribute), getattr(saved, attribute)
+            )
+        self.assertEqual(loaded.constraints, saved.constraints)
+        self.assertEqual(loaded.manifests, saved.manifests)
+
+    def test_format_imports_without_blender(self):
+        result = support.run_without_blender(
+            "from cai_rigtools.armature.rig_format import RigDescription\n"
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_bytes_round_trip(self):
+        description = _description()
+        loaded = RigDescription.from_buffer(description.to_bytes())
+        self.assertSameDescription(loaded, description)
+
+    def test_file_round_trip_releases_the_file(self):
+        description = _description()
+        path = os.path.join(tempfile.mkdtemp(), "rig.bin")
+        description.save(path)
+
+        loaded = RigDescription.load(path)
+        # Fails on Windows while the file is still mapped
+        os.remove(path)
+
+        self.assertSameDescription(loaded, description)
+        # Copies, not views of the closed map
+        loaded.rolls[0] = 1.0
+
+    def test_plan_onto_a_model(self):
+        description = _description()
+        model = ArmatureModel(
+            ["root"], np.zeros((1, 3)), np.ones((1, 3)), [0.0], [-1], [False], [True]
+        )
+        created = description.plan(model)
+
+        self.assertEqual(created, ["spine", "head"])
+        np.testing.assert_allclose(model.heads, description.heads)
+        np.testing.assert_allclose(model.rolls, description.rolls)
+        self.assertEqual(model["head"].parent.name, "spine")
+        self.assertEqual(len(model.constraints), 1)
+
+
+class _BoneCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self.bones = []
+
+    def assign(self, bone):
+        if bone not in self.bones:
+            self.bones.append(bone)
+
+    def unassign(self, bone):
+        self.bones.remove(bone)
+
+
+class _BoneCollections(list):
+    def get(self, name: str):
+        return next((c for c in self if c.name == name), None)
+
+    def new(self, name: str) -> _BoneCollection:
+        self.append(_BoneCollection(name))
+        return self[-1]
+
+
+class RigFileTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools.armature import rig_file
+
+        self.rig_file = rig_file
+
+    def test_bones_leave_the_collections_they_are_not_described_in(self):
+        bones = {name: SimpleNamespace(name=name) for name in ("a", "b", "other")}
+        collections = _BoneCollections()
+        deform = collections.new("Deform")
+        old = collections.new("Old")
+        for bone in bones.values():
+            deform.assign(bone)
+            old.assign(bone)
+        armature = SimpleNamespace(
+            mode="POSE", data=SimpleNamespace(bones=bones, collections=collections)
+        )
+
+        self.rig_file._write_layers(
+            armature,
+            ["a", "b"],
+            ["Deform", "Controls"],
+            np.array([[True, False], [False, True]]),
+        )
+
+        def members(name):
+            return sorted(bone.name for bone in collections.get(name).bones)
+
+        self.assertEqual(members("Deform"), ["a", "other"])
+        self.assertEqual(members("Controls"), ["b"])
+        self.assertEqual(members("Old"), ["other"])
+
+    def test_saved_rig_loads_onto_a_fresh_armature(self):
+        env = support.environment(size=32)
+        from cai_rigtools import armature
+
+        with armature.RigBuildTransaction(env.armature) as transaction:
+            for chain in env.segments(4, 2):
+                armature.create_tail_mechanism(
+                    env.armature, chain, transaction, is_chain=True
+                )
+        env.ensure_edit_mode()
+        path = os.path.join(tempfile.mkdtemp(), "rig.bin")
+        saved = armature.save_rig(env.armature, path)
+
+        fresh = support.environment(size=32)
+        armature.load_rig(fresh.armature, path)
+        # Loading twice changes nothing
+        self.assertEqual(armature.load_rig(fresh.armature, path), [])
+        os.remove(path)
+
+        fresh.ensure_edit_mode()
+        loaded = BoneArrays.capture(fresh.armature)
+        rows = [loaded.row(name) for name in saved.names]
+        np.testing.assert_allclose(loaded.heads[rows], saved.heads, atol=1e-6)
+        np.testing.assert_allclose(loaded.rolls[rows], saved.rolls, atol=1e-6)
+        self.assertEqual(
+            [loaded.parent(name) for name in saved.names],
+            [saved.names[p] if p >= 0 else None for p in saved.parents],
+        )
+
+    def test_constraint_targets_round_trip(self):
+        env = support.environment(size=16)
+        from cai_rigtools import armature
+
+        curve = env.bpy.data.objects.new("Curve", None)
+        bone, other = env.names[1], env.names[2]
+        with armature.RigBuildTransaction(env.armature) as transaction:
+            transaction.constrain(
+                [
+                    # The armature itself without a subtarget
+                    armature.ConstraintSpec(
+                        bone, "COPY_TRANSFORMS", target=env.armature.name
+                    ),
+                    armature.ConstraintSpec(other, "DAMPED_TRACK", env.names[0]),
+                    armature.ConstraintSpec(other, "SPLINE_IK", target=curve.name),
+                ]
+            )
+        env.ensure_edit_mode()
+        path = os.path.join(tempfile.mkdtemp(), "rig.bin")
+        armature.save_rig(env.armature, path)
+
+        # The curve is not in the new file
+        fresh = support.environment(size=16)
+        skipped = []
+        armature.load_rig(fresh.armature, path, skipped=skipped)
+        os.remove(path)
+
+        self.assertEqual([(s.bone, s.type) for s in skipped], [(other, "SPLINE_IK")])
+        env.bpy.ops.object.mode_set(mode="POSE")
+        pose_bones = fresh.armature.pose.bones
+        self.assertEqual(
+            [(c.type, c.target, c.subtarget) for c in pose_bones[bone].constraints],
+            [("COPY_TRANSFORMS", fresh.armature, "")],
+        )
+        self.assertEqual(
+            [(c.type, c.target, c.subtarget) for c in pose_bones[other].constraints],
+            [("DAMPED_TRACK", fresh.armature, env.names[0])],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
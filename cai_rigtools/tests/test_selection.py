@@ -0,0 +1,63 @@
+import unittest
+
+from . import support
+
+
+class SelectBonesTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import armature
+
+        self.armature = armature
+        self.env = support.environment(size=16)
+        self.names = self.env.names
+
+    def _selected(self, bones):
+        return {
+            attribute: [bone.name for bone in bones if getattr(bone, attribute)]
+            for attribute in ("select", "select_head", "select_tail")
+        }
+
+    def test_only_the_given_bones_are_selected(self):
+        wanted = [self.names[5], self.names[2]]
+        for mode, source in (("EDIT", "edit_bones"), ("POSE", "bones")):
+            with self.subTest(mode):
+                self.env.bpy.ops.object.mode_set(mode=mode)
+                bones = getattr(self.env.armature.data, source)
+                for bone in bones:
+                    bone.select = bone.select_head = bone.select_tail = True
+
+                count = self.armature.select_bones(
+                    self.env.armature, wanted + ["missing"]
+                )
+
+                self.assertEqual(count, 2)
+                expected = [self.names[2], self.names[5]]
+                self.assertEqual(
+                    self._selected(bones),
+                    {
+                        "select": expected,
+                        "select_head": expected,
+                        "select_tail": expected,
+                    },
+                )
+                self.assertEqual(bones.active.name, self.names[5])
+
+    def test_selection_can_be_extended(self):
+        edit_bones = self.env.armature.data.edit_bones
+        self.armature.select_bones(self.env.armature, [self.names[1]])
+        self.armature.select_bones(
+            self.env.armature,
+            [self.names[3], self.names[4]],
+            clear_selection=False,
+            active=self.names[4],
+        )
+
+        expected = [self.names[1], self.names[3], self.names[4]]
+        self.assertEqual(self._selected(edit_bones)["select"], expected)
+        self.assertEqual(self._selected(edit_bones)["select_tail"], expected)
+        self.assertEqual(edit_bones.active.name, self.names[4])
+
+
+if __name__ == "__main__":
+    unittest.main()
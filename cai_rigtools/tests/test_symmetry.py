@@ -0,0 +1,52 @@
+import unittest
+
+from . import support
+from cai_rigtools.armature.symmetry import SymmetryIndex, split_side
+
+
+class SplitSideTest(unittest.TestCase):
+    def test_sides_are_parsed(self):
+        cases = {
+            "Leg.L": ("Leg.<s>", "L"),
+            "Leg_R": ("Leg_<s>", "R"),
+            "Leg.Lower.L.001": ("Leg.Lower.<s>.001", "L"),
+            "r_Hand": ("<s>_Hand", "R"),
+            "LeftLeg": ("<side>Leg", "L"),
+            "handright": ("handright", None),
+            "hand.right": ("hand.<side>", "R"),
+            "HandRight.001": ("Hand<side>.001", "R"),
+            "Spine": ("Spine", None),
+            "Lower": ("Lower", None),
+        }
+        for bone_name, expected in cases.items():
+            with self.subTest(bone_name):
+                self.assertEqual(split_side(bone_name), expected)
+
+    def test_conventions_are_not_paired(self):
+        self.assertNotEqual(split_side("Leg.L")[0], split_side("Leg_R")[0])
+        self.assertNotEqual(split_side("Leg.L")[0], split_side("Leg.Right")[0])
+        self.assertEqual(split_side("Leg.Left")[0], split_side("Leg.right")[0])
+
+
+class SymmetryIndexTest(unittest.TestCase):
+    def test_pairs_and_center_bones(self):
+        names = ["Spine", "Arm.L", "Arm.R", "LeftLeg", "RightLeg", "Tail_R", "Arm_L"]
+        index = SymmetryIndex(names)
+
+        self.assertEqual(index.center, [0])
+        self.assertEqual(index.mirror_of(1), 2)
+        self.assertEqual(index.mirror_of(2), 1)
+        self.assertEqual(index.mirror_of(3), 4)
+        # No other side, or a different convention
+        self.assertEqual(index.mirror_of(5), -1)
+        self.assertEqual(index.mirror_of(6), -1)
+        self.assertEqual(index.mirror_of(0), -1)
+        self.assertEqual(index.first_of_pairs([0, 2, 1, 4, 3, 5]), [0, 2, 4, 5])
+
+    def test_rows_can_be_given(self):
+        index = SymmetryIndex(["Arm.L", "Arm.R"], rows=[10, 20])
+        self.assertEqual((index.mirror_of(10), index.mirror_of(20)), (20, 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
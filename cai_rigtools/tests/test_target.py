@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+
+from . import support
+
+
+class SeparateTargetTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import armature
+
+        self.armature = armature
+        self.env = support.environment(size=16)
+        self.bpy = self.env.backend.bpy
+
+    def _create(self, bone_names, transaction=None):
+        return self.armature.create_target_armature(
+            self.env.armature, bone_names, "TGT", transaction, mode="SEPARATE"
+        )
+
+    def _target(self):
+        return self.bpy.data.objects[
+            self.armature.separate_target_name(self.env.armature, "TGT")
+        ]
+
+    def test_unselected_parents_hand_their_children_to_the_nearest_selected_one(self):
+        names = self.env.names
+        created = self._create([names[5], names[2], names[3]])
+
+        self.env.ensure_edit_mode()
+        source = self.armature.BoneArrays.capture(self.env.armature)
+        target = self._target().data
+        self.assertEqual(sorted(bone.name for bone in target.bones), sorted(created))
+        self.assertEqual(target.bones[f"TGT-{names[5]}"].parent.name, f"TGT-{names[3]}")
+        self.assertFalse(target.bones[f"TGT-{names[5]}"].use_connect)
+        self.assertTrue(target.bones[f"TGT-{names[3]}"].use_connect)
+        self.assertIsNone(target.bones[f"TGT-{names[2]}"].parent)
+        np.testing.assert_allclose(
+            np.array(target.bones[f"TGT-{names[5]}"].tail),
+            source.tails[5],
+            atol=1e-6,
+        )
+
+    def test_running_again_replaces_the_data(self):
+        self._create(self.env.names[:4])
+        previous = self._target().data
+
+        self.env.ensure_edit_mode()
+        self._create(self.env.names[:6])
+
+        target = self._target()
+        self.assertIsNot(target.data, previous)
+        self.assertEqual(target.data.name, target.name)
+        self.assertNotIn(previous, list(self.bpy.data.armatures))
+        self.assertEqual(len(target.data.bones), 6)
+
+    def test_rollback_keeps_the_previous_data(self):
+        self._create(self.env.names[:4])
+        previous = self._target().data
+        armatures = set(self.bpy.data.armatures.keys())
+
+        self.env.ensure_edit_mode()
+        with self.assertRaises(RuntimeError):
+            with self.armature.RigBuildTransaction(self.env.armature) as transaction:
+                self._create(self.env.names[:6], transaction)
+                transaction.constrain(
+                    [self.armature.ConstraintSpec("missing", "COPY_LOCATION")]
+                )
+
+        self.assertIs(self._target().data, previous)
+        self.assertEqual(set(self.bpy.data.armatures.keys()), armatures)
+
+    def test_rollback_removes_a_new_target(self):
+        objects = set(self.bpy.data.objects.keys())
+        armatures = set(self.bpy.data.armatures.keys())
+
+        with self.assertRaises(RuntimeError):
+            with self.armature.RigBuildTransaction(self.env.armature) as transaction:
+                self._create(self.env.names[:6], transaction)
+                transaction.constrain(
+                    [self.armature.ConstraintSpec("missing", "COPY_LOCATION")]
+                )
+
+        self.assertEqual(set(self.bpy.data.objects.keys()), objects)
+        self.assertEqual(set(self.bpy.data.armatures.keys()), armatures)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+
+import numpy as np
+
+from . import support
+from cai_rigtools.armature.model import ArmatureModel
+from cai_rigtools.armature.templates import TemplateCache, fit_rigid_transform
+
+# A bent chain of three bones hanging from a root bone
+_CHAIN = np.array([(0, 0, 0), (0, 0, 1), (0, 0.5, 1.8), (0.3, 1.2, 2.2), (0.3, 2, 2.4)])
+
+
+def _rotation_z(angle: float) -> np.ndarray:
+    c, s = np.cos(angle), np.sin(angle)
+    return np.array([(c, -s, 0), (s, c, 0), (0, 0, 1)])
+
+
+def _two_chains() -> ArmatureModel:
+    """
+    Chains "a" and "b" of the same shape, "b" turned and moved, with other rolls.
+    """
+    points_b = _CHAIN @ _rotation_z(1.2).T + (5, -2, 1)
+    names, heads, tails, parents = [], [], [], []
+    for side, points in (("a", _CHAIN), ("b", points_b)):
+        for i in range(4):
+            names.append(f"{side}.{i}")
+            heads.append(points[i])
+            tails.append(points[i + 1])
+            parents.append(len(names) - 2 if i else -1)
+    return ArmatureModel(
+        names,
+        np.array(heads),
+        np.array(tails),
+        np.array([0.0, 0.1, 0.2, 0.3, -0.4, 1.0, 1.5, 2.0]),
+        np.array(parents),
+        np.array([False, True, True, True] * 2),
+        np.ones(8, dtype=bool),
+    )
+
+
+class FitTest(unittest.TestCase):
+    def test_fit_recovers_a_rigid_transform(self):
+        rotation = _rotation_z(0.7)
+        rotation_found, translation, residual = fit_rigid_transform(
+            _CHAIN, _CHAIN @ rotation.T + (1, 2, 3)
+        )
+
+        np.testing.assert_allclose(rotation_found, rotation, atol=1e-9)
+        np.testing.assert_allclose(translation, (1, 2, 3), atol=1e-9)
+        self.assertLess(residual, 1e-9)
+
+
+class TemplateCacheTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import armature
+
+        self.planners = {
+            "lever": armature.plan_lever_mechanism,
+            "tail": armature.plan_tail_mechanism,
+        }
+
+    def test_templated_planning_matches_direct_planning(self):
+        for generator, planner in self.planners.items():
+            with self.subTest(generator):
+                direct = _two_chains()
+                templated = _two_chains()
+                rolls = templated.rolls.copy()
+                cache = TemplateCache()
+                for side in "ab":
+                    chain = [f"{side}.{i}" for i in range(1, 4)]
+                    direct_bones = planner(direct, chain)
+                    templated_bones = cache.plan(templated, generator, planner, chain)
+                    self.assertEqual(templated_bones, direct_bones)
+
+                self.assertEqual(cache.hits, 1)
+                self.assertEqual(templated.names, direct.names)
+                # The chain bones keep their own rolls
+                np.testing.assert_array_equal(templated.rolls[:8], rolls)
+                np.testing.assert_allclose(templated.rolls, direct.rolls, atol=1e-6)
+                np.testing.assert_allclose(templated.heads, direct.heads, atol=1e-5)
+                np.testing.assert_allclose(templated.tails, direct.tails, atol=1e-5)
+                np.testing.assert_array_equal(templated.parents, direct.parents)
+                np.testing.assert_array_equal(templated.use_connect, direct.use_connect)
+                np.testing.assert_array_equal(templated.use_deform, direct.use_deform)
+                self.assertEqual(templated.constraints, direct.constraints)
+                self.assertEqual(templated.manifests, direct.manifests)
+
+    def test_chain_bones_keep_their_geometry(self):
+        model = _two_chains()
+        heads, tails = model.heads.copy(), model.tails.copy()
+        cache = TemplateCache()
+        for side in "ab":
+            chain = [f"{side}.{i}" for i in range(1, 4)]
+            cache.plan(model, "lever", self.planners["lever"], chain)
+
+        self.assertEqual(cache.hits, 1)
+        np.testing.assert_array_equal(model.heads[:8], heads)
+        np.testing.assert_array_equal(model.tails[:8], tails)
+
+
+if __name__ == "__main__":
+    unittest.main()
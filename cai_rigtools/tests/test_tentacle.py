@@ -0,0 +1,112 @@
+import unittest
+
+from . import support
+
+
+class TentacleTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import armature
+
+        self.armature = armature
+        self.env = support.environment(size=601)
+        self.chain = self.env.segments(600, 1)[0]
+
+    def _constraints(self):
+        self.env.backend.bpy.ops.object.mode_set(mode="POSE")
+        return {
+            (pose_bone.name, constraint.name): constraint.chain_count
+            for pose_bone in self.env.armature.pose.bones
+            for constraint in pose_bone.constraints
+        }
+
+    def test_long_chains_are_split_into_segments(self):
+        segments = self.armature.tentacle_segments(self.chain)
+
+        self.assertEqual(len(segments), 3)
+        self.assertEqual([name for segment in segments for name in segment], self.chain)
+        self.assertTrue(
+            all(
+                len(segment) <= self.armature.MAX_SPLINE_IK_CHAIN
+                for segment in segments
+            )
+        )
+
+    def test_every_segment_gets_a_spline_ik_constraint(self):
+        armature = self.env.armature
+        created = self.armature.create_tentacle_mechanism(
+            armature, self.chain, is_chain=True
+        )
+        bpy = self.env.backend.bpy
+
+        # Four controls per segment, neighbouring segments share one
+        self.assertEqual(len(created), 10)
+        curve_name = self.armature.tentacle_curve_name(armature, self.chain[0])
+        for i, segment in enumerate(self.armature.tentacle_segments(self.chain)):
+            name = self.armature.segment_curve_name(curve_name, i)
+            key = self.armature.constraint_name("SPLINE_IK", name)
+            self.assertEqual(self._constraints()[(segment[-1], key)], len(segment))
+            self.assertEqual(
+                len(bpy.data.objects[name].data.splines[0].bezier_points), 4
+            )
+
+    def test_rebuilding_a_long_tentacle_changes_nothing(self):
+        armature = self.env.armature
+        self.armature.create_tentacle_mechanism(armature, self.chain, is_chain=True)
+
+        self.env.ensure_edit_mode()
+        with self.armature.RigBuildTransaction(armature) as transaction:
+            self.armature.create_tentacle_mechanism(
+                armature, self.chain, transaction, is_chain=True
+            )
+        self.assertEqual(transaction.constraint_counts["updated"], 0)
+        self.assertEqual(transaction.constraint_counts["created"], 0)
+
+    def test_fewer_controls_remove_the_extra_ones(self):
+        armature = self.env.armature
+        bpy = self.env.backend.bpy
+        before = self.armature.create_tentacle_mechanism(
+            armature, self.chain, is_chain=True, control_count=5
+        )
+        self.env.ensure_edit_mode()
+        after = self.armature.create_tentacle_mechanism(
+            armature, self.chain, is_chain=True, control_count=3
+        )
+
+        self.assertEqual((len(before), len(after)), (13, 7))
+        self.assertTrue(set(after) < set(before))
+        self.env.ensure_edit_mode()
+        controls = [
+            bone.name
+            for bone in armature.data.edit_bones
+            if bone.name.startswith("CTRL-TENTACLE-")
+        ]
+        self.assertEqual(sorted(controls), sorted(after))
+
+        curve_name = self.armature.tentacle_curve_name(armature, self.chain[0])
+        hooked = []
+        for i in range(3):
+            curve = bpy.data.objects[self.armature.segment_curve_name(curve_name, i)]
+            hooked += [modifier.subtarget for modifier in curve.modifiers]
+        # The shared controls hook a point of both their segments
+        self.assertEqual(set(hooked), set(after))
+        self.assertEqual(len(hooked), 9)
+
+    def test_rollback_leaves_no_curves(self):
+        armature = self.env.armature
+        bpy = self.env.backend.bpy
+        objects, curves = set(bpy.data.objects.keys()), set(bpy.data.curves.keys())
+
+        with self.assertRaises(RuntimeError):
+            with self.armature.RigBuildTransaction(armature, journaled=True) as t:
+                self.armature.create_tentacle_mechanism(
+                    armature, self.chain, t, is_chain=True
+                )
+                t.constrain([self.armature.ConstraintSpec("missing", "COPY_LOCATION")])
+
+        self.assertEqual(set(bpy.data.objects.keys()), objects)
+        self.assertEqual(set(bpy.data.curves.keys()), curves)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from . import support
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import armature
+
+        self.armature = armature
+        self.env = support.environment(size=16)
+        self.names = self.env.names
+
+    def _constraints(self, bone_name: str):
+        self.env.backend.bpy.ops.object.mode_set(mode="POSE")
+        constraints = [
+            (c.name, c.type, c.subtarget, c.influence)
+            for c in self.env.armature.pose.bones[bone_name].constraints
+        ]
+        self.env.ensure_edit_mode()
+        return constraints
+
+    def _apply(self, specs, journaled=False):
+        with self.armature.RigBuildTransaction(
+            self.env.armature, journaled=journaled
+        ) as transaction:
+            transaction.constrain(specs)
+
+    def test_rollback_restores_patched_and_replaced_constraints(self):
+        ConstraintSpec = self.armature.ConstraintSpec
+        bone, other = self.names[1], self.names[2]
+        self._apply(
+            [
+                ConstraintSpec(
+                    bone, "COPY_LOCATION", self.names[0], properties={"influence": 0.5}
+                ),
+                ConstraintSpec(bone, "COPY_ROTATION", self.names[0], name="swap"),
+                ConstraintSpec(bone, "LIMIT_SCALE", name="last"),
+            ]
+        )
+        before = self._constraints(bone)
+
+        with self.assertRaises(RuntimeError):
+            self._apply(
+                [
+                    # Patched, replaced by another type, created, then a failure
+                    ConstraintSpec(
+                        bone,
+                        "COPY_LOCATION",
+                        self.names[0],
+                        properties={"influence": 1.0},
+                    ),
+                    ConstraintSpec(bone, "DAMPED_TRACK", self.names[3], name="swap"),
+                    ConstraintSpec(other, "COPY_LOCATION", self.names[0]),
+                    ConstraintSpec("missing", "COPY_LOCATION"),
+                ],
+                journaled=True,
+            )
+
+        self.assertEqual(self._constraints(bone), before)
+        self.assertEqual(self._constraints(other), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
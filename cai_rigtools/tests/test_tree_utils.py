@@ -0,0 +1,34 @@
+import unittest
+
+from . import support
+
+
+class FindBoneChainTest(unittest.TestCase):
+    def setUp(self):
+        support.backend()
+        from cai_rigtools import armature
+
+        self.armature = armature
+
+    def test_indexed_search_matches_the_legacy_one(self):
+        env = support.environment("tree", 120)
+        env.backend.bpy.ops.object.mode_set(mode="OBJECT")
+        hierarchy = self.armature.BoneHierarchyIndex.from_armature(env.armature)
+
+        # Chains down a limb, across limbs and in both orders
+        pairs = [(chain[0], chain[-1]) for chain in env.segments(6, 4)]
+        pairs += [(last, first) for first, last in pairs]
+        pairs += list(zip(env.sample(20), env.sample(20)))
+
+        for first, last in pairs:
+            with self.subTest(first=first, last=last):
+                self.assertEqual(
+                    self.armature.find_bone_chain(env.armature, first, last, hierarchy),
+                    self.armature.find_bone_chain(
+                        env.armature, first, last, legacy=True
+                    ),
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()